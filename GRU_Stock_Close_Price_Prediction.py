@@ -64,72 +64,8 @@ import plotly.express as px
 symbols_list = ['PLUG', 'NIO', 'NTLA', 'SNAP', 'CHPT']
 
 # %%
-import time
-import os
-from alpha_vantage.timeseries import TimeSeries
-
-def retrieve_stock_data(symbols):
-    """
-    Retrieve historical stock data for a given list of symbols using Alpha Vantage API.
-    Deletes old CSV files if newer data is found and downloaded. If API limit is reached, it will print a message and continue with the next symbol.
-
-    Parameters:
-    symbols (list): A list of stock symbols to retrieve data for.
-
-    Returns:
-    None
-    """
-    # Read the API key from the file
-    with open('AlphaVantage.txt', 'r') as file:
-        api_key = file.read().strip()
-
-    # Create a TimeSeries object with your API key
-    ts = TimeSeries(key=api_key, output_format='pandas')
-
-    # Loop through the symbols and retrieve the historical data
-    for symbol in symbols:
-        try:
-            # Get the historical data for the symbol
-            data, meta_data = ts.get_daily(symbol=symbol, outputsize='full')
-            
-            # Sort the data by index (date) just in case
-            data.sort_index(inplace=True)
-
-            # Get the first and last dates
-            first_date = data.index[0].strftime('%Y-%m-%d')
-            last_date = data.index[-1].strftime('%Y-%m-%d')
-
-            # Generate the new file name
-            new_file_name = f'{first_date}_{last_date}_{symbol}_historical_data.csv'
-
-            # Check if a file for this symbol already exists
-            existing_files = [f for f in os.listdir() if f.endswith(f'{symbol}_historical_data.csv')]
-            if existing_files:
-                # Sort files to find the most recent one
-                existing_files.sort()
-                most_recent_file = existing_files[-1]
-
-                # Extract dates from the most recent file name
-                existing_first_date, existing_last_date, *_ = most_recent_file.split('_')
-
-                # Compare dates (strings comparison works because of the YYYY-MM-DD format)
-                if existing_first_date <= first_date and existing_last_date >= last_date:
-                    print(f"Data already up-to-date for {symbol}")
-                    continue
-                else:
-                    # Remove older files
-                    for file in existing_files:
-                        os.remove(file)
-                        print(f"Old file {file} deleted for {symbol}")
-
-            # Save the new data to a CSV file
-            data.to_csv(new_file_name)
-            print(f"New data saved for {symbol}: {new_file_name}")
-
-        except ValueError as e:
-            print(f"Error retrieving data for {symbol}: {e}")
-            # Optional: sleep for some time before continuing, or handle the error as needed
-            # time.sleep(60)  # Sleep for 1 minute, for example
+# Downloads the daily history of each symbol from Alpha Vantage and keeps only the most recent CSV per symbol
+from stock_prediction.data import retrieve_stock_data
 
 # Example usage
 symbols_list = ['PLUG', 'NIO', 'NTLA', 'SNAP', 'CHPT']
@@ -137,36 +73,7 @@ retrieve_stock_data(symbols_list)
 
 
 # %%
-import glob
-import pandas as pd
-
-def load_stock_data(symbols):
-    """
-    Load the most recent, up-to-date historical data CSV files into variables.
-    The 'Date' column in each CSV file is used as the DataFrame index and parsed as dates.
-
-    Parameters:
-    symbols (list): A list of stock symbols to load data for.
-
-    Returns:
-    dict: A dictionary containing the loaded data frames, with stock symbols as keys.
-    """
-    data_frames = {}
-
-    for symbol in symbols:
-        # Find the most recent CSV file for the symbol
-        files = glob.glob(f'*{symbol}_historical_data.csv')
-        if files:
-            files.sort()
-            most_recent_file = files[-1]
-
-            # Load the CSV file into a data frame with 'Date' as the index column and parse dates
-            data_frames[symbol] = pd.read_csv(most_recent_file, index_col='date', parse_dates=['date'])
-            print(f"Data loaded for {symbol}: {most_recent_file}")
-        else:
-            print(f"No data found for {symbol}")
-
-    return data_frames
+from stock_prediction.data import load_stock_data
 
 # Example usage
 # symbols_list should be defined earlier in your script
@@ -245,11 +152,28 @@ stock_data['CHPT'].info()
 # %%
 stock_data['CHPT'].isna().sum()
 
+# %% [markdown]
+# ### Screening all of our stocks for anomalies
+# Missing values, missing dates, zero-volume runs, price spikes and split discontinuities are flagged for every stock in one pass. CHPT's zero-volume, flat-price rows before its SPAC merger show up here; `load_stock_data(symbols_list, exclude=['zero_volume'])` drops them before windowing.
+
+# %%
+from stock_prediction.validation import screen_stock_data
+
+anomalies = screen_stock_data(stock_data)
+anomalies.groupby(['symbol', 'check'])['rows'].agg(['count', 'sum'])
+
+# %%
+anomalies[anomalies['check'] != 'zero_volume']
+
 # %% [markdown]
 # ### PLUG Closing Prices in its entirety. 
 
 # %%
-fig = px.line(stock_data['PLUG'], x=stock_data['PLUG'].index, y='4. close', title='PLUG Closing Prices')
+from stock_prediction.downsampling import downsample_series
+
+# The full history has thousands of daily points; LTTB keeps its shape in 2000 of them
+PLUG_close = downsample_series(stock_data['PLUG']['4. close'], 2000).to_frame()
+fig = px.line(PLUG_close, x=PLUG_close.index, y='4. close', title='PLUG Closing Prices')
 fig.show()
 
 # %% [markdown]
@@ -370,16 +294,19 @@ plt.show()
 # %% [markdown]
 # ## Plotting our data together prior normalization
 
+# %%
+from stock_prediction.panel import build_price_panel
+
+# Align the high prices of every symbol on one shared trading calendar (dates x symbols).
+# Days on which a symbol did not trade carry its last price forward.
+high_panel = build_price_panel(stock_data, column='2. high', start='2019', end='2024', gap_policy='ffill')
+print(high_panel)
+
 # %%
 # Plotting before normalization
 # symbols_list = ['PLUG', 'NIO', 'NTLA', 'SNAP', 'CHPT']
 
-
-stock_data['PLUG']['2019':'2024']['2. high'].plot()
-stock_data['NIO']['2019':'2024']['2. high'].plot()
-stock_data['NTLA']['2019':'2024']['2. high'].plot()
-stock_data['SNAP']['2019':'2024']['2. high'].plot()
-stock_data['CHPT']['2019':'2024']['2. high'].plot()
+high_panel.to_frame().plot(ax=plt.gca())
 
 
 # Adding labels and title
@@ -409,17 +336,10 @@ plt.show()
 # Normalizing and comparison
 # Stocks start from 100
 
-normalized_PLUG = stock_data['PLUG']['2019':'2024']['2. high'].div(stock_data['PLUG']['2019':'2024']['2. high'].iloc[0]).mul(100)
-normalized_NIO = stock_data['NIO']['2019':'2024']['2. high'].div(stock_data['NIO']['2019':'2024']['2. high'].iloc[0]).mul(100)
-normalized_NTLA = stock_data['NTLA']['2019':'2024']['2. high'].div(stock_data['NTLA']['2019':'2024']['2. high'].iloc[0]).mul(100)
-normalized_SNAP = stock_data['SNAP']['2019':'2024']['2. high'].div(stock_data['SNAP']['2019':'2024']['2. high'].iloc[0]).mul(100)
-normalized_CHPT = stock_data['CHPT']['2019':'2024']['2. high'].div(stock_data['CHPT']['2019':'2024']['2. high'].iloc[0]).mul(100)
+# Every column of the panel is divided by its first price in one vectorized operation
+normalized_high = pd.DataFrame(high_panel.normalized(base=100), index=high_panel.dates, columns=high_panel.symbols)
 
-normalized_PLUG.plot()
-normalized_NIO.plot()
-normalized_NTLA.plot()
-normalized_SNAP.plot()
-normalized_CHPT.plot()
+normalized_high.plot(ax=plt.gca())
 
 # Adding labels and title
 plt.title('Normalized High Prices of Selected Stocks (2019-2024)')  # Title of the graph
@@ -432,6 +352,25 @@ plt.legend(['PLUG', 'NIO', 'NTLA', 'SNAP', 'CHPT'])
 # Display the plot
 plt.show()
 
+# %% [markdown]
+# ## Correlation of Daily Returns Across Stocks
+# 
+# The open vs. close scatter above only compares two columns of one stock. To compare the stocks with each other we correlate their **daily returns** on the shared trading calendar. Each pair only uses the days on which both stocks traded, so CHPT's shorter history does not shrink the sample of the other pairs.
+
+# %%
+from stock_prediction.correlation import correlation_matrix, top_k_correlated
+
+close_panel = build_price_panel(stock_data, column='4. close', start='2019', end='2024', gap_policy='nan')
+returns_corr = correlation_matrix(close_panel.returns())
+
+fig = px.imshow(returns_corr, x=close_panel.symbols, y=close_panel.symbols, zmin=-1, zmax=1,
+                color_continuous_scale='RdBu_r', text_auto='.2f',
+                title='Correlation of Daily Returns (2019-2024)')
+fig.show()
+
+# The two stocks whose returns move most closely with each stock
+top_k_correlated(returns_corr, close_panel.symbols, k=2)
+
 # %% [markdown]
 # ## Value of Expanding Window Functions in Stock Analysis
 # 
@@ -1051,79 +990,9 @@ plt.show()  # Display the plots
 # 
 
 # %%
-import numpy as np
-
-# outputs all days outlined by the forecast horizon
-def split_data_week_ahead_with_dates_multi(stock, lookback, forecast_horizon):
-    data_raw = stock['Scaled Price'].values
-    dates = stock.index
-    
-    data = []
-    date_labels = []
-    
-    for index in range(len(data_raw) - lookback - forecast_horizon + 1):
-        data.append(data_raw[index: index + lookback + forecast_horizon])
-        # Collect a range of dates for each forecast horizon instead of a single date
-        date_labels.append(dates[index + lookback: index + lookback + forecast_horizon])
-    
-    data = np.array(data)
-    
-    test_set_size = int(np.round(0.2 * data.shape[0]))
-    train_set_size = data.shape[0] - test_set_size
-    
-    x_train = data[:train_set_size, :-forecast_horizon]
-    y_train = data[:train_set_size, -forecast_horizon:]
-    x_test = data[train_set_size:, :-forecast_horizon]
-    y_test = data[train_set_size:, -forecast_horizon:]
-    
-    x_train = x_train.reshape((x_train.shape[0], x_train.shape[1], 1))
-    x_test = x_test.reshape((x_test.shape[0], x_test.shape[1], 1))
-    
-    # Adjusting how dates are split to accommodate the change
-    dates_train = date_labels[:train_set_size]
-    dates_test = date_labels[train_set_size:]
-    
-    return x_train, y_train, x_test, y_test, dates_train, dates_test
-
-
-# %%
-# Outputs just the last date of each forecast horizon
-
-import numpy as np
-
-def split_data_week_ahead_with_dates_single(stock, lookback, forecast_horizon):
-    data_raw = stock['Scaled Price'].values
-    dates = stock.index
-    
-    data = []
-    date_labels = []
-    
-    for index in range(len(data_raw) - lookback - forecast_horizon + 1):
-        data.append(data_raw[index: index + lookback + forecast_horizon])
-        # Now collecting only the date corresponding to the last day of each forecast horizon
-        date_labels.append(dates[index + lookback + forecast_horizon - 1])  # Just the last day
-    
-    data = np.array(data)
-    
-    test_set_size = int(np.round(0.2 * data.shape[0]))
-    train_set_size = data.shape[0] - test_set_size
-    
-    # Extracting input sequences for training and testing
-    x_train = data[:train_set_size, :-forecast_horizon]
-    x_test = data[train_set_size:, :-forecast_horizon]
-    
-    # Modifying to focus only on the last day of the forecast horizon for y_train and y_test
-    y_train = data[:train_set_size, -1].reshape(-1, 1)  # Reshaping to keep 2D structure
-    y_test = data[train_set_size:, -1].reshape(-1, 1)   # Reshaping to keep 2D structure
-    
-    x_train = x_train.reshape((x_train.shape[0], x_train.shape[1], 1))
-    x_test = x_test.reshape((x_test.shape[0], x_test.shape[1], 1))
-    
-    # Adjusting how dates are handled to match the new y_train and y_test structure
-    dates_train = [date_labels[i] for i in range(train_set_size)]
-    dates_test = [date_labels[i] for i in range(train_set_size, len(date_labels))]
-    
-    return x_train, y_train, x_test, y_test, dates_train, dates_test
+# split_data_week_ahead_with_dates_multi outputs all days outlined by the forecast horizon,
+# split_data_week_ahead_with_dates_single outputs just the last date of each forecast horizon
+from stock_prediction.windows import split_data_week_ahead_with_dates_multi, split_data_week_ahead_with_dates_single
 
 
 # %%
@@ -1337,57 +1206,7 @@ num_epochs = 105
 import torch
 import torch.nn as nn
 
-class GRU(nn.Module):
-    """
-    GRU Neural Network for time series forecasting.
-    
-    Attributes:
-    - input_dim: The number of input features per timestep.
-    - hidden_dim: The number of features in the hidden state h.
-    - num_layers: The number of stacked GRU layers.
-    - output_dim: The number of output features (forecast horizon).
-    """
-    
-    def __init__(self, input_dim, hidden_dim, num_layers, output_dim):
-        """
-        Initializes the GRU model with the specified parameters and layers.
-        
-        Parameters:
-        - input_dim (int): Number of input features.
-        - hidden_dim (int): Size of GRU hidden layers.
-        - num_layers (int): Number of GRU layers.
-        - output_dim (int): Number of output features.
-        """
-        super(GRU, self).__init__()
-        self.hidden_dim = hidden_dim  # Size of the hidden layer
-        self.num_layers = num_layers  # Number of GRU layers
-        
-        # The GRU layer; batch_first=True means the input tensors will be of shape (batch_size, seq_length, features)
-        self.gru = nn.GRU(input_dim, hidden_dim, num_layers, batch_first=True)
-        # Fully connected layer that maps the GRU layer output to the desired output_dim
-        self.fc = nn.Linear(hidden_dim, output_dim)
-
-    def forward(self, x):
-        """
-        Defines the forward pass of the model.
-        
-        Parameters:
-        - x (Tensor): The input sequence to the GRU model.
-        
-        Returns:
-        - Tensor: The output of the model.
-        """
-        # Initialize hidden state with zeros
-        # Shape: (num_layers, batch_size, hidden_dim)
-        h0 = torch.zeros(self.num_layers, x.size(0), self.hidden_dim).requires_grad_()
-        
-        # Forward propagate the GRU
-        # out: tensor containing the output features (h_t) from the last layer of the GRU, for each t.
-        out, (hn) = self.gru(x, (h0.detach()))  # detach h0 to prevent backprop through the initial hidden state
-        
-        # Decode the hidden state of the last time step
-        out = self.fc(out[:, -1, :]) 
-        return out
+from stock_prediction.model import GRU
 
 
 # %%
@@ -1429,76 +1248,46 @@ optimiser_single = torch.optim.Adam(model_single.parameters(), lr=0.01)
 
 
 # %%
-import time  # Import the time module to track the duration of the training process.
-
-# Initialize an array to record the loss at each epoch.
-hist_multi = np.zeros(num_epochs)
+import logging
+from stock_prediction.instrumentation import JsonLinesSink, LoggingSink, predict_instrumented, train_instrumented
 
-# Record the start time to calculate the total training duration.
-start_time = time.time()
+# Per-epoch metrics (loss, forward/backward/optimizer time, samples per second and peak memory)
+# are written to a JSON lines file and the logging module instead of printing the MSE every epoch.
+logging.basicConfig(level=logging.WARNING)
+metric_sinks = [JsonLinesSink('training_metrics.jsonl'), LoggingSink()]
 
 # This list 'gru' appears unused in the provided snippet. 
 # If it's intended for storing model states or outputs at each epoch, consider adding relevant code or removing the declaration.
 gru = []
 
-# Begin training over the specified number of epochs.
-for t in range(num_epochs):
-    # Forward pass: Compute the predicted y by passing x to the model.
-    y_train_pred_multi = model_multi(x_train_gru_multi)
-
-    # Compute and print the loss using the Mean Squared Error between predicted and actual y values in the training set.
-    loss_multi = criterion(y_train_pred_multi, y_train_gru_multi)
-    print(f"Epoch {t} MSE: {loss_multi.item()}")
-    hist_multi[t] = loss_multi.item()  # Store the loss in 'hist' for later analysis or plotting.
-
-    # Zero the gradients before running the backward pass.
-    optimiser_multi.zero_grad()
-    
-    # Backward pass: Compute the gradient of the loss with respect to model parameters.
-    loss_multi.backward()
-    
-    # Perform a single optimization step (parameter update).
-    optimiser_multi.step()
-
-# Calculate and print the total training time.
-training_time = time.time() - start_time    
-print(f"Training time: {training_time}")
-
+# Train over the specified number of epochs; the loss of each epoch is stored in 'hist' for later analysis or plotting.
+hist_multi, training_summary_multi = train_instrumented(model_multi, criterion, optimiser_multi, x_train_gru_multi, y_train_gru_multi, num_epochs,
+                                                        sinks=metric_sinks, labels={'symbol': 'PLUG', 'model': 'multi'})
 
-# %%
-import time  # Import the time module to track the duration of the training process.
+# Predictions of the trained model for the training sequences.
+y_train_pred_multi = predict_instrumented(model_multi, x_train_gru_multi, sinks=metric_sinks, labels={'symbol': 'PLUG', 'model': 'multi'})
 
-# Initialize an array to record the loss at each epoch.
-hist_single = np.zeros(num_epochs)
+# Print the final loss and the total training time.
+training_time = training_summary_multi['training_seconds']
+print(f"Final MSE: {hist_multi[-1]}")
+print(f"Training time: {training_time}")
 
-# Record the start time to calculate the total training duration.
-start_time = time.time()
 
+# %%
 # This list 'gru' appears unused in the provided snippet. 
 # If it's intended for storing model states or outputs at each epoch, consider adding relevant code or removing the declaration.
 gru = []
 
-# Begin training over the specified number of epochs.
-for t in range(num_epochs):
-    # Forward pass: Compute the predicted y by passing x to the model.
-    y_train_pred_single = model_single(x_train_gru_single)
-
-    # Compute and print the loss using the Mean Squared Error between predicted and actual y values in the training set.
-    loss_single = criterion(y_train_pred_single, y_train_gru_single)
-    print(f"Epoch {t} MSE: {loss_single.item()}")
-    hist_single[t] = loss_single.item()  # Store the loss in 'hist' for later analysis or plotting.
-
-    # Zero the gradients before running the backward pass.
-    optimiser_single.zero_grad()
-    
-    # Backward pass: Compute the gradient of the loss with respect to model parameters.
-    loss_single.backward()
-    
-    # Perform a single optimization step (parameter update).
-    optimiser_single.step()
-
-# Calculate and print the total training time.
-training_time = time.time() - start_time    
+# Train over the specified number of epochs; the loss of each epoch is stored in 'hist' for later analysis or plotting.
+hist_single, training_summary_single = train_instrumented(model_single, criterion, optimiser_single, x_train_gru_single, y_train_gru_single, num_epochs,
+                                                          sinks=metric_sinks, labels={'symbol': 'PLUG', 'model': 'single'})
+
+# Predictions of the trained model for the training sequences.
+y_train_pred_single = predict_instrumented(model_single, x_train_gru_single, sinks=metric_sinks, labels={'symbol': 'PLUG', 'model': 'single'})
+
+# Print the final loss and the total training time.
+training_time = training_summary_single['training_seconds']
+print(f"Final MSE: {hist_single[-1]}")
 print(f"Training time: {training_time}")
 
 
@@ -1518,51 +1307,42 @@ import torch
 # Make predictions using the trained model on both the training and testing datasets.
 y_test_pred_multi = model_multi(x_test_gru_multi)
 
-# Inverse transform predictions and actuals
-y_train_pred_inv_multi = scaler.inverse_transform(y_train_pred_multi.detach().numpy())
-y_train_inv_multi = scaler.inverse_transform(y_train_gru_multi.detach().numpy())
-
-y_test_pred_inv_multi = scaler.inverse_transform(y_test_pred_multi.detach().numpy())  # Inverse transform for testing predictions
-y_test_inv_multi = scaler.inverse_transform(y_test_gru_multi.detach().numpy())  # Inverse transform for actual testing values
-
-# Initialize dictionaries to hold DataFrames for each day's predictions and actuals
-train_predict_multi = {}
-train_original_multi = {}
-test_predict_multi = {}
-test_original_multi = {}
-
-
-for day in range(forecast_horizon):
-    # Extract predictions and actuals for the current day
-    train_day_predictions = y_train_pred_inv_multi[:, day]
-    train_day_actuals = y_train_inv_multi[:, day]
-    
-    # Extract dates for the current day from each sequence's dates list
-    train_day_dates = [dates[day] for dates in dates_train_multi]  # Assuming dates_train is a list of lists
-    
-    # Create DataFrames for the current day's predictions and actuals
-    train_predict_multi[f"Day {day + 1}"] = pd.DataFrame(train_day_predictions, columns=[f"Predicted Day {day + 1}"])
-    train_original_multi[f"Day {day + 1}"] = pd.DataFrame(train_day_actuals, columns=[f"Actual Day {day + 1}"])
-    
-    # Set the index of each DataFrame to the corresponding dates
-    train_predict_multi[f"Day {day + 1}"].index = pd.to_datetime(train_day_dates)
-    train_original_multi[f"Day {day + 1}"].index = pd.to_datetime(train_day_dates)
-
-    # Extract test predictions and actuals for the current day
-    test_day_predictions = y_test_pred_inv_multi[:, day]
-    test_day_actuals = y_test_inv_multi[:, day]
-    
-    # Extract dates for the current day from each sequence's dates list in the test dataset
-    # This assumes 'dates_test_multi' is structured similarly to 'dates_train_multi', as a list of lists
-    test_day_dates = [dates[day] for dates in dates_test_multi]  # Update this variable as per your data structure
-    
-    # Create DataFrames for the current day's test predictions and actuals
-    test_predict_multi[f"Day {day + 1}"] = pd.DataFrame(test_day_predictions, columns=[f"Predicted Day {day + 1}"])
-    test_original_multi[f"Day {day + 1}"] = pd.DataFrame(test_day_actuals, columns=[f"Actual Day {day + 1}"])
-    
-    # Set the index of each DataFrame to the corresponding test dates
-    test_predict_multi[f"Day {day + 1}"].index = pd.to_datetime(test_day_dates)
-    test_original_multi[f"Day {day + 1}"].index = pd.to_datetime(test_day_dates)
+# Undo the scaling of predictions and actuals. The scaler was fitted on one column, so
+# scaler.inverse_transform only handled the 7-wide arrays by broadcasting its parameters
+# by accident; the affine parameters are applied to the whole arrays directly instead
+from stock_prediction.results import assemble_predictions, inverse_scale, window_offsets
+
+y_train_pred_inv_multi = inverse_scale(y_train_pred_multi.detach().numpy(), scaler.scale_[0], scaler.min_[0])
+y_train_inv_multi = inverse_scale(y_train_gru_multi.detach().numpy(), scaler.scale_[0], scaler.min_[0])
+
+y_test_pred_inv_multi = inverse_scale(y_test_pred_multi.detach().numpy(), scaler.scale_[0], scaler.min_[0])  # Inverse transform for testing predictions
+y_test_inv_multi = inverse_scale(y_test_gru_multi.detach().numpy(), scaler.scale_[0], scaler.min_[0])  # Inverse transform for actual testing values
+
+# Store one row per window and forecast day in the columnar prediction store,
+# instead of building a separate DataFrame for every day and split
+import pyarrow as pa
+from datetime import datetime
+from stock_prediction.prediction_store import PredictionStore, store_daily_frames
+
+# The target dates come from the integer offset of every window's first target day,
+# not from the per-window date lists
+model_version_multi = f"notebook-multi-{datetime.now():%Y%m%dT%H%M%S}"
+offsets_train_multi = window_offsets(len(scaled_prices_with_dates), lookback, forecast_horizon, 0, len(x_train_multi))
+offsets_test_multi = window_offsets(len(scaled_prices_with_dates), lookback, forecast_horizon, len(x_train_multi), len(x_test_multi))
+
+prediction_store = PredictionStore('predictions')
+prediction_store.append(pa.concat_tables([
+    assemble_predictions(['PLUG'], y_train_pred_multi.detach().numpy()[..., None], y_train_gru_multi.detach().numpy()[..., None],
+                         scaled_prices_with_dates.index, offsets_train_multi, scaler.scale_[0], scaler.min_[0], model_version_multi, split='train'),
+    assemble_predictions(['PLUG'], y_test_pred_multi.detach().numpy()[..., None], y_test_gru_multi.detach().numpy()[..., None],
+                         scaled_prices_with_dates.index, offsets_test_multi, scaler.scale_[0], scaler.min_[0], model_version_multi, split='test'),
+]))
+predictions_multi = prediction_store.query(['PLUG'], model_version=model_version_multi)
+
+# The per-day DataFrame dictionaries used by the plots below
+train_predict_multi, train_original_multi = store_daily_frames(
+    predictions_multi[predictions_multi['split'] == 'train'])
+test_predict_multi, test_original_multi = store_daily_frames(predictions_multi[predictions_multi['split'] == 'test'])
 
 
 # %%
@@ -1595,10 +1375,10 @@ y_test_pred_single = model_single(x_test_gru_single)
 # This step is necessary to make the error metrics comparable to the original data values.
 
 # Inverse transform the predictions and actual values for the last day
-y_train_pred_inv_single = scaler.inverse_transform(y_train_pred_single.detach().numpy())
-y_train_inv_single = scaler.inverse_transform(y_train_gru_single.detach().numpy())
-y_test_pred_inv_single = scaler.inverse_transform(y_test_pred_single.detach().numpy())  # Inverse transform for testing predictions
-y_test_inv_single = scaler.inverse_transform(y_test_gru_single.detach().numpy())  # Inverse transform for actual testing values
+y_train_pred_inv_single = inverse_scale(y_train_pred_single.detach().numpy(), scaler.scale_[0], scaler.min_[0])
+y_train_inv_single = inverse_scale(y_train_gru_single.detach().numpy(), scaler.scale_[0], scaler.min_[0])
+y_test_pred_inv_single = inverse_scale(y_test_pred_single.detach().numpy(), scaler.scale_[0], scaler.min_[0])  # Inverse transform for testing predictions
+y_test_inv_single = inverse_scale(y_test_gru_single.detach().numpy(), scaler.scale_[0], scaler.min_[0])  # Inverse transform for actual testing values
 
 # Create DataFrames for the predictions and actual values
 train_predict_single = pd.DataFrame(y_train_pred_inv_single, columns=['Predicted'])
@@ -1704,10 +1484,10 @@ y_test_pred_multi = model_multi(x_test_gru_multi)
 
 # Invert predictions to transform them back to the original data scale, undoing the earlier normalization.
 # This step is necessary to make the error metrics comparable to the original data values.
-y_train_pred_inv_multi = scaler.inverse_transform(y_train_pred_multi.detach().numpy())  # Inverse transform for training predictions
-y_train_inv_multi = scaler.inverse_transform(y_train_gru_multi.detach().numpy())  # Inverse transform for actual training values
-y_test_pred_inv_multi = scaler.inverse_transform(y_test_pred_multi.detach().numpy())  # Inverse transform for testing predictions
-y_test_inv_multi = scaler.inverse_transform(y_test_gru_multi.detach().numpy())  # Inverse transform for actual testing values
+y_train_pred_inv_multi = inverse_scale(y_train_pred_multi.detach().numpy(), scaler.scale_[0], scaler.min_[0])  # Inverse transform for training predictions
+y_train_inv_multi = inverse_scale(y_train_gru_multi.detach().numpy(), scaler.scale_[0], scaler.min_[0])  # Inverse transform for actual training values
+y_test_pred_inv_multi = inverse_scale(y_test_pred_multi.detach().numpy(), scaler.scale_[0], scaler.min_[0])  # Inverse transform for testing predictions
+y_test_inv_multi = inverse_scale(y_test_gru_multi.detach().numpy(), scaler.scale_[0], scaler.min_[0])  # Inverse transform for actual testing values
 
 # # Calculate the root mean squared error (RMSE) for both training and testing datasets.
 # # RMSE is a standard way to measure the error of a model in predicting quantitative data.
@@ -1733,17 +1513,13 @@ gru.append(training_time)
 
 # %%
 import plotly.graph_objects as go
+from stock_prediction.evaluation import rmse_per_day
 
 # Placeholder data for demonstration
 days = list(range(1, 8))
-# Placeholder lists for RMSE values
-train_rmse = []
-test_rmse = []
-
-# Calculate RMSE for each day and append to lists
-for i in range(7):  # Assuming there are 7 days in the forecast horizon
-    train_rmse.append(math.sqrt(mean_squared_error(y_train_inv_multi[:, i], y_train_pred_inv_multi[:, i])))
-    test_rmse.append(math.sqrt(mean_squared_error(y_test_inv_multi[:, i], y_test_pred_inv_multi[:, i])))
+# Calculate RMSE for each day of the forecast horizon
+train_rmse = rmse_per_day(y_train_inv_multi, y_train_pred_inv_multi)
+test_rmse = rmse_per_day(y_test_inv_multi, y_test_pred_inv_multi)
 
 # Create a Plotly graph object for plotting
 fig = go.Figure()
@@ -1773,10 +1549,10 @@ y_test_pred_single = model_single(x_test_gru_single)
 
 # Invert predictions to transform them back to the original data scale, undoing the earlier normalization.
 # This step is necessary to make the error metrics comparable to the original data values.
-y_train_pred_inv_single = scaler.inverse_transform(y_train_pred_single.detach().numpy())  # Inverse transform for training predictions
-y_train_inv_single = scaler.inverse_transform(y_train_gru_single.detach().numpy())  # Inverse transform for actual training values
-y_test_pred_inv_single = scaler.inverse_transform(y_test_pred_single.detach().numpy())  # Inverse transform for testing predictions
-y_test_inv_single = scaler.inverse_transform(y_test_gru_single.detach().numpy())  # Inverse transform for actual testing values
+y_train_pred_inv_single = inverse_scale(y_train_pred_single.detach().numpy(), scaler.scale_[0], scaler.min_[0])  # Inverse transform for training predictions
+y_train_inv_single = inverse_scale(y_train_gru_single.detach().numpy(), scaler.scale_[0], scaler.min_[0])  # Inverse transform for actual training values
+y_test_pred_inv_single = inverse_scale(y_test_pred_single.detach().numpy(), scaler.scale_[0], scaler.min_[0])  # Inverse transform for testing predictions
+y_test_inv_single = inverse_scale(y_test_gru_single.detach().numpy(), scaler.scale_[0], scaler.min_[0])  # Inverse transform for actual testing values
 
 # Calculate the root mean squared error (RMSE) for both training and testing datasets.
 # RMSE is a standard way to measure the error of a model in predicting quantitative data.
@@ -1803,9 +1579,12 @@ full_orig = pd.concat([day_7_train_orig, day_7_test_orig])
 fig = go.Figure()
 
 # Adding traces for train prediction, test prediction, and actual values
-fig.add_trace(go.Scatter(x=day_7_train_pred.index, y=day_7_train_pred['Predicted'], mode='lines', name='Train Prediction'))
-fig.add_trace(go.Scatter(x=day_7_test_pred.index, y=day_7_test_pred['Predicted'], mode='lines', name='Test Prediction'))
-fig.add_trace(go.Scatter(x=full_orig.index, y=full_orig['Actual'], mode='lines', name='Actual Value'))
+# (downsampled to at most 2000 points each, see stock_prediction.downsampling)
+for name, values in [('Train Prediction', day_7_train_pred['Predicted']),
+                     ('Test Prediction', day_7_test_pred['Predicted']),
+                     ('Actual Value', full_orig['Actual'])]:
+    values = downsample_series(values, 2000)
+    fig.add_trace(go.Scatter(x=values.index, y=values.values, mode='lines', name=name))
 
 # Updating layout for aesthetics
 fig.update_layout(
@@ -1823,11 +1602,13 @@ fig.update_layout(
         ),
     ),
     yaxis=dict(
-        title_text='Close (USD)',
-        titlefont=dict(
-            family='Arial',
-            size=12,
-            color='rgb(82, 82, 82)',
+        title=dict(
+            text='Close (USD)',
+            font=dict(
+                family='Arial',
+                size=12,
+                color='rgb(82, 82, 82)',
+            ),
         ),
         showline=True,
         showgrid=True,
@@ -1847,78 +1628,51 @@ fig.show()
 
 
 # %%
-def plot_prediction_for_day(train_predict, train_original, test_predict, test_original, day_number):
-    import plotly.graph_objects as go
-    import pandas as pd
+from stock_prediction.plotting import plot_prediction_for_day
 
-    # Validating day_number
-    if day_number < 1 or day_number > 7:
-        print("Day number must be between 1 and 7.")
-        return
+# Example usage (assuming the dictionaries train_predict_multi, train_original_multi, test_predict_multi, test_original_multi are defined as per your data)
+# plot_prediction_for_day(train_predict_multi, train_original_multi, test_predict_multi, test_original_multi, 3)
+# Zoom in at full resolution on a date range:
+# plot_prediction_for_day(train_predict_multi, train_original_multi, test_predict_multi, test_original_multi, 3, x_range=('2021-01', '2021-06'))
 
-    day_key = f"Day {day_number}"
 
-    # Extracting data for the specified day
-    day_train_pred = train_predict[day_key]
-    day_train_orig = train_original[day_key]
-    day_test_pred = test_predict[day_key]
-    day_test_orig = test_original[day_key]
+# %%
+plot_prediction_for_day(train_predict_multi, train_original_multi, test_predict_multi, test_original_multi, 7)
 
-    # Combining train and test data for a continuous plot
-    full_pred = pd.concat([day_train_pred, day_test_pred])
-    full_orig = pd.concat([day_train_orig, day_test_orig])
 
-    # Creating the figure object
-    fig = go.Figure()
 
-    # Adding traces for train prediction, test prediction, and actual values
-    fig.add_trace(go.Scatter(x=day_train_pred.index, y=day_train_pred[f'Predicted {day_key}'], mode='lines', name='Train Prediction'))
-    fig.add_trace(go.Scatter(x=day_test_pred.index, y=day_test_pred[f'Predicted {day_key}'], mode='lines', name='Test Prediction'))
-    fig.add_trace(go.Scatter(x=full_orig.index, y=full_orig[f'Actual {day_key}'], mode='lines', name='Actual Value'))
 
-    # Updating layout for aesthetics
-    fig.update_layout(
-        xaxis=dict(
-            showline=True,
-            showgrid=True,
-            showticklabels=True,  # Show tick labels for dates
-            linecolor='rgb(204, 204, 204)',
-            linewidth=2,
-            ticks='outside',
-            tickfont=dict(
-                family='Arial',
-                size=12,
-                color='rgb(82, 82, 82)',
-            ),
-        ),
-        yaxis=dict(
-            title_text='Close (USD)',
-            titlefont=dict(
-                family='Arial',
-                size=12,
-                color='rgb(82, 82, 82)',
-            ),
-            showline=True,
-            showgrid=True,
-            showticklabels=True,
-            linecolor='rgb(204, 204, 204)',
-            linewidth=2,
-        ),
-        showlegend=True,
-        template='plotly_dark',
-    )
+# %% [markdown]
+# ## Ensemble of GRU Models
+#
+# The multi-day and single-day models above were compared by hand. An ensemble trains several GRUs with different seeds in parallel worker processes, all reading the same cached training windows, and averages their forecasts. The standard deviation across the members shows how much the models disagree, which serves as an uncertainty estimate for every forecast day.
 
-    # Adding a title to the plot
-    fig.update_layout(title_text=f'PLUG Stock Prediction for {day_key}', title_x=0.5)
+# %%
+from stock_prediction.ensemble import member_specs, train_ensemble
 
-    # Showing the figure
-    fig.show()
+ensemble = train_ensemble(x_train_multi, y_train_multi, member_specs(5, num_epochs=num_epochs))
+ensemble_forecast, ensemble_spread = ensemble.predict(x_test_multi)
 
-# Example usage (assuming the dictionaries train_predict_multi, train_original_multi, test_predict_multi, test_original_multi are defined as per your data)
-# plot_prediction_for_day(train_predict_multi, train_original_multi, test_predict_multi, test_original_multi, 3)
+# Back to USD; the spread only scales, it does not shift
+ensemble_forecast_inv = scaler.inverse_transform(ensemble_forecast.reshape(-1, 1)).reshape(ensemble_forecast.shape)
+ensemble_spread_inv = ensemble_spread / scaler.scale_[0]
+
+print('Ensemble Test RMSE per day:', [round(score, 3) for score in rmse_per_day(y_test_inv_multi, ensemble_forecast_inv)])
+print('Mean member spread per day (USD):', ensemble_spread_inv.mean(axis=0).round(3))
 
 
+# %% [markdown]
+# ## Classical Baselines
+#
+# A 105-epoch GRU is only worth training if it beats cheap forecasts. The baselines below forecast the same 7-day test windows: the last known price (naive), the price one trading week earlier (seasonal naive), exponential smoothing (ETS) and ARIMA(1,1,1). Their test RMSE per day goes to the same metrics table as the GRU's, and `python -m stock_prediction train --skip-beaten` skips symbols where a baseline wins.
+
 # %%
-plot_prediction_for_day(train_predict_multi, train_original_multi, test_predict_multi, test_original_multi, 7)
+from stock_prediction.baselines import fit_baselines
+from stock_prediction.metrics_table import GRU_MODEL, MetricsTable, metric_rows
 
+metrics_table = MetricsTable('metrics.csv')
+baseline_results = fit_baselines(['PLUG', 'NIO', 'NTLA', 'SNAP', 'CHPT'])
+metrics_table.append([row for result in baseline_results.values() for row in result['metrics']])
+metrics_table.append(metric_rows('PLUG', GRU_MODEL, y_test_inv_multi, y_test_pred_inv_multi))
 
+print(metrics_table.summary().round(3))
@@ -0,0 +1,137 @@
+"""
+Fixtures for the pipeline benchmarks.
+
+The benchmarks run fully offline on the five bundled CSV files (scale 1) and on
+synthetic universes made of perturbed copies of them (scale 10 = 50 symbols, and so on).
+
+Environment variables:
+- BENCH_SCALES: Comma-separated scale factors to run (default '1,10'; 100 and 1000 are heavy).
+- BENCH_EPOCHS: Training epochs per benchmarked model (default 5).
+- BENCH_TRAIN_SYMBOLS: Number of symbols whose model is trained per scale (default 2).
+- BENCH_PLOT_SYMBOLS: Number of symbols whose figure is built per scale, and rendered in the render
+  benchmark (default 2).
+- BENCH_TOLERANCE: Relative slowdown flagged as a regression (default 0.25).
+- BENCH_UPDATE_BASELINE: Set to 1 to store this run as the new baseline. The first run on a
+  machine, without benchmarks/baseline.json, stores it regardless.
+- BENCH_FAIL_ON_REGRESSION: Set to 1 to fail the session when a regression is flagged, or when
+  there was no baseline to check against (run once without it to bootstrap one).
+- BENCH_ZOO_EPOCHS: Training epochs per network in the model zoo benchmark (default 20).
+- BENCH_ERROR_BUDGET: Test RMSE in USD the model zoo selection must meet (default: 10% above the best).
+- BENCH_INTRADAY_DAYS: Trading days of synthetic minute bars in the intraday benchmark (default 250).
+- BENCH_PERF_EPOCHS: Training epochs per mode in the CPU performance mode benchmark (default 30).
+- BENCH_STRATEGY_EPOCHS: Training epochs per strategy in the forecasting strategy benchmark (default 20).
+- BENCH_QUANTILE_EPOCHS: Training epochs per mode in the quantile forecasting benchmark (default 30).
+- BENCH_MONITOR_YEARS: Years of stored PLUG forecasts replayed in the drift monitoring benchmark (default 2).
+- BENCH_ASSEMBLY_SYMBOLS: Symbols whose forecasts are assembled in the result assembly benchmark (default 500).
+- BENCH_ATTRIBUTION_WINDOWS: Test windows attributed one at a time and batched in the attribution benchmark (default 64).
+- BENCH_STREAM_SCALE: Copies of every bundled symbol replayed in the streaming benchmark (default 10).
+- BENCH_STREAM_START: First date replayed in the streaming benchmark (default '2023-07').
+- BENCH_STREAM_SPEEDUP: Replay speed relative to real time in the paced streaming entry (default 8640000).
+- BENCH_STOP_EPOCHS: Training epochs with and without early stopping in the early stopping benchmark (default 60).
+- BENCH_CORRELATION_BLOCK: Symbols per block of the blocked correlation matrix (default 16).
+- BENCH_CORRELATION_WINDOW: Days per rolling correlation matrix (default 60).
+- BENCH_ENSEMBLE_MEMBERS: Members of the ensemble in the ensemble benchmark (default 3).
+- BENCH_COMPILE: Set to 1 to include torch.compile in the CPU performance mode benchmark.
+"""
+import os
+import warnings
+
+import numpy as np
+import pytest
+
+from harness import BenchmarkRecorder
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BUNDLED_SYMBOLS = ['PLUG', 'NIO', 'NTLA', 'SNAP', 'CHPT']
+
+SCALES = [int(scale) for scale in os.environ.get('BENCH_SCALES', '1,10').split(',')]
+EPOCHS = int(os.environ.get('BENCH_EPOCHS', '5'))
+TRAIN_SYMBOLS = int(os.environ.get('BENCH_TRAIN_SYMBOLS', '2'))
+PLOT_SYMBOLS = int(os.environ.get('BENCH_PLOT_SYMBOLS', '2'))
+
+
+class Universe:
+    """
+    A set of symbols whose historical data CSV files live in data_dir.
+    """
+
+    def __init__(self, scale, data_dir, symbols):
+        self.scale = scale
+        self.data_dir = data_dir
+        self.symbols = symbols
+        # Results of earlier stages, so each stage can start from its real inputs
+        self.state = {}
+
+
+def write_synthetic_universe(data_dir, scale, seed=0):
+    """
+    Write `scale` perturbed copies of every bundled symbol into data_dir.
+
+    Each copy multiplies the OHLC prices of its source by a random-walk factor and the
+    volume by a log-normal factor, so series keep realistic lengths and gaps.
+
+    Returns:
+    list: The synthetic symbols, named SYN00000, SYN00001, ...
+    """
+    from stock_prediction.data import load_stock_data
+
+    rng = np.random.default_rng(seed)
+    sources = load_stock_data(BUNDLED_SYMBOLS, REPO_DIR)
+    price_columns = ['1. open', '2. high', '3. low', '4. close']
+
+    symbols = []
+    for copy in range(scale):
+        for source in sources.values():
+            symbol = f'SYN{len(symbols):05d}'
+            factor = np.exp(np.cumsum(rng.normal(0.0, 0.01, len(source))))
+            frame = source.copy()
+            frame[price_columns] = frame[price_columns].to_numpy() * factor[:, None]
+            frame['5. volume'] = np.round(frame['5. volume'].to_numpy() * rng.lognormal(0.0, 0.2, len(source)))
+
+            first_date = frame.index[0].strftime('%Y-%m-%d')
+            last_date = frame.index[-1].strftime('%Y-%m-%d')
+            frame.to_csv(os.path.join(data_dir, f'{first_date}_{last_date}_{symbol}_historical_data.csv'))
+            symbols.append(symbol)
+    return symbols
+
+
+@pytest.fixture(scope='session')
+def recorder():
+    recorder = BenchmarkRecorder(
+        history_path=os.path.join(BENCHMARK_DIR, 'results', 'history.json'),
+        baseline_path=os.path.join(BENCHMARK_DIR, 'baseline.json'),
+        tolerance=float(os.environ.get('BENCH_TOLERANCE', '0.25')),
+    )
+    yield recorder
+
+    run = recorder.write(update_baseline=os.environ.get('BENCH_UPDATE_BASELINE') == '1')
+    for regression in run['regressions']:
+        message = (f"Benchmark regression in {regression['stage']} at scale {regression['scale']}: "
+                   f"{regression['metric']} {regression['current']:.4g} vs baseline "
+                   f"{regression['baseline']:.4g} ({regression['ratio']:.2f}x)")
+        warnings.warn(message)
+    if run['bootstrapped']:
+        warnings.warn(f"No benchmark baseline yet; this run was stored as {recorder.baseline_path}")
+    if os.environ.get('BENCH_FAIL_ON_REGRESSION') == '1':
+        if run['bootstrapped']:
+            pytest.fail(f"No benchmark baseline to check against; {recorder.baseline_path} is bootstrapped now, "
+                        f"rerun to check for regressions")
+        if run['regressions']:
+            pytest.fail(f"{len(run['regressions'])} benchmark regression(s), see {recorder.history_path}")
+
+
+_universes = {}
+
+
+@pytest.fixture(scope='session', params=SCALES, ids=lambda scale: f'{scale}x')
+def universe(request, tmp_path_factory):
+    scale = request.param
+    if scale not in _universes:
+        if scale == 1:
+            _universes[scale] = Universe(scale, REPO_DIR, list(BUNDLED_SYMBOLS))
+        else:
+            data_dir = str(tmp_path_factory.mktemp(f'universe_{scale}x'))
+            _universes[scale] = Universe(scale, data_dir, write_synthetic_universe(data_dir, scale))
+    return _universes[scale]
+
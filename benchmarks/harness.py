@@ -0,0 +1,146 @@
+"""
+Timing, memory and regression bookkeeping for the pipeline benchmarks.
+
+Every measured stage produces one entry with its wall time, throughput and memory.
+Entries of a run are appended to a JSON history file and compared against a stored
+baseline; a stage is flagged as a regression when it is slower (or uses more memory)
+than the baseline by more than the tolerance. Timings only compare on the same
+machine, so the baseline is not versioned: the first run on a machine, without a
+baseline file, bootstraps it, and later runs are checked against it.
+"""
+import datetime
+import json
+import os
+import platform
+import time
+import tracemalloc
+
+from stock_prediction.instrumentation import peak_rss_bytes
+
+
+class BenchmarkRecorder:
+    """
+    Collects benchmark entries for one pytest session.
+
+    Attributes:
+    - history_path: JSON file the run is appended to.
+    - baseline_path: JSON file holding the reference entries.
+    - tolerance: Allowed relative slowdown before an entry is flagged, e.g. 0.25 for 25%.
+    """
+
+    def __init__(self, history_path, baseline_path, tolerance=0.25):
+        self.history_path = history_path
+        self.baseline_path = baseline_path
+        self.tolerance = tolerance
+        self.entries = []
+
+    def measure(self, stage, scale, func, items, unit, trace_memory=True, **extra):
+        """
+        Time one call of func, optionally measure its peak traced memory in a second call,
+        and record the result.
+
+        Parameters:
+        stage (str): Name of the pipeline stage.
+        scale (int): Universe scale factor the stage ran on.
+        func (callable): The work to measure; called without arguments.
+        items (int or callable): Number of items processed, used for the throughput; a
+            callable is given the result of func and returns the count.
+        unit (str): What an item is, e.g. 'rows' or 'windows'.
+        trace_memory (bool): Re-run func under tracemalloc to record its peak allocation.
+            Timing is always taken from the untraced call.
+        extra: Additional fields stored with the entry.
+
+        Returns:
+        object: The return value of the timed call.
+        """
+        start = time.perf_counter()
+        result = func()
+        wall = time.perf_counter() - start
+
+        peak_traced = None
+        if trace_memory:
+            tracemalloc.start()
+            func()
+            peak_traced = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        if callable(items):
+            items = items(result)
+
+        self.entries.append({
+            'stage': stage,
+            'scale': scale,
+            'wall_seconds': wall,
+            'items': items,
+            'unit': unit,
+            'throughput': items / wall if wall > 0 else None,
+            'peak_traced_bytes': peak_traced,
+            'peak_rss_bytes': peak_rss_bytes(),
+            **extra,
+        })
+        return result
+
+    def _load(self, path, default):
+        if not os.path.exists(path):
+            return default
+        with open(path) as file:
+            return json.load(file)
+
+    def regressions(self):
+        """
+        Compare the recorded entries with the baseline.
+
+        Returns:
+        list: One dict per regressed (stage, scale, metric) with the baseline and current values.
+        """
+        baseline = {(entry['stage'], entry['scale']): entry
+                    for entry in self._load(self.baseline_path, {'entries': []})['entries']}
+        found = []
+        for entry in self.entries:
+            reference = baseline.get((entry['stage'], entry['scale']))
+            if reference is None:
+                continue
+            for metric in ('wall_seconds', 'peak_traced_bytes'):
+                current, previous = entry.get(metric), reference.get(metric)
+                if current is None or not previous:
+                    continue
+                if current > previous * (1 + self.tolerance):
+                    found.append({'stage': entry['stage'], 'scale': entry['scale'], 'metric': metric,
+                                  'baseline': previous, 'current': current,
+                                  'ratio': current / previous})
+        return found
+
+    def write(self, update_baseline=False):
+        """
+        Append this run to the history file and optionally make it the new baseline.
+
+        Without a baseline file the run becomes the baseline, and its 'bootstrapped'
+        field is set, since it had nothing to be checked against.
+
+        Returns:
+        dict: The run as written to the history.
+        """
+        bootstrapped = not os.path.exists(self.baseline_path)
+        run = {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                        'processor': platform.processor(), 'cpus': os.cpu_count()},
+            'entries': self.entries,
+            'regressions': self.regressions(),
+            'bootstrapped': bootstrapped,
+        }
+        history = self._load(self.history_path, [])
+        history.append(run)
+        os.makedirs(os.path.dirname(self.history_path) or '.', exist_ok=True)
+        with open(self.history_path, 'w') as file:
+            json.dump(history, file, indent=2)
+
+        if update_baseline or bootstrapped:
+            # Stages and scales that did not run this time keep their previous baseline
+            entries = {(entry['stage'], entry['scale']): entry
+                       for entry in self._load(self.baseline_path, {'entries': []})['entries']}
+            entries.update({(entry['stage'], entry['scale']): entry for entry in self.entries})
+            with open(self.baseline_path, 'w') as file:
+                json.dump({'timestamp': run['timestamp'], 'machine': run['machine'],
+                           'entries': list(entries.values())}, file, indent=2)
+        return run
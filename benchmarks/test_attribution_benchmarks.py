@@ -0,0 +1,70 @@
+"""
+Attribution of the GRU forecasts to their input days.
+
+Small GRU models of PLUG and NIO are trained into a temporary model directory. The
+per-window entry runs integrated gradients one test window at a time on the first
+BENCH_ATTRIBUTION_WINDOWS windows; the batched entry evaluates the path points of 64
+windows per pass on the same windows. The symbol entries attribute every test window
+of both symbols in this process and in two worker processes, appending the results to
+the attribution store, and record the completeness error: the largest gap between the
+summed importances of a forecast and its difference from the background forecast.
+"""
+import os
+
+import numpy as np
+
+from conftest import EPOCHS, REPO_DIR
+from stock_prediction.attribution import BackgroundCache, attribute_symbols, integrated_gradients, load_gru
+from stock_prediction.evaluation import artifact_windows
+from stock_prediction.prediction_store import PredictionStore, attribution_arrays
+from stock_prediction.training import train_symbol
+
+ATTRIBUTION_WINDOWS = int(os.environ.get('BENCH_ATTRIBUTION_WINDOWS', '64'))
+SYMBOLS = ['PLUG', 'NIO']
+
+
+def _train(model_dir):
+    for symbol in SYMBOLS:
+        train_symbol(symbol, REPO_DIR, model_dir, num_epochs=EPOCHS)
+
+
+def test_attribution_batching(recorder, tmp_path):
+    model_dir = str(tmp_path / 'models')
+    _train(model_dir)
+    params, config, windows = artifact_windows('PLUG', REPO_DIR, model_dir)
+    model = load_gru(params, config)
+    background = BackgroundCache(str(tmp_path / 'cache')).get('PLUG', 'v1', windows['train'][0])
+    x = windows['test'][0][:ATTRIBUTION_WINDOWS]
+
+    integrated_gradients(model, x[:2], background)  # Warm up torch
+    per_window = recorder.measure('attribution_per_window', 1,
+                                  lambda: integrated_gradients(model, x, background, batch_size=1),
+                                  items=len(x), unit='windows', trace_memory=False)
+    batched = recorder.measure('attribution_batched', 1, lambda: integrated_gradients(model, x, background),
+                               items=len(x), unit='windows', trace_memory=False)
+    recorder.entries[-1]['speedup'] = recorder.entries[-1]['throughput'] / recorder.entries[-2]['throughput']
+    np.testing.assert_allclose(batched, per_window, atol=1e-5)
+
+
+def test_attribution_symbols(recorder, tmp_path):
+    model_dir = str(tmp_path / 'models')
+    _train(model_dir)
+    for workers in (1, 2):
+        store = PredictionStore(str(tmp_path / f'predictions_{workers}'))
+
+        def attribute():
+            return attribute_symbols(SYMBOLS, REPO_DIR, model_dir, store, cache_dir=str(tmp_path / 'cache'),
+                                     max_workers=workers)
+
+        results = recorder.measure(f'attribution_symbols_{workers}w', 1, attribute, items=len(SYMBOLS),
+                                   unit='symbols', trace_memory=False, workers=workers)
+        entry = recorder.entries[-1]
+        entry['windows'] = sum(len(result['attributions']) for result in results.values())
+        entry['completeness_error'] = max(result['completeness_error'] for result in results.values())
+        assert entry['completeness_error'] < 1e-2
+
+        # The store returns the rows by target date; the results are ordered by window
+        stored = store.attributions().query(['PLUG']).sort_values(['as_of', 'horizon'])
+        lookback, features = results['PLUG']['attributions'].shape[2:]
+        np.testing.assert_array_equal(attribution_arrays(stored, lookback),
+                                      results['PLUG']['attributions'].reshape(-1, lookback, features))
@@ -0,0 +1,56 @@
+"""
+Classical baselines on the bundled tickers, and their alignment with the GRU windows.
+
+The alignment entries load PLUG from 2010 on, across its 2011 reverse split, as
+unadjusted and as adjusted prices. The baselines must forecast exactly the test
+windows of split_data_week_ahead_with_dates_multi on the same series: the same
+target dates and target prices, with the naive forecast repeating each window's
+last input price. The fit entry runs every baseline on every bundled symbol.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import BUNDLED_SYMBOLS, REPO_DIR
+from stock_prediction.baselines import BASELINES, fit_baselines
+from stock_prediction.data import load_stock_data
+from stock_prediction.training import scale_prices
+from stock_prediction.windows import split_data_week_ahead_with_dates_multi
+
+START, LOOKBACK, HORIZON = '2010', 20, 7
+
+
+@pytest.mark.parametrize('adjust', [False, True], ids=['raw', 'adjusted'])
+def test_baseline_windows(recorder, adjust):
+    results = recorder.measure(f"baselines_naive_{'adjusted' if adjust else 'raw'}", 1,
+                               lambda: fit_baselines(['PLUG'], REPO_DIR, START, lookback=LOOKBACK,
+                                                     forecast_horizon=HORIZON, baselines=('naive', 'seasonal_naive'),
+                                                     max_workers=1, adjust=adjust),
+                               items=1, unit='symbols', trace_memory=False)
+    result = results['PLUG']
+
+    prices = load_stock_data(['PLUG'], REPO_DIR, adjust=adjust)['PLUG'][START:'2024']['4. close']
+    scaled, scaler = scale_prices(prices)
+    _, _, x_test, y_test, _, dates_test = split_data_week_ahead_with_dates_multi(scaled, LOOKBACK, HORIZON)
+
+    def unscale(values):
+        return scaler.inverse_transform(values.reshape(-1, 1)).reshape(values.shape)
+
+    assert len(result['as_of']) == len(dates_test)
+    # Every window's as-of date is the day before its first target date
+    positions = prices.index.get_indexer(pd.DatetimeIndex([dates[0] for dates in dates_test]))
+    np.testing.assert_array_equal(result['as_of'], prices.index.values[positions - 1])
+    np.testing.assert_array_equal(np.array([dates.values for dates in dates_test]),
+                                  prices.index.values[positions[:, None] + np.arange(HORIZON)])
+    np.testing.assert_allclose(result['actual'], unscale(y_test), rtol=1e-9)
+    np.testing.assert_allclose(result['forecasts']['naive'],
+                               np.repeat(unscale(x_test[:, -1, 0])[:, None], HORIZON, axis=1), rtol=1e-9)
+
+
+def test_baseline_fit(recorder):
+    symbols = list(BUNDLED_SYMBOLS)
+    results = recorder.measure('baselines_fit', 1, lambda: fit_baselines(symbols, REPO_DIR), items=len(symbols),
+                               unit='symbols', trace_memory=False, baselines=len(BASELINES))
+    for result in results.values():
+        assert set(result['forecasts']) == set(BASELINES)
+        assert all(np.isfinite(forecast).all() for forecast in result['forecasts'].values())
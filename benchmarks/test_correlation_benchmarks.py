@@ -0,0 +1,70 @@
+"""
+Return correlation matrices of the universe, against pandas.
+
+The daily close returns of every symbol from 2019 on are aligned on the union of
+their dates, and 2% of them are dropped at random, so the pairwise path over the
+shared days runs. The full matrix is computed
+with DataFrame.corr and with correlation_matrix in blocks of BENCH_CORRELATION_BLOCK
+symbols; the rolling entries recompute every BENCH_CORRELATION_WINDOW-day window from
+scratch and update RollingCorrelation incrementally. All of them must agree with
+pandas on the shared days of every pair.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_prediction.correlation import correlation_matrix, rolling_correlation
+from stock_prediction.data import load_stock_data
+
+CORRELATION_BLOCK = int(os.environ.get('BENCH_CORRELATION_BLOCK', '16'))
+CORRELATION_WINDOW = int(os.environ.get('BENCH_CORRELATION_WINDOW', '60'))
+STEP = 5
+
+
+def _returns(universe):
+    if 'returns' not in universe.state:
+        closes = {symbol: frame['2019':]['4. close']
+                  for symbol, frame in load_stock_data(universe.symbols, universe.data_dir).items()}
+        returns = pd.DataFrame(closes).sort_index().pct_change(fill_method=None).iloc[1:]
+        universe.state['returns'] = returns.mask(np.random.default_rng(0).random(returns.shape) < 0.02)
+    return universe.state['returns']
+
+
+def test_correlation_matrix(recorder, universe):
+    returns = _returns(universe)
+    expected = recorder.measure('correlation_pandas', universe.scale, lambda: returns.corr(min_periods=2).to_numpy(),
+                                items=returns.shape[1], unit='symbols', trace_memory=False, days=len(returns))
+    corr = recorder.measure('correlation_blocked', universe.scale,
+                            lambda: correlation_matrix(returns.to_numpy(), block_size=CORRELATION_BLOCK),
+                            items=returns.shape[1], unit='symbols', trace_memory=False, days=len(returns))
+    recorder.entries[-1]['speedup'] = recorder.entries[-1]['throughput'] / recorder.entries[-2]['throughput']
+    np.testing.assert_allclose(corr, expected, atol=1e-9)
+
+    # Without gaps the standardized product path runs
+    dense = returns.dropna()
+    np.testing.assert_allclose(correlation_matrix(dense.to_numpy(), block_size=CORRELATION_BLOCK),
+                               dense.corr().to_numpy(), atol=1e-9)
+
+
+def test_rolling_correlation(recorder, universe):
+    returns = _returns(universe).to_numpy()
+    ends = range(CORRELATION_WINDOW - 1, len(returns), STEP)
+
+    def recompute():
+        return [correlation_matrix(returns[end - CORRELATION_WINDOW + 1:end + 1]) for end in ends]
+
+    expected = recorder.measure('correlation_rolling_recompute', universe.scale, recompute, items=len(ends),
+                                unit='windows', trace_memory=False, window=CORRELATION_WINDOW)
+    rolled = recorder.measure('correlation_rolling_incremental', universe.scale,
+                              lambda: list(rolling_correlation(returns, CORRELATION_WINDOW, STEP)), items=len(ends),
+                              unit='windows', trace_memory=False, window=CORRELATION_WINDOW)
+    recorder.entries[-1]['speedup'] = recorder.entries[-1]['throughput'] / recorder.entries[-2]['throughput']
+    assert [end for end, _ in rolled] == list(ends)
+    np.testing.assert_allclose(np.array([matrix for _, matrix in rolled]), np.array(expected), atol=1e-7)
+
+    last = pd.DataFrame(returns[ends[-1] - CORRELATION_WINDOW + 1:ends[-1] + 1])
+    np.testing.assert_allclose(rolled[-1][1], last.corr(min_periods=2).to_numpy(), atol=1e-7)
+    with pytest.raises(ValueError):
+        next(rolling_correlation(returns[:CORRELATION_WINDOW - 1], CORRELATION_WINDOW))
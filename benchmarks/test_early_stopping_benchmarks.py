@@ -0,0 +1,99 @@
+"""
+Early stopping: the validation split, the stopping rule and the restored weights.
+
+The split entries check that chronological_validation_split leaves `gap` windows
+between the fit and validation windows, so no fit target falls on a validation target
+date, and that it rejects splits without a fit window. The rule entries train models
+whose validation loss is known in advance: a frozen one, whose loss plateaus from the
+first epoch and must stop after `patience` more, and a single weight pulled past the
+validation optimum, whose best weights must be restored with their epoch and loss.
+The PLUG entries train the GRU for BENCH_STOP_EPOCHS epochs with and without early
+stopping and record the epochs saved; the artifact records the restored epoch.
+"""
+import os
+
+import numpy as np
+import pytest
+import torch
+
+from conftest import REPO_DIR
+from stock_prediction.artifacts import load_model_artifact
+from stock_prediction.instrumentation import train_instrumented
+from stock_prediction.training import train_symbol
+from stock_prediction.windows import chronological_validation_split
+
+STOP_EPOCHS = int(os.environ.get('BENCH_STOP_EPOCHS', '60'))
+PATIENCE = 5
+
+
+class _Weight(torch.nn.Module):
+    # Forecasts a single learned value for every window
+    def __init__(self, value):
+        super().__init__()
+        self.weight = torch.nn.Parameter(torch.tensor([value]))
+
+    def forward(self, x):
+        return self.weight.expand(len(x), 1)
+
+
+def test_validation_split():
+    windows, horizon = 100, 7
+    # Window i targets days i to i + horizon - 1
+    x, y = np.arange(windows, dtype=float).reshape(-1, 1, 1), np.arange(windows)[:, None] + np.arange(horizon)
+    x_fit, y_fit, x_val, y_val = chronological_validation_split(x, y, fraction=0.1)
+    assert len(x_val) == 10 and len(x_fit) == windows - 10 - horizon
+    assert y_fit.max() < y_val.min()
+    np.testing.assert_array_equal(x_val[:, 0, 0], np.arange(windows - 10, windows))
+
+    with pytest.raises(ValueError):
+        chronological_validation_split(x[:horizon + 1], y[:horizon + 1], fraction=0.1)
+    with pytest.raises(ValueError):
+        chronological_validation_split(x[:0], y[:0])
+
+
+def test_stopping_rule():
+    x = torch.zeros(8, 1, 1)
+    criterion = torch.nn.MSELoss()
+
+    # A frozen model's validation loss never improves on its first epoch
+    model = _Weight(0.0)
+    optimiser = torch.optim.SGD(model.parameters(), lr=0.0)
+    hist, summary = train_instrumented(model, criterion, optimiser, x, torch.ones(8, 1), STOP_EPOCHS,
+                                       validation=(x, torch.full((8, 1), 0.5)), patience=PATIENCE)
+    assert summary['epochs'] == len(hist) == PATIENCE + 1
+    assert summary['epochs_saved'] == STOP_EPOCHS - PATIENCE - 1
+    assert summary['best_epoch'] == 0 and summary['epochs_trained'] == 1
+
+    # Gradient steps pull the weight from 0 towards the training target 1, past the validation target 0.3
+    lr = 0.05
+    model = _Weight(0.0)
+    optimiser = torch.optim.SGD(model.parameters(), lr=lr)
+    hist, summary = train_instrumented(model, criterion, optimiser, x, torch.ones(8, 1), STOP_EPOCHS,
+                                       validation=(x, torch.full((8, 1), 0.3)), patience=PATIENCE)
+    weights = [0.0]
+    for _ in range(STOP_EPOCHS):
+        weights.append(weights[-1] - lr * 2 * (weights[-1] - 1))
+    # The validation loss of epoch t is scored on the weights after its step
+    best_epoch = int(np.argmin([(weight - 0.3) ** 2 for weight in weights[1:]]))
+    assert summary['best_epoch'] == best_epoch
+    assert summary['epochs'] == best_epoch + PATIENCE + 1
+    assert summary['epochs_trained'] == best_epoch + 1
+    assert summary['final_loss'] == pytest.approx(hist[best_epoch])
+    assert model.weight.item() == pytest.approx(weights[best_epoch + 1], rel=1e-5)
+
+
+def test_early_stopping_plug(recorder, tmp_path):
+    for name, patience in (('full', None), ('patience', PATIENCE)):
+        model_dir = str(tmp_path / name)
+        torch.manual_seed(0)
+        summary = recorder.measure(f'early_stopping_{name}', 1,
+                                   lambda: train_symbol('PLUG', REPO_DIR, model_dir, num_epochs=STOP_EPOCHS,
+                                                        patience=patience),
+                                   items=1, unit='models', trace_memory=False)
+        recorder.entries[-1].update({key: summary[key] for key in ('epochs', 'epochs_trained', 'epochs_saved',
+                                                                   'final_loss')})
+        config = load_model_artifact(summary['artifact'])[1]
+        assert config['epochs'] == summary['epochs_trained'] <= summary['epochs'] <= STOP_EPOCHS
+        assert config['patience'] == patience
+        if patience is None:
+            assert summary['epochs'] == STOP_EPOCHS and summary['epochs_saved'] == 0
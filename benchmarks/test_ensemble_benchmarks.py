@@ -0,0 +1,66 @@
+"""
+Ensembles of GRU members trained concurrently on the PLUG windows.
+
+BENCH_ENSEMBLE_MEMBERS members that differ by seed are trained in worker processes
+from one published copy of the windows, which must be the only window store entry
+and hold no lease afterwards. The mean combination and the spread must follow from
+the member forecasts. Stacking weights fitted on the last training windows must
+reproduce targets that are one member's forecasts, and must fit the windows at
+least as well as the mean; the entry records the test RMSE of both combinations.
+"""
+import os
+
+import numpy as np
+import pytest
+
+from conftest import EPOCHS, REPO_DIR
+from stock_prediction.data import load_stock_data
+from stock_prediction.ensemble import member_specs, train_ensemble
+from stock_prediction.training import scale_prices
+from stock_prediction.window_store import WindowStore
+from stock_prediction.windows import split_data_week_ahead_with_dates_multi
+
+ENSEMBLE_MEMBERS = int(os.environ.get('BENCH_ENSEMBLE_MEMBERS', '3'))
+
+
+def test_ensemble(recorder, tmp_path):
+    scaled, scaler = scale_prices(load_stock_data(['PLUG'], REPO_DIR)['PLUG']['2019':'2024']['4. close'])
+    x_train, y_train, x_test, y_test = split_data_week_ahead_with_dates_multi(scaled, 20, 7)[:4]
+    store = WindowStore(str(tmp_path / 'windows'))
+    specs = member_specs(ENSEMBLE_MEMBERS, num_epochs=EPOCHS)
+
+    ensemble = recorder.measure('ensemble_train', 1, lambda: train_ensemble('PLUG', scaled, specs, store=store),
+                                items=len(specs), unit='members', trace_memory=False, epochs=EPOCHS)
+    entries = store.entries()
+    assert len(entries) == 1 and not next(iter(entries.values()))['leases']
+    assert len(ensemble.members) == len(specs)
+
+    predictions = ensemble.member_predictions(x_test)
+    assert not np.allclose(predictions[0], predictions[1])
+    forecast, spread = ensemble.predict(x_test)
+    np.testing.assert_allclose(forecast, predictions.mean(axis=0), rtol=1e-6)
+    np.testing.assert_allclose(spread, predictions.std(axis=0), rtol=1e-6)
+    assert (spread > 0).all()
+
+    with pytest.raises(ValueError):
+        ensemble.predict(x_test, method='stacking')
+    with pytest.raises(ValueError):
+        ensemble.predict(x_test, method='median')
+
+    # Targets that are one member's forecasts are reproduced; the members are too alike
+    # for the weights themselves to be identified
+    holdout = x_train[-100:]
+    targets = ensemble.member_predictions(holdout)[1]
+    weights = ensemble.fit_stacking(holdout, targets, ridge=1e-9)
+    assert weights.shape == (len(specs), y_train.shape[1])
+    np.testing.assert_allclose(ensemble.predict(holdout, method='stacking')[0], targets, atol=1e-3)
+
+    # Least squares fits its own windows at least as well as the mean
+    ensemble.fit_stacking(holdout, y_train[-100:], ridge=1e-9)
+    stacked = ensemble.predict(holdout, method='stacking')[0]
+    assert ((stacked - y_train[-100:]) ** 2).mean() <= ((ensemble.predict(holdout)[0] - y_train[-100:]) ** 2).mean()
+
+    for method in ('mean', 'stacking'):
+        error = (ensemble.predict(x_test, method=method)[0] - y_test) / scaler.scale_[0]
+        recorder.entries[-1][f'test_rmse_{method}'] = float(np.sqrt((error ** 2).mean()))
+    recorder.entries[-1]['mean_spread'] = float((spread / scaler.scale_[0]).mean())
@@ -0,0 +1,109 @@
+"""
+Direct, recursive and hybrid forecasting on the PLUG windows.
+
+Every strategy trains the same GRU from the same seed on the seven-day targets. Its
+training entry records the test RMSE in USD per forecast day, so the error growth
+of feeding forecasts back in shows next to the direct model. The recursive and
+hybrid models then forecast 30 days of every test window twice: continuing from the
+hidden state (model.GRU) and re-encoding the window with the forecasts appended
+after every block, which is what a rollout without state reuse costs.
+"""
+import os
+
+import numpy as np
+import pytest
+import torch
+
+from conftest import REPO_DIR
+from stock_prediction.data import load_stock_data
+from stock_prediction.instrumentation import train_instrumented
+from stock_prediction.model import GRU, STRATEGIES
+from stock_prediction.training import scale_prices
+from stock_prediction.windows import split_data_week_ahead_with_dates_multi
+
+STRATEGY_EPOCHS = int(os.environ.get('BENCH_STRATEGY_EPOCHS', '20'))
+LONG_HORIZON = 30
+
+_windows = {}
+_models = {}
+
+
+def _plug_windows():
+    if not _windows:
+        scaled, scaler = scale_prices(load_stock_data(['PLUG'], REPO_DIR)['PLUG']['2019':'2024']['4. close'])
+        x_train, y_train, x_test, y_test = split_data_week_ahead_with_dates_multi(scaled, 20, 7)[:4]
+        _windows.update(x_train=torch.from_numpy(x_train).float(), y_train=torch.from_numpy(y_train).float(),
+                        x_test=torch.from_numpy(x_test).float(), y_test=y_test, scaler=scaler)
+    return _windows
+
+
+def _train(strategy, epochs=STRATEGY_EPOCHS):
+    windows = _plug_windows()
+    torch.manual_seed(0)
+    model = GRU(input_dim=1, hidden_dim=32, num_layers=2, output_dim=7, strategy=strategy)
+    criterion = torch.nn.MSELoss(reduction='mean')
+    optimiser = torch.optim.Adam(model.parameters(), lr=0.01)
+    hist, summary = train_instrumented(model, criterion, optimiser, windows['x_train'], windows['y_train'],
+                                       epochs)
+    return model, summary
+
+
+def _reencoded(model, x, horizon):
+    """
+    Roll a model out by re-encoding the whole window after every predicted block.
+    """
+    blocks = []
+    while sum(block.shape[1] for block in blocks) < horizon:
+        out = model(x, horizon=model.block)
+        blocks.append(out)
+        x = torch.cat([x, out.unsqueeze(-1)], dim=1)
+    return torch.cat(blocks, dim=1)[:, :horizon]
+
+
+@pytest.mark.parametrize('strategy', STRATEGIES)
+def test_strategy_training(recorder, strategy):
+    windows = _plug_windows()
+    if not _models:
+        _train(strategy, epochs=1)  # Warm up torch before timing the first strategy
+    samples = len(windows['x_train']) * STRATEGY_EPOCHS
+    model, summary = recorder.measure(f'strategy_train_{strategy}', 1, lambda: _train(strategy), items=samples,
+                                      unit='samples', trace_memory=False, epochs=STRATEGY_EPOCHS)
+    _models[strategy] = model
+    entry = recorder.entries[-1]
+
+    model.eval()
+    with torch.no_grad():
+        y_pred = model(windows['x_test']).numpy()
+    errors = (y_pred - windows['y_test']) / windows['scaler'].scale_[0]
+    entry['final_loss'] = summary['final_loss']
+    entry['block'] = model.block
+    entry['test_rmse'] = float(np.sqrt((errors ** 2).mean()))
+    entry['test_rmse_per_day'] = np.sqrt((errors ** 2).mean(axis=0)).round(4).tolist()
+    assert np.isfinite(entry['final_loss'])
+
+
+@pytest.mark.parametrize('strategy', [strategy for strategy in STRATEGIES if strategy != 'direct'])
+@pytest.mark.parametrize('rollout', ['state', 'reencode'])
+def test_strategy_long_horizon(recorder, strategy, rollout):
+    if strategy not in _models:
+        pytest.skip(f'the {strategy} model was not trained in this session')
+    model, x_test = _models[strategy], _plug_windows()['x_test']
+
+    def forecast():
+        with torch.no_grad():
+            if rollout == 'state':
+                return model(x_test, horizon=LONG_HORIZON)
+            return _reencoded(model, x_test, LONG_HORIZON)
+
+    forecast()  # Warm up
+    y_pred = recorder.measure(f'strategy_{strategy}_{LONG_HORIZON}d_{rollout}', 1, forecast, items=len(x_test),
+                              unit='windows', trace_memory=False, horizon=LONG_HORIZON)
+    assert y_pred.shape == (len(x_test), LONG_HORIZON)
+
+    if rollout == 'reencode':
+        # Reusing the hidden state changes the cost of a rollout, not its forecasts
+        with torch.no_grad():
+            np.testing.assert_allclose(y_pred.numpy(), model(x_test, horizon=LONG_HORIZON).numpy(), atol=1e-5)
+        state = next(entry for entry in recorder.entries
+                     if entry['stage'] == f'strategy_{strategy}_{LONG_HORIZON}d_state')
+        recorder.entries[-1]['state_speedup'] = state['throughput'] / recorder.entries[-1]['throughput']
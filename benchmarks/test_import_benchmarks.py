@@ -0,0 +1,32 @@
+"""
+Cold imports of the light modules, each in a fresh interpreter.
+
+Every statement runs in a new subprocess, so it sees no module another benchmark has
+imported already: a module that forgets an import of its own fails here. The entries
+record the start-up cost of the statement, interpreter included.
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import REPO_DIR
+
+STATEMENTS = {
+    'data': 'import stock_prediction.data',
+    'lazy_export': 'from stock_prediction import load_stock_data, StockDataCache',
+    'inference': 'import stock_prediction.inference',
+}
+
+
+@pytest.mark.parametrize('name', sorted(STATEMENTS))
+def test_cold_import(recorder, name):
+    env = dict(os.environ, PYTHONPATH=REPO_DIR)
+
+    def run():
+        return subprocess.run([sys.executable, '-c', STATEMENTS[name]], cwd=REPO_DIR, env=env, capture_output=True,
+                              text=True)
+
+    result = recorder.measure(f'import_{name}', 1, run, items=1, unit='imports', trace_memory=False)
+    assert result.returncode == 0, result.stderr
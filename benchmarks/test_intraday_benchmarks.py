@@ -0,0 +1,102 @@
+"""
+Ingestion, resampling and windowing of minute bars.
+
+No intraday data is bundled, so minute bars are synthesised from the PLUG daily bars:
+every trading day gets 390 one-minute closes on a Brownian bridge from its open to its
+close. The entries compare the memory-mapped store with the CSV-plus-pandas path of the
+daily data, time the cold resampling of every tier and its incremental refresh after a
+new day of bars, and window the 5-minute tier.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from conftest import REPO_DIR
+from stock_prediction.data import load_stock_data
+from stock_prediction.intraday import TIERS, IntradayStore
+from stock_prediction.training import scale_prices
+from stock_prediction.windows import split_data_week_ahead_with_dates_multi
+
+INTRADAY_DAYS = int(os.environ.get('BENCH_INTRADAY_DAYS', '250'))
+MINUTES_PER_DAY = 390
+
+_bars = {}
+
+
+def synthetic_minute_bars(daily, seed=0):
+    """
+    Synthesise minute bars whose daily opens and closes match the given daily bars.
+    """
+    rng = np.random.default_rng(seed)
+    days = len(daily)
+    steps = np.cumsum(rng.normal(0.0, 1.0, (days, MINUTES_PER_DAY)), axis=1)
+    fraction = np.arange(1, MINUTES_PER_DAY + 1) / MINUTES_PER_DAY
+    bridge = steps - fraction * steps[:, -1:]
+    opens = daily['1. open'].to_numpy()[:, None]
+    closes = daily['4. close'].to_numpy()[:, None]
+    close = opens + (closes - opens) * fraction + 0.002 * opens * bridge
+    close = np.maximum(close, 0.01)
+
+    starts = daily.index.values.astype('datetime64[m]') + np.timedelta64(9 * 60 + 30, 'm')
+    index = pd.DatetimeIndex((starts[:, None] + np.arange(MINUTES_PER_DAY).astype('timedelta64[m]')).ravel(),
+                             name='date')
+    close = close.ravel()
+    return pd.DataFrame({
+        '1. open': np.r_[close[0], close[:-1]],
+        '2. high': close * (1 + np.abs(rng.normal(0.0, 5e-4, len(close)))),
+        '3. low': close * (1 - np.abs(rng.normal(0.0, 5e-4, len(close)))),
+        '4. close': close,
+        '5. volume': np.round(np.repeat(daily['5. volume'].to_numpy() / MINUTES_PER_DAY, MINUTES_PER_DAY)
+                              * rng.lognormal(0.0, 0.5, len(close))),
+    }, index=index)
+
+
+def _minute_bars():
+    if not _bars:
+        daily = load_stock_data(['PLUG'], REPO_DIR)['PLUG'][-(INTRADAY_DAYS + 1):]
+        bars = synthetic_minute_bars(daily)
+        # The last day is held back for the incremental refresh
+        _bars.update(history=bars[:-MINUTES_PER_DAY], last_day=bars[-MINUTES_PER_DAY:])
+    return _bars
+
+
+def test_intraday_csv(recorder, tmp_path):
+    history = _minute_bars()['history']
+    path = tmp_path / 'PLUG_intraday.csv'
+    history.to_csv(path)
+    recorder.measure('intraday_csv_read', 1, lambda: pd.read_csv(path, index_col='date', parse_dates=['date']),
+                     items=len(history), unit='rows', trace_memory=False, file_bytes=os.path.getsize(path))
+
+
+def test_intraday_store(recorder, tmp_path):
+    bars = _minute_bars()
+    store = IntradayStore(str(tmp_path / 'intraday'))
+    recorder.measure('intraday_ingest', 1, lambda: store.append('PLUG', bars['history']), items=len(bars['history']),
+                     unit='rows', trace_memory=False)
+    recorder.entries[-1]['file_bytes'] = sum(os.path.getsize(os.path.join(store.root, 'PLUG', name))
+                                             for name in os.listdir(os.path.join(store.root, 'PLUG')))
+
+    recorder.measure('intraday_read', 1, lambda: store.bars('PLUG'), items=len(bars['history']), unit='rows',
+                     trace_memory=False)
+
+    def resample_all():
+        return {tier: store.columns('PLUG', tier) for tier in TIERS}
+
+    recorder.measure('intraday_resample', 1, resample_all, items=len(bars['history']), unit='rows',
+                     trace_memory=False)
+
+    store.append('PLUG', bars['last_day'])
+    tiers = recorder.measure('intraday_resample_incremental', 1, resample_all, items=len(bars['last_day']),
+                             unit='rows', trace_memory=False)
+
+    # The refreshed daily tier closes every day on its last minute bar
+    minute_closes = np.asarray(tiers['1min']['4. close']).reshape(-1, MINUTES_PER_DAY)
+    np.testing.assert_array_equal(tiers['1d']['4. close'], minute_closes[:, -1])
+
+    scaled, _ = scale_prices(store.bars('PLUG', '5min')['4. close'])
+    windows = recorder.measure('intraday_windows_5min', 1,
+                               lambda: split_data_week_ahead_with_dates_multi(scaled, 78, 12),
+                               items=lambda parts: len(parts[0]) + len(parts[2]), unit='windows', trace_memory=False)
+    assert windows[0].shape[1:] == (78, 1)
+
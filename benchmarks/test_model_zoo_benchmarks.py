@@ -0,0 +1,115 @@
+"""
+Throughput versus accuracy of the registered networks on the bundled tickers.
+
+Every network is trained per bundled symbol on the same windows as the GRU, published
+once to a WindowStore that every network attaches to. Its entry records training and
+inference throughput together with the test RMSE in USD. Once every network has
+run, the cheapest one (highest training throughput) whose RMSE meets the error
+budget is marked with 'selected': True in the history; when no network meets the
+budget, every entry records 'selection': 'none eligible' instead.
+"""
+import os
+import time
+
+import numpy as np
+import pytest
+
+from conftest import BUNDLED_SYMBOLS, REPO_DIR
+from stock_prediction.data import load_stock_data
+from stock_prediction.training import scale_prices
+from stock_prediction.window_store import WindowStore
+from stock_prediction.zoo import Forecaster
+
+ZOO_EPOCHS = int(os.environ.get('BENCH_ZOO_EPOCHS', '20'))
+# Test RMSE in USD a network must meet; by default within 10% of the best network
+ERROR_BUDGET = os.environ.get('BENCH_ERROR_BUDGET')
+
+# Settings per network; the TCN needs four layers for its receptive field to cover the lookback
+ZOO = {
+    'gru': {},
+    'lstm': {},
+    'tcn': {'num_layers': 4},
+    'transformer': {},
+}
+
+_windows = {}
+
+
+def _bundled_windows(root):
+    # The windows are published once and every network attaches to them
+    if not _windows:
+        store = WindowStore(root)
+        for symbol, frame in load_stock_data(BUNDLED_SYMBOLS, REPO_DIR).items():
+            scaled, scaler = scale_prices(frame['2019':'2024']['4. close'])
+            _windows[symbol] = (store, store.publish(symbol, scaled, 20, 7), scaler)
+    return _windows
+
+
+def _fit(kind, store, key):
+    with store.attach(key) as windows:
+        return Forecaster(kind, num_epochs=ZOO_EPOCHS, **ZOO[kind]).fit(windows['x_train'], windows['y_train'])
+
+
+@pytest.fixture(scope='module')
+def zoo_entries():
+    entries = []
+    yield entries
+    # Select once every network that ran has its entry, before the session writes the history
+    if entries:
+        cheapest, eligible = _select(entries)
+        assert cheapest is not None or ERROR_BUDGET
+        assert sum(entry['selected'] for entry in entries) == (cheapest is not None)
+        if cheapest is not None:
+            assert cheapest['throughput'] == max(entry['throughput'] for entry in eligible)
+
+
+@pytest.mark.parametrize('kind', list(ZOO))
+def test_model_zoo(recorder, tmp_path_factory, zoo_entries, kind):
+    windows = _bundled_windows(str(tmp_path_factory.getbasetemp() / 'zoo_windows'))
+
+    def train_all():
+        return {symbol: _fit(kind, store, key) for symbol, (store, key, _) in windows.items()}
+
+    samples = 0
+    for store, key, _ in windows.values():
+        with store.attach(key) as arrays:
+            samples += len(arrays['x_train']) * ZOO_EPOCHS
+    forecasters = recorder.measure(f'zoo_{kind}', 1, train_all, items=samples, unit='samples',
+                                   trace_memory=False, epochs=ZOO_EPOCHS)
+    entry = recorder.entries[-1]
+
+    squared_errors = []
+    test_samples = 0
+    inference_seconds = 0.0
+    for symbol, (store, key, scaler) in windows.items():
+        forecaster = forecasters[symbol]
+        with store.attach(key) as arrays:
+            x_test, y_test = arrays['x_test'], arrays['y_test']
+            forecaster.predict(x_test[:1])  # Warm up before timing inference
+            start = time.perf_counter()
+            y_pred = forecaster.predict(x_test)
+            inference_seconds += time.perf_counter() - start
+            squared_errors.append(((y_pred - y_test) / scaler.scale_[0]) ** 2)
+            test_samples += len(x_test)
+
+    entry['inference_samples_per_second'] = test_samples / inference_seconds
+    entry['test_rmse'] = float(np.sqrt(np.concatenate(squared_errors).mean()))
+    entry['parameters'] = sum(p.numel() for p in next(iter(forecasters.values())).model.parameters())
+    assert np.isfinite(entry['test_rmse'])
+    zoo_entries.append(entry)
+
+
+def _select(entries):
+    """
+    Mark the cheapest network within the error budget as selected, if any.
+    """
+    budget = float(ERROR_BUDGET) if ERROR_BUDGET else min(entry['test_rmse'] for entry in entries) * 1.1
+    eligible = [entry for entry in entries if entry['test_rmse'] <= budget]
+    # An explicit budget below every network's error leaves nothing to select
+    cheapest = max(eligible, key=lambda entry: entry['throughput'], default=None)
+    for entry in entries:
+        entry['error_budget'] = budget
+        entry['selected'] = entry is cheapest
+        if cheapest is None:
+            entry['selection'] = 'none eligible'
+    return cheapest, eligible
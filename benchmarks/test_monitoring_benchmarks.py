@@ -0,0 +1,69 @@
+"""
+Nightly drift monitoring of stored live forecasts.
+
+Naive seven-day forecasts of PLUG are stored as live forecasts for every trading day of
+MONITOR_YEARS years, with a bias added to the second half so the monitor has drift to
+find. The realized closes are then released a few days at a time, as nightly runs see
+them. The incremental entry updates one DriftMonitor night after night; the recompute
+entry rebuilds the statistics from every stored forecast each night, as a one-off
+evaluation would.
+"""
+import os
+
+import numpy as np
+
+from conftest import REPO_DIR
+from stock_prediction.data import load_stock_data
+from stock_prediction.metrics_table import MetricsTable, metric_rows
+from stock_prediction.monitoring import DriftMonitor
+from stock_prediction.prediction_store import PredictionStore, predictions_table
+from stock_prediction.windows import window_dates
+
+MONITOR_YEARS = int(os.environ.get('BENCH_MONITOR_YEARS', '2'))
+DAYS_PER_NIGHT = 5
+
+
+def _setup(tmp_path):
+    closes = load_stock_data(['PLUG'], REPO_DIR)['PLUG']['4. close']
+    closes = closes[closes.index >= closes.index[-1] - np.timedelta64(365 * MONITOR_YEARS, 'D')]
+    as_of, targets = window_dates(closes.index, 1, 7)
+    predicted = np.repeat(closes.to_numpy()[:len(as_of), None], 7, axis=1)
+    middle = len(predicted) // 2
+    predicted[middle:] *= 1.3
+
+    store = PredictionStore(str(tmp_path / 'predictions'))
+    store.append(predictions_table('PLUG', predicted, None, targets, as_of, 'gru-benchmark'))
+    metrics_table = MetricsTable(str(tmp_path / 'metrics.csv'))
+    actual = closes.to_numpy()[np.searchsorted(closes.index.values, targets.astype('datetime64[ns]'))]
+    # The test RMSE of the unbiased forecasts just before the drift
+    metrics_table.append(metric_rows('PLUG', 'gru', actual[middle - 100:middle], predicted[middle - 100:middle]))
+    return closes, store, metrics_table
+
+
+def test_drift_monitoring(recorder, tmp_path):
+    closes, store, metrics_table = _setup(tmp_path)
+    nights = range(60, len(closes) + 1, DAYS_PER_NIGHT)
+
+    def incremental():
+        monitor = DriftMonitor(str(tmp_path / 'incremental.json'))
+        for night in nights:
+            status = monitor.update(store, closes={'PLUG': closes.iloc[:night]}, metrics_table=metrics_table)
+        return monitor, status
+
+    def recompute():
+        for night in nights:
+            if os.path.exists(tmp_path / 'recompute.json'):
+                os.remove(tmp_path / 'recompute.json')
+            monitor = DriftMonitor(str(tmp_path / 'recompute.json'))
+            status = monitor.update(store, closes={'PLUG': closes.iloc[:night]}, metrics_table=metrics_table)
+        return monitor, status
+
+    monitor, status = recorder.measure('drift_incremental', 1, incremental, items=len(nights), unit='nights',
+                                       trace_memory=False)
+    recorder.entries[-1]['drifted'] = monitor.drifted(metrics_table)
+    _, full_status = recorder.measure('drift_recompute', 1, recompute, items=len(nights), unit='nights',
+                                      trace_memory=False)
+
+    # Both reach the same statistics, and the biased second half is caught
+    np.testing.assert_allclose(status['rmse'], full_status['rmse'])
+    assert monitor.drifted(metrics_table) == ['PLUG']
@@ -0,0 +1,49 @@
+"""
+Cold, warm and incremental nightly runs of the pipeline scheduler.
+
+The bundled CSV files are copied to a temporary data directory. The cold run trains
+every symbol; the warm run finds every stage cached; the incremental run follows one
+new bar for the first symbol and must redo only that symbol's stages. The figures are
+left to the render benchmark, so the runs stop at predict and evaluate.
+"""
+import glob
+import os
+import shutil
+
+from conftest import BUNDLED_SYMBOLS, EPOCHS, REPO_DIR
+from stock_prediction.pipeline import run_pipeline
+
+STAGES = ['predict', 'evaluate']
+
+
+def _append_bar(path):
+    # Repeat the last bar one day later, as a new night's download would add a row
+    with open(path) as file:
+        last = file.read().splitlines()[-1].split(',')
+    last[0] = '2024-01-23'
+    with open(path, 'a') as file:
+        file.write(','.join(last) + '\n')
+
+
+def test_nightly_pipeline(recorder, tmp_path):
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    for path in glob.glob(os.path.join(REPO_DIR, '*_historical_data.csv')):
+        shutil.copy(path, data_dir)
+    options = dict(data_dir=str(data_dir), model_dir=str(tmp_path / 'models'), cache_dir=str(tmp_path / 'cache'),
+                   validation_cache=str(tmp_path / 'validation_cache'), stages=STAGES, num_epochs=EPOCHS)
+    symbols = list(BUNDLED_SYMBOLS)
+
+    for run in ('cold', 'warm', 'incremental'):
+        if run == 'incremental':
+            _append_bar(glob.glob(os.path.join(data_dir, f'*_{symbols[0]}_historical_data.csv'))[0])
+        summary = recorder.measure(f'nightly_{run}', 1, lambda: run_pipeline(symbols, **options),
+                                   items=len(symbols), unit='symbols', trace_memory=False)
+        entry = recorder.entries[-1]
+        entry['ran'], entry['cached'] = len(summary['ran']), len(summary['cached'])
+        assert not summary['failed']
+
+        if run == 'warm':
+            assert not summary['ran']
+        if run == 'incremental':
+            assert {node.split('/')[1] for node in summary['ran']} == {symbols[0]}
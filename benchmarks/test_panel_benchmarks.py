@@ -0,0 +1,80 @@
+"""
+Calendar-aligned price panels of the universe, against pandas.
+
+Every seventh bar of the first symbol in 2020 is dropped, so it has gaps inside its
+traded range besides the listing gaps of the younger symbols. Each gap policy must
+match pandas' outer join of the close columns: forward filled inside each symbol's
+traded range (also with ffill_limit), left as NaN, or restricted to the dates every
+symbol traded on. The build entry parses the CSV files into a panel, the cached
+entry reads it back from the panel cache; a newer file of a symbol must invalidate
+the cached panel. An empty universe gives an empty panel.
+"""
+import glob
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_prediction.data import load_stock_data
+from stock_prediction.panel import build_price_panel, load_price_panel
+
+
+def _gapped(universe):
+    stock_data = dict(load_stock_data(universe.symbols, universe.data_dir))
+    first = universe.symbols[0]
+    gaps = stock_data[first].loc['2020'].index[::7]
+    stock_data[first] = stock_data[first].drop(gaps)
+    return stock_data
+
+
+@pytest.mark.parametrize('gap_policy', ['ffill', 'nan', 'drop'])
+def test_panel_gap_policy(recorder, universe, gap_policy):
+    stock_data = _gapped(universe)
+    panel = recorder.measure(f'panel_{gap_policy}', universe.scale,
+                             lambda: build_price_panel(stock_data, gap_policy=gap_policy), items=len(stock_data),
+                             unit='symbols', trace_memory=False)
+
+    joined = pd.concat({symbol: frame['4. close'] for symbol, frame in stock_data.items()}, axis=1, sort=True)
+    expected = {'ffill': joined.ffill(limit_area='inside'), 'nan': joined, 'drop': joined.dropna()}[gap_policy]
+    pd.testing.assert_frame_equal(panel.to_frame(), expected.astype(np.float64), check_names=False,
+                                  check_freq=False)
+    if gap_policy == 'ffill':
+        limited = build_price_panel(stock_data, ffill_limit=1).to_frame()
+        pd.testing.assert_frame_equal(limited, joined.ffill(limit=1, limit_area='inside').astype(np.float64),
+                                      check_names=False, check_freq=False)
+
+
+def test_panel_cache(recorder, universe, tmp_path):
+    data_dir, cache_dir = str(tmp_path / 'data'), str(tmp_path / 'cache')
+    os.makedirs(data_dir)
+    for symbol in universe.symbols:
+        shutil.copy(glob.glob(os.path.join(universe.data_dir, f'*_{symbol}_historical_data.csv'))[0], data_dir)
+
+    def load():
+        return load_price_panel(universe.symbols, data_dir=data_dir, cache_dir=cache_dir)
+
+    built = recorder.measure('panel_build', universe.scale, load, items=len(universe.symbols), unit='symbols',
+                             trace_memory=False)
+    cached = recorder.measure('panel_cached', universe.scale, load, items=len(universe.symbols), unit='symbols',
+                              trace_memory=False)
+    recorder.entries[-1]['speedup'] = recorder.entries[-1]['throughput'] / recorder.entries[-2]['throughput']
+    assert len(os.listdir(cache_dir)) == 1
+    np.testing.assert_array_equal(cached.values, built.values)
+    assert cached.symbols == built.symbols and cached.dates.equals(built.dates)
+
+    # A new download of one symbol, with one more bar, rebuilds the panel
+    path = glob.glob(os.path.join(data_dir, f'*_{universe.symbols[0]}_historical_data.csv'))[0]
+    with open(path) as file:
+        last = file.read().splitlines()[-1].split(',')
+    last[0] = '2024-01-23'
+    with open(path, 'a') as file:
+        file.write(','.join(last) + '\n')
+    os.rename(path, path.replace('2024-01-22', '2024-01-23'))
+    rebuilt = load()
+    assert len(os.listdir(cache_dir)) == 2
+    assert rebuilt.dates[-1] == pd.Timestamp('2024-01-23') and len(rebuilt.dates) == len(built.dates) + 1
+
+    empty = build_price_panel({})
+    assert empty.shape == (0, 0) and empty.returns().shape == (0, 0)
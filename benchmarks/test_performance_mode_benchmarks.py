@@ -0,0 +1,117 @@
+"""
+Speedup and loss parity of the CPU performance mode on the PLUG windows.
+
+The reference is the current float32 training loop. Every mode trains the same GRU
+from the same seed for the same epochs, and its entry records the speedup over the
+reference together with the relative difference of the final training loss and of
+the test RMSE in USD. The compiled mode includes the compilation time and only runs
+when BENCH_COMPILE=1.
+
+Thread pinning only pays off when trainings share the machine, so the pinning entries
+train two models at once in two spawned processes: with torch's default threads, where
+each process runs one thread per CPU, and with each process pinned to its half of the
+allowed CPUs. They record the combined throughput, process start-up included.
+"""
+import concurrent.futures
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+import torch
+
+from conftest import REPO_DIR
+from stock_prediction.data import load_stock_data
+from stock_prediction.instrumentation import train_instrumented
+from stock_prediction.model import GRU
+from stock_prediction.performance import bf16_supported, performance_mode
+from stock_prediction.training import scale_prices
+from stock_prediction.windows import split_data_week_ahead_with_dates_multi
+
+PERF_EPOCHS = int(os.environ.get('BENCH_PERF_EPOCHS', '30'))
+COMPILE = os.environ.get('BENCH_COMPILE') == '1'
+# Trainings sharing the machine in the pinning entries
+COLOCATED = 2
+
+# Keyword arguments of performance_mode per mode; None is the current loop
+MODES = {
+    'float32': None,
+    'bf16': {},
+    'compiled': {'compile': True},
+}
+
+_windows = {}
+
+
+def _plug_windows():
+    if not _windows:
+        scaled, scaler = scale_prices(load_stock_data(['PLUG'], REPO_DIR)['PLUG']['2019':'2024']['4. close'])
+        x_train, y_train, x_test, y_test = split_data_week_ahead_with_dates_multi(scaled, 20, 7)[:4]
+        _windows.update(x_train=torch.from_numpy(x_train).float(), y_train=torch.from_numpy(y_train).float(),
+                        x_test=torch.from_numpy(x_test).float(), y_test=y_test, scaler=scaler)
+    return _windows
+
+
+def _train(options, epochs=PERF_EPOCHS):
+    windows = _plug_windows()
+    torch.manual_seed(0)
+    model = GRU(input_dim=1, hidden_dim=32, num_layers=2, output_dim=7)
+    criterion = torch.nn.MSELoss(reduction='mean')
+    optimiser = torch.optim.Adam(model.parameters(), lr=0.01)
+    train_model, settings = model, {'autocast_dtype': None}
+    if options is not None:
+        train_model, settings = performance_mode(model, **options)
+    hist, summary = train_instrumented(train_model, criterion, optimiser, windows['x_train'], windows['y_train'],
+                                       epochs, autocast_dtype=settings['autocast_dtype'])
+    return model, summary
+
+
+@pytest.mark.parametrize('mode', list(MODES))
+def test_performance_mode(recorder, mode):
+    if mode == 'bf16' and not bf16_supported():
+        pytest.skip('no native bfloat16 support on this CPU')
+    if mode == 'compiled' and not COMPILE:
+        pytest.skip('set BENCH_COMPILE=1 to benchmark torch.compile')
+
+    windows = _plug_windows()
+    if mode == 'float32':
+        _train(None, epochs=1)  # Warm up torch before timing the reference
+    samples = len(windows['x_train']) * PERF_EPOCHS
+    model, summary = recorder.measure(f'performance_{mode}', 1, lambda: _train(MODES[mode]), items=samples,
+                                      unit='samples', trace_memory=False, epochs=PERF_EPOCHS)
+    entry = recorder.entries[-1]
+
+    model.eval()
+    with torch.no_grad():
+        y_pred = model(windows['x_test']).numpy()
+    entry['final_loss'] = summary['final_loss']
+    entry['precision'] = summary['precision']
+    entry['test_rmse'] = float(np.sqrt((((y_pred - windows['y_test']) / windows['scaler'].scale_[0]) ** 2).mean()))
+
+    reference = next(entry for entry in recorder.entries if entry['stage'] == 'performance_float32')
+    entry['speedup'] = entry['throughput'] / reference['throughput']
+    entry['loss_difference'] = abs(entry['final_loss'] - reference['final_loss']) / reference['final_loss']
+    entry['rmse_difference'] = abs(entry['test_rmse'] - reference['test_rmse']) / reference['test_rmse']
+    assert np.isfinite(entry['final_loss'])
+
+
+def _colocated(worker, pinned):
+    options = {'bf16': False, 'worker': worker, 'workers': COLOCATED} if pinned else None
+    return _train(options)[1]['final_loss']
+
+
+@pytest.mark.parametrize('pinned', [False, True], ids=['default', 'pinned'])
+def test_colocated_pinning(recorder, pinned):
+    samples = len(_plug_windows()['x_train']) * PERF_EPOCHS * COLOCATED
+
+    def run():
+        context = multiprocessing.get_context('spawn')
+        with concurrent.futures.ProcessPoolExecutor(max_workers=COLOCATED, mp_context=context) as executor:
+            return list(executor.map(_colocated, range(COLOCATED), [pinned] * COLOCATED))
+
+    losses = recorder.measure(f"performance_colocated_{'pinned' if pinned else 'default'}", COLOCATED, run,
+                              items=samples, unit='samples', trace_memory=False, epochs=PERF_EPOCHS)
+    if pinned:
+        reference = next(entry for entry in recorder.entries if entry['stage'] == 'performance_colocated_default')
+        recorder.entries[-1]['speedup'] = recorder.entries[-1]['throughput'] / reference['throughput']
+    assert np.all(np.isfinite(losses))
@@ -0,0 +1,279 @@
+"""
+Benchmarks of every pipeline stage, from loading the CSV files to plotting.
+
+Each stage starts from the real output of the stage before it, mirroring the order
+of the notebook: load -> validate -> adjust -> scale -> window -> train -> inference -> rmse -> plot -> store.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import torch
+from sklearn.preprocessing import MinMaxScaler
+
+from conftest import EPOCHS, PLOT_SYMBOLS, TRAIN_SYMBOLS
+from stock_prediction.adjustments import CorporateActions
+from stock_prediction.data import load_stock_data
+from stock_prediction.evaluation import daily_frames, rmse_per_day
+from stock_prediction.model import GRU
+from stock_prediction.plotting import plot_prediction_for_day
+from stock_prediction.prediction_store import PredictionStore, predictions_table
+from stock_prediction.validation import screen_frames
+from stock_prediction.windows import (split_data_week_ahead_with_dates_multi, split_data_week_ahead_with_dates_single,
+                                      window_dates)
+
+LOOKBACK = 20
+FORECAST_HORIZON = 7
+
+
+def _loaded(universe):
+    if 'stock_data' not in universe.state:
+        universe.state['stock_data'] = load_stock_data(universe.symbols, universe.data_dir)
+    return universe.state['stock_data']
+
+
+def _scale_all(stock_data):
+    scaled = {}
+    for symbol, frame in stock_data.items():
+        price = frame['2019':'2024']['4. close']
+        scaler = MinMaxScaler(feature_range=(-1, 1))
+        prices_scaled = scaler.fit_transform(price.values.reshape(-1, 1))
+        scaled[symbol] = (pd.DataFrame(prices_scaled, index=price.index, columns=['Scaled Price']), scaler)
+    return scaled
+
+
+def _scaled(universe):
+    if 'scaled' not in universe.state:
+        universe.state['scaled'] = _scale_all(_loaded(universe))
+    return universe.state['scaled']
+
+
+def _window_all(scaled):
+    return {symbol: split_data_week_ahead_with_dates_multi(frame, LOOKBACK, FORECAST_HORIZON)
+            for symbol, (frame, _) in scaled.items()}
+
+
+def _windows(universe):
+    if 'windows' not in universe.state:
+        universe.state['windows'] = _window_all(_scaled(universe))
+    return universe.state['windows']
+
+
+def _train(x_train, y_train, epochs):
+    torch.manual_seed(0)
+    model = GRU(input_dim=1, hidden_dim=32, num_layers=2, output_dim=FORECAST_HORIZON)
+    criterion = torch.nn.MSELoss(reduction='mean')
+    optimiser = torch.optim.Adam(model.parameters(), lr=0.01)
+    x = torch.from_numpy(x_train).type(torch.Tensor)
+    y = torch.from_numpy(y_train).type(torch.Tensor)
+    for _ in range(epochs):
+        loss = criterion(model(x), y)
+        optimiser.zero_grad()
+        loss.backward()
+        optimiser.step()
+    return model
+
+
+def _model(universe):
+    if 'model' not in universe.state:
+        x_train, y_train = _windows(universe)[universe.symbols[0]][:2]
+        universe.state['model'] = _train(x_train, y_train, 1)
+    return universe.state['model']
+
+
+def _predict_all(model, windows):
+    symbols = list(windows)
+    x_test = np.concatenate([windows[symbol][2] for symbol in symbols])
+    with torch.no_grad():
+        predictions = model(torch.from_numpy(x_test).type(torch.Tensor)).numpy()
+    # Split the batched predictions back per symbol
+    offsets = np.cumsum([0] + [len(windows[symbol][2]) for symbol in symbols])
+    return {symbol: predictions[offsets[i]:offsets[i + 1]] for i, symbol in enumerate(symbols)}
+
+
+def _predictions(universe):
+    if 'predictions' not in universe.state:
+        universe.state['predictions'] = _predict_all(_model(universe), _windows(universe))
+    return universe.state['predictions']
+
+
+def _count_windows(windows):
+    return sum(len(parts[0]) + len(parts[2]) for parts in windows.values())
+
+
+def _inverse(scaler, values):
+    return scaler.inverse_transform(values.reshape(-1, 1)).reshape(values.shape)
+
+
+def test_load_stock_data(recorder, universe):
+    stock_data = recorder.measure(
+        'load_stock_data', universe.scale,
+        lambda: load_stock_data(universe.symbols, universe.data_dir),
+        items=lambda loaded: sum(len(frame) for frame in loaded.values()), unit='rows')
+    universe.state['stock_data'] = stock_data
+    assert len(stock_data) == len(universe.symbols)
+
+
+def test_load_stock_data_lazy(recorder, universe):
+    # One pass over every symbol, keeping at most about two frames loaded
+    budget = 2 ** 20
+
+    def scan():
+        stock_data = load_stock_data(universe.symbols, universe.data_dir, memory_budget=budget)
+        closes = {symbol: frame['4. close'].iloc[-1] for symbol, frame in stock_data.items()}
+        return stock_data, closes
+
+    stock_data, closes = recorder.measure('load_stock_data_lazy', universe.scale, scan,
+                                          items=len(universe.symbols), unit='symbols')
+    stats = stock_data.stats()
+    recorder.entries[-1].update(memory_budget=budget, loaded_bytes=stats['bytes'], misses=stats['misses'],
+                                evictions=stats['evictions'])
+    assert len(closes) == len(universe.symbols)
+    assert stats['bytes'] <= budget or len(stats['loaded']) == 1
+
+
+def test_validation(recorder, universe):
+    stock_data = _loaded(universe)
+    # Screening itself, without the per-checksum cache
+    spans = recorder.measure('validation', universe.scale, lambda: screen_frames(stock_data),
+                             items=sum(len(frame) for frame in stock_data.values()), unit='rows')
+    assert set(spans['symbol']) <= set(universe.symbols)
+
+
+def test_adjustment(recorder, universe, tmp_path):
+    stock_data = _loaded(universe)
+    rows = sum(len(frame) for frame in stock_data.values())
+    actions = CorporateActions(str(tmp_path / 'actions'), str(tmp_path / 'cache'))
+    # A 2-for-1 split halfway through every history, then a dividend three quarters through it
+    for symbol, frame in stock_data.items():
+        actions.add(symbol, [{'date': frame.index[len(frame) // 2], 'kind': 'split', 'value': 2.0}])
+
+    def adjust_all():
+        return {symbol: actions.adjusted(symbol, frame) for symbol, frame in stock_data.items()}
+
+    recorder.measure('adjustment_full', universe.scale, adjust_all, items=rows, unit='rows', trace_memory=False)
+    for symbol, frame in stock_data.items():
+        actions.add(symbol, [{'date': frame.index[len(frame) * 3 // 4], 'kind': 'dividend', 'value': 0.05}])
+    adjusted = recorder.measure('adjustment_incremental', universe.scale, adjust_all, items=rows, unit='rows',
+                                trace_memory=False)
+    assert actions.last_update['mode'] == 'incremental'
+
+    symbol = universe.symbols[0]
+    rebuilt = CorporateActions(actions.root, cache_dir=None).adjusted(symbol, stock_data[symbol])
+    np.testing.assert_allclose(adjusted[symbol].to_numpy(), rebuilt.to_numpy(), rtol=1e-12)
+
+
+def test_scaling(recorder, universe):
+    stock_data = _loaded(universe)
+    rows = sum(len(frame['2019':'2024']) for frame in stock_data.values())
+    universe.state['scaled'] = recorder.measure(
+        'scaling', universe.scale, lambda: _scale_all(stock_data), items=rows, unit='rows')
+
+
+def test_split_multi(recorder, universe):
+    scaled = _scaled(universe)
+    universe.state['windows'] = recorder.measure(
+        'split_data_week_ahead_with_dates_multi', universe.scale, lambda: _window_all(scaled),
+        items=_count_windows, unit='windows')
+
+
+def test_split_single(recorder, universe):
+    scaled = _scaled(universe)
+    recorder.measure(
+        'split_data_week_ahead_with_dates_single', universe.scale,
+        lambda: {symbol: split_data_week_ahead_with_dates_single(frame, LOOKBACK, FORECAST_HORIZON)
+                 for symbol, (frame, _) in scaled.items()},
+        items=_count_windows, unit='windows')
+
+
+def test_training_epochs(recorder, universe):
+    windows = _windows(universe)
+    symbols = universe.symbols[:TRAIN_SYMBOLS]
+    samples = sum(len(windows[symbol][0]) for symbol in symbols) * EPOCHS
+
+    def train_sample():
+        return [_train(windows[symbol][0], windows[symbol][1], EPOCHS) for symbol in symbols]
+
+    # Torch allocations are not visible to tracemalloc, so memory is left to the RSS figure
+    models = recorder.measure('gru_training', universe.scale, train_sample, items=samples,
+                              unit='samples', trace_memory=False, epochs=EPOCHS,
+                              trained_symbols=len(symbols))
+
+    # Extrapolate to one 105-epoch model per symbol, as the notebook trains them
+    entry = recorder.entries[-1]
+    per_symbol_epoch = entry['wall_seconds'] / (len(symbols) * EPOCHS)
+    entry['projected_universe_seconds'] = per_symbol_epoch * 105 * len(universe.symbols)
+    universe.state['model'] = models[0]
+
+
+def test_inference(recorder, universe):
+    model = _model(universe)
+    windows = _windows(universe)
+    samples = sum(len(parts[2]) for parts in windows.values())
+    universe.state['predictions'] = recorder.measure(
+        'gru_inference', universe.scale, lambda: _predict_all(model, windows),
+        items=samples, unit='samples', trace_memory=False)
+
+
+def test_rmse(recorder, universe):
+    scaled = _scaled(universe)
+    windows = _windows(universe)
+    predictions = _predictions(universe)
+
+    def rmse_all():
+        return {symbol: rmse_per_day(_inverse(scaled[symbol][1], windows[symbol][3]),
+                                     _inverse(scaled[symbol][1], predictions[symbol]))
+                for symbol in predictions}
+
+    scores = recorder.measure('rmse', universe.scale, rmse_all,
+                              items=sum(len(p) for p in predictions.values()), unit='samples')
+    assert all(len(days) == FORECAST_HORIZON for days in scores.values())
+
+
+def test_plotting(recorder, universe):
+    scaled = _scaled(universe)
+    windows = _windows(universe)
+    predictions = _predictions(universe)
+    symbols = universe.symbols[:PLOT_SYMBOLS]
+    model = _model(universe)
+
+    def plot_sample():
+        sizes = []
+        for symbol in symbols:
+            x_train, y_train, _, y_test, dates_train, dates_test = windows[symbol]
+            scaler = scaled[symbol][1]
+            with torch.no_grad():
+                train_pred = model(torch.from_numpy(x_train).type(torch.Tensor)).numpy()
+            fig = plot_prediction_for_day(
+                daily_frames(_inverse(scaler, train_pred), dates_train, FORECAST_HORIZON, 'Predicted'),
+                daily_frames(_inverse(scaler, y_train), dates_train, FORECAST_HORIZON, 'Actual'),
+                daily_frames(_inverse(scaler, predictions[symbol]), dates_test, FORECAST_HORIZON, 'Predicted'),
+                daily_frames(_inverse(scaler, y_test), dates_test, FORECAST_HORIZON, 'Actual'),
+                7, symbol=symbol, show=False)
+            sizes.append(len(fig.to_html(include_plotlyjs=False)))
+        return sizes
+
+    sizes = recorder.measure('post_processing_and_plotting', universe.scale, plot_sample,
+                             items=len(symbols), unit='figures')
+    recorder.entries[-1]['html_bytes_per_figure'] = sum(sizes) / len(sizes)
+
+
+def test_prediction_store(recorder, universe, tmp_path):
+    scaled = _scaled(universe)
+    windows = _windows(universe)
+    predictions = _predictions(universe)
+    store = PredictionStore(str(tmp_path / 'predictions'))
+
+    def store_and_query():
+        tables = []
+        for symbol, predicted in predictions.items():
+            frame, scaler = scaled[symbol]
+            train_size = len(windows[symbol][0])
+            as_of, _ = window_dates(frame.index, LOOKBACK, FORECAST_HORIZON, train_size, len(predicted))
+            tables.append(predictions_table(symbol, _inverse(scaler, predicted), _inverse(scaler, windows[symbol][3]),
+                                            windows[symbol][5], as_of, 'benchmark', split='test'))
+        store.append(pa.concat_tables(tables))
+        return store.query([universe.symbols[0]], start='2023-01', end='2023-06', horizons=[FORECAST_HORIZON])
+
+    rows = sum(p.size for p in predictions.values())
+    recorder.measure('prediction_store', universe.scale, store_and_query, items=rows, unit='rows',
+                     trace_memory=False)
@@ -0,0 +1,110 @@
+"""
+Point and quantile forecasting on the PLUG windows.
+
+The GRU is trained from the same seed on the MSE and, with the default quantiles, on
+the pinball loss. The quantile model's entries record the test RMSE of its median
+next to the point model's, the coverage of its 10-90% interval and the calibration
+error of its quantiles. The forecasting entries compare the cost of one forward pass
+with and without the quantile outputs, and the metrics entry times the vectorized
+coverage and calibration metrics over many windows.
+"""
+import os
+
+import numpy as np
+import pytest
+import torch
+
+from conftest import REPO_DIR
+from stock_prediction.data import load_stock_data
+from stock_prediction.evaluation import interval_coverage, pinball_per_day, quantile_calibration
+from stock_prediction.inference import median_index
+from stock_prediction.model import DEFAULT_QUANTILES
+from stock_prediction.training import fit_gru, scale_prices
+from stock_prediction.windows import split_data_week_ahead_with_dates_multi
+
+QUANTILE_EPOCHS = int(os.environ.get('BENCH_QUANTILE_EPOCHS', '30'))
+
+_windows = {}
+_models = {}
+
+
+def _plug_windows():
+    if not _windows:
+        scaled, scaler = scale_prices(load_stock_data(['PLUG'], REPO_DIR)['PLUG']['2019':'2024']['4. close'])
+        x_train, y_train, x_test, y_test = split_data_week_ahead_with_dates_multi(scaled, 20, 7)[:4]
+        _windows.update(x_train=x_train, y_train=y_train, x_test=torch.from_numpy(x_test).float(), y_test=y_test,
+                        scaler=scaler)
+    return _windows
+
+
+def _usd(values):
+    scaler = _plug_windows()['scaler']
+    return (values - scaler.min_[0]) / scaler.scale_[0]
+
+
+@pytest.mark.parametrize('mode', ['point', 'quantile'])
+def test_quantile_training(recorder, mode):
+    windows = _plug_windows()
+    quantiles = DEFAULT_QUANTILES if mode == 'quantile' else None
+
+    def train(epochs=QUANTILE_EPOCHS):
+        torch.manual_seed(0)
+        return fit_gru(windows['x_train'], windows['y_train'], num_epochs=epochs, quantiles=quantiles)
+
+    if not _models:
+        train(epochs=1)  # Warm up torch before timing the first mode
+    model, summary = recorder.measure(f'quantile_train_{mode}', 1, train,
+                                      items=len(windows['x_train']) * QUANTILE_EPOCHS, unit='samples',
+                                      trace_memory=False, epochs=QUANTILE_EPOCHS)
+    _models[mode] = model
+    entry = recorder.entries[-1]
+
+    with torch.no_grad():
+        y_pred = _usd(model(windows['x_test']).numpy())
+    actual = _usd(windows['y_test'])
+    point = y_pred if quantiles is None else y_pred[:, :, median_index(quantiles)]
+    entry['final_loss'] = summary['final_loss']
+    entry['test_rmse'] = float(np.sqrt(((point - actual) ** 2).mean()))
+    if quantiles is not None:
+        calibration = quantile_calibration(actual, y_pred)
+        entry['quantiles'] = list(quantiles)
+        entry['test_coverage_per_day'] = interval_coverage(actual, y_pred[:, :, 0], y_pred[:, :, -1]).round(3).tolist()
+        entry['test_calibration_error'] = float(np.abs(calibration - quantiles).mean())
+        entry['test_pinball'] = float(pinball_per_day(actual, y_pred, quantiles).mean())
+        # The outputs are sorted, so the quantiles never cross
+        assert (np.diff(y_pred, axis=-1) >= 0).all()
+    assert np.isfinite(entry['final_loss'])
+
+
+@pytest.mark.parametrize('mode', ['point', 'quantile'])
+def test_quantile_forecast(recorder, mode):
+    if mode not in _models:
+        pytest.skip(f'the {mode} model was not trained in this session')
+    model, x_test = _models[mode], _plug_windows()['x_test']
+
+    def forecast():
+        with torch.no_grad():
+            return model(x_test)
+
+    forecast()  # Warm up
+    y_pred = recorder.measure(f'quantile_forecast_{mode}', 1, forecast, items=len(x_test), unit='windows',
+                              trace_memory=False)
+    assert y_pred.shape[:2] == (len(x_test), 7)
+
+
+def test_quantile_metrics(recorder):
+    rng = np.random.default_rng(0)
+    samples = 100_000
+    actual = rng.normal(0.0, 1.0, (samples, 7))
+    # Forecasts of a calibrated model: the normal quantiles of the same distribution
+    levels = np.asarray(DEFAULT_QUANTILES)
+    forecasts = np.broadcast_to(np.array([-1.2816, 0.0, 1.2816]), (samples, 7, 3))
+
+    def metrics():
+        return (interval_coverage(actual, forecasts[:, :, 0], forecasts[:, :, -1]),
+                quantile_calibration(actual, forecasts), pinball_per_day(actual, forecasts, levels))
+
+    coverage, calibration, _ = recorder.measure('quantile_metrics', 1, metrics, items=samples, unit='windows',
+                                                trace_memory=False)
+    np.testing.assert_allclose(coverage, 0.8, atol=0.01)
+    np.testing.assert_allclose(calibration, np.broadcast_to(levels, calibration.shape), atol=0.01)
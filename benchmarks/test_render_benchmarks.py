@@ -0,0 +1,64 @@
+"""
+Cold, warm and incremental batch rendering of the figures.
+
+The price history figures of the first BENCH_PLOT_SYMBOLS bundled symbols are drawn
+into a temporary directory by render_figures' worker pool. The cold run draws every
+figure; the warm run has the same inputs and must skip them all; the incremental run
+changes the window of one figure and must redraw only that one. The pipeline entries
+run the plot stage, prediction figures included, on freshly trained models and then
+rerun every node: the figures are unchanged, so the second plot stage skips them all.
+"""
+import glob
+import os
+
+from conftest import BUNDLED_SYMBOLS, EPOCHS, PLOT_SYMBOLS, REPO_DIR
+from stock_prediction.data import load_stock_data
+from stock_prediction.pipeline import run_pipeline, stage_output
+from stock_prediction.rendering import MANIFEST_NAME, history_jobs, job_hash, render_figures
+
+SYMBOLS = BUNDLED_SYMBOLS[:PLOT_SYMBOLS]
+
+
+def test_render_figures(recorder, tmp_path):
+    output_dir = str(tmp_path / 'reports')
+    stock_data = load_stock_data(SYMBOLS, REPO_DIR)
+    jobs = history_jobs(stock_data)
+    # Only the window of the first symbol's rolling figure changes in the incremental run
+    changed = [job._replace(options={'window': 20}) if job.path == f'{SYMBOLS[0]}/rolling.png' else job
+               for job in jobs]
+    # The hashes follow the content, not the objects
+    copies = {symbol: frame.copy() for symbol, frame in stock_data.items()}
+    assert [job_hash(job) for job in jobs] == [job_hash(job) for job in history_jobs(copies)]
+    assert sum(job_hash(old) != job_hash(new) for old, new in zip(jobs, changed)) == 1
+
+    for run, run_jobs, rendered in (('cold', jobs, len(jobs)), ('warm', jobs, 0), ('incremental', changed, 1)):
+        summary = recorder.measure(f'render_{run}', 1, lambda: render_figures(run_jobs, output_dir), items=len(jobs),
+                                   unit='figures', trace_memory=False, symbols=len(SYMBOLS))
+        recorder.entries[-1].update(rendered=len(summary['rendered']), skipped=len(summary['skipped']))
+        assert not summary['failed']
+        assert len(summary['rendered']) == rendered
+        assert len(summary['skipped']) == len(jobs) - rendered
+
+    # Every figure was written through its temporary file and renamed
+    assert all(os.path.getsize(os.path.join(output_dir, job.path)) > 0 for job in jobs)
+    assert not glob.glob(os.path.join(output_dir, '**', '*.tmp*'), recursive=True)
+    assert os.path.exists(os.path.join(output_dir, MANIFEST_NAME))
+
+
+def test_render_pipeline_plot(recorder, tmp_path):
+    options = dict(data_dir=REPO_DIR, model_dir=str(tmp_path / 'models'), output_dir=str(tmp_path / 'reports'),
+                   cache_dir=str(tmp_path / 'cache'), validation_cache=str(tmp_path / 'validation_cache'),
+                   stages=['plot'], num_epochs=EPOCHS)
+
+    for run, force in (('cold', False), ('rerun', True)):
+        summary = recorder.measure(f'render_pipeline_{run}', 1, lambda: run_pipeline(SYMBOLS, force=force, **options),
+                                   items=len(SYMBOLS), unit='symbols', trace_memory=False)
+        assert not summary['failed'] and not summary['blocked']
+        assert 'plot' in summary['ran']
+        plot = stage_output(options['cache_dir'], 'plot')
+        recorder.entries[-1].update(plot)
+        if run == 'cold':
+            figures = plot['rendered']
+            assert figures and plot['skipped'] == 0
+        else:
+            assert plot == {'rendered': 0, 'skipped': figures}
@@ -0,0 +1,73 @@
+"""
+Assembly of the prediction store rows of a universe of symbols.
+
+The PLUG test windows are replicated over BENCH_ASSEMBLY_SYMBOLS symbols with their own
+scaling parameters, as a panel model forecasting every symbol at once would return
+them. The per-symbol loop inverse-transforms each symbol's forecasts with its fitted
+scaler and builds its table from the per-window date lists of the split function; the
+vectorized entry undoes the stored affine scaling of the whole (windows, horizon,
+symbols) array and looks the dates up from integer window offsets.
+"""
+import os
+
+import numpy as np
+import pyarrow as pa
+from sklearn.preprocessing import MinMaxScaler
+
+from conftest import REPO_DIR
+from stock_prediction.data import load_stock_data
+from stock_prediction.prediction_store import predictions_table
+from stock_prediction.results import assemble_predictions, scaling_params, window_offsets
+from stock_prediction.training import scale_prices
+from stock_prediction.windows import split_data_week_ahead_with_dates_multi, window_dates, window_split_sizes
+
+ASSEMBLY_SYMBOLS = int(os.environ.get('BENCH_ASSEMBLY_SYMBOLS', '500'))
+
+
+def _universe_forecasts():
+    prices = load_stock_data(['PLUG'], REPO_DIR)['PLUG']['2019':'2024']['4. close']
+    scaled, _ = scale_prices(prices)
+    _, _, _, y_test, _, dates_test = split_data_week_ahead_with_dates_multi(scaled, 20, 7)
+    rng = np.random.default_rng(0)
+    # Every symbol gets its own price level, hence its own scaler
+    scalers = []
+    for level in rng.uniform(1.0, 500.0, ASSEMBLY_SYMBOLS):
+        scalers.append(MinMaxScaler(feature_range=(-1, 1)).fit(prices.to_numpy().reshape(-1, 1) * level))
+    actual = np.repeat(y_test[:, :, None], ASSEMBLY_SYMBOLS, axis=2)
+    predicted = actual + rng.normal(0.0, 0.01, actual.shape)
+    train_size, test_size = window_split_sizes(len(scaled), 20, 7)
+    return scaled.index, dates_test, train_size, test_size, scalers, predicted, actual
+
+
+def test_result_assembly(recorder):
+    dates, dates_test, train_size, test_size, scalers, predicted, actual = _universe_forecasts()
+    symbols = [f'S{number:04d}' for number in range(ASSEMBLY_SYMBOLS)]
+    as_of, _ = window_dates(dates, 20, 7, train_size, test_size)
+    rows = predicted.size
+
+    def per_symbol():
+        return pa.concat_tables([
+            predictions_table(symbol, scaler.inverse_transform(predicted[:, :, number]),
+                              scaler.inverse_transform(actual[:, :, number]), dates_test, as_of, 'v1', split='test')
+            for number, (symbol, scaler) in enumerate(zip(symbols, scalers))
+        ])
+
+    def vectorized():
+        scale, minimum = scaling_params(scalers)
+        offsets = window_offsets(len(dates), 20, 7, train_size, test_size)
+        return assemble_predictions(symbols, predicted, actual, dates, offsets, scale, minimum, 'v1', split='test')
+
+    expected = recorder.measure('assembly_per_symbol', 1, per_symbol, items=rows, unit='rows', trace_memory=False,
+                                symbols=ASSEMBLY_SYMBOLS)
+    # Warm up pyarrow's casts and let the allocator map the large arrays' pages before timing
+    for _ in range(2):
+        vectorized()
+    table = recorder.measure('assembly_vectorized', 1, vectorized, items=rows, unit='rows', trace_memory=False,
+                             symbols=ASSEMBLY_SYMBOLS)
+    recorder.entries[-1]['speedup'] = recorder.entries[-1]['throughput'] / recorder.entries[-2]['throughput']
+
+    assert table.schema == expected.schema
+    assert table.column('target_date').equals(expected.column('target_date'))
+    assert table.column('symbol').equals(expected.column('symbol'))
+    np.testing.assert_allclose(table.column('predicted').to_numpy(), expected.column('predicted').to_numpy(),
+                               rtol=1e-12)
@@ -0,0 +1,87 @@
+"""
+Streaming forecasts of a replayed universe.
+
+GRU models of the bundled symbols are trained into a temporary model directory, and
+BENCH_STREAM_SCALE perturbed copies of every symbol reuse the model of their source.
+The daily bars from BENCH_STREAM_START on are replayed in date order; the earlier bars
+fill the ring buffers. The per-message entry forecasts every bar on its own, with
+its symbol's model, as a consumer without coalescing would. The unpaced entry streams
+the bars through StreamingForecaster as fast as it takes them, which measures the
+throughput; the paced entry replays them at BENCH_STREAM_SPEEDUP times real time and
+records the end-to-end latency of the forecasts.
+"""
+import os
+import shutil
+
+import numpy as np
+
+from conftest import BUNDLED_SYMBOLS, EPOCHS, REPO_DIR, write_synthetic_universe
+from stock_prediction.artifacts import artifact_path, load_model_artifact
+from stock_prediction.inference import gru_forward_numpy
+from stock_prediction.streaming import StreamingForecaster, replay_messages, simulate_stream
+from stock_prediction.training import train_symbol
+
+STREAM_SCALE = int(os.environ.get('BENCH_STREAM_SCALE', '10'))
+STREAM_START = os.environ.get('BENCH_STREAM_START', '2023-07')
+STREAM_SPEEDUP = float(os.environ.get('BENCH_STREAM_SPEEDUP', str(86400 * 100)))
+
+
+def _universe(tmp_path):
+    data_dir, model_dir = str(tmp_path / 'data'), str(tmp_path / 'models')
+    os.makedirs(data_dir)
+    symbols = write_synthetic_universe(data_dir, STREAM_SCALE)
+    for source in BUNDLED_SYMBOLS:
+        train_symbol(source, REPO_DIR, model_dir, num_epochs=EPOCHS)
+    # The copies are written source by source, STREAM_SCALE times over
+    for number, symbol in enumerate(symbols):
+        source = BUNDLED_SYMBOLS[number % len(BUNDLED_SYMBOLS)]
+        shutil.copyfile(artifact_path(model_dir, source), artifact_path(model_dir, symbol))
+    return data_dir, model_dir, symbols
+
+
+def _per_message(messages, history, models):
+    windows = {}
+    for quote in history:
+        windows.setdefault(quote.symbol, []).append(quote.price)
+    latest = {}
+    for quote in messages:
+        params, config = models[quote.symbol]
+        closes = windows[quote.symbol]
+        closes.append(quote.price)
+        x = np.asarray(closes[-config['lookback']:], dtype=np.float32) * config['scale'] + config['min']
+        scaled = gru_forward_numpy(params, x.reshape(1, -1, 1), config['num_layers'])[0]
+        latest[quote.symbol] = (scaled - config['min']) / config['scale']
+    return latest
+
+
+def test_streaming(recorder, tmp_path):
+    data_dir, model_dir, symbols = _universe(tmp_path)
+    messages = replay_messages(symbols, data_dir)
+    first = np.searchsorted(np.array([quote.timestamp for quote in messages]), np.datetime64(STREAM_START, 'D'))
+    history, replayed = messages[:first], messages[first:]
+    models = {symbol: load_model_artifact(artifact_path(model_dir, symbol)) for symbol in symbols}
+
+    expected = recorder.measure('stream_per_message', STREAM_SCALE, lambda: _per_message(replayed, history, models),
+                                items=len(replayed), unit='messages', trace_memory=False, symbols=len(symbols))
+
+    forecaster = StreamingForecaster(symbols, model_dir)
+    forecaster.warm_up(history)
+    stats = recorder.measure('stream_unpaced', STREAM_SCALE,
+                             lambda: simulate_stream(forecaster, data_dir, messages=replayed),
+                             items=len(replayed), unit='messages', trace_memory=False, symbols=len(symbols))
+    entry = recorder.entries[-1]
+    entry['speedup'] = entry['throughput'] / recorder.entries[-2]['throughput']
+    entry.update({name: stats[name] for name in ('forecasts', 'passes', 'latency_p50_ms', 'latency_p99_ms')})
+    assert stats['forecasts'] == len(replayed)
+    for symbol, prices in expected.items():
+        np.testing.assert_allclose(forecaster.latest[symbol][1], prices, rtol=1e-4)
+
+    forecaster = StreamingForecaster(symbols, model_dir)
+    stats = recorder.measure('stream_paced', STREAM_SCALE,
+                             lambda: simulate_stream(forecaster, data_dir, STREAM_SPEEDUP, STREAM_START),
+                             items=len(replayed), unit='messages', trace_memory=False, symbols=len(symbols),
+                             replay_speedup=STREAM_SPEEDUP)
+    entry = recorder.entries[-1]
+    entry.update({name: stats[name] for name in ('latency_p50_ms', 'latency_p99_ms', 'latency_max_ms',
+                                                 'lag_seconds')})
+    assert stats['forecasts'] == len(replayed)
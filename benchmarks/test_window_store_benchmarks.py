@@ -0,0 +1,92 @@
+"""
+Memory of worker processes that rebuild their windows versus ones that attach to the window store.
+
+Every worker needs the windows of all bundled symbols over their full history. In
+the 'rebuild' mode each worker reads the CSV files, scales the prices and cuts the
+windows itself, as train_symbol does; in the 'attach' mode the windows are published
+once and every worker maps them from the store. Workers are spawned fresh, so they
+share nothing with the benchmark process, and each one reports its private memory
+(the pages no other process shares). The entries record the total over the workers.
+
+This module only imports NumPy up front, so that attaching workers never import pandas.
+"""
+import concurrent.futures
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SYMBOLS = ['PLUG', 'NIO', 'NTLA', 'SNAP', 'CHPT']
+WORKER_COUNTS = [1, 2, 4]
+
+_published = {}
+
+
+def _private_bytes():
+    fields = {}
+    with open('/proc/self/smaps_rollup') as file:
+        for line in file:
+            name, _, value = line.partition(':')
+            if name in ('Private_Clean', 'Private_Dirty'):
+                fields[name] = int(value.split()[0]) * 1024
+    return sum(fields.values())
+
+
+def _rebuild(_):
+    from stock_prediction.data import load_stock_data
+    from stock_prediction.training import scale_prices
+    from stock_prediction.window_store import window_arrays
+
+    stock_data = load_stock_data(SYMBOLS, REPO_DIR)
+    total = 0.0
+    for frame in stock_data.values():
+        scaled, _ = scale_prices(frame['4. close'])
+        total += float(window_arrays(scaled, 20, 7)['x_train'].sum())
+    return total, _private_bytes()
+
+
+def _attach(store_and_keys):
+    store, keys = store_and_keys
+    total = 0.0
+    for key in keys:
+        with store.attach(key) as windows:
+            total += float(windows['x_train'].sum())
+    return total, _private_bytes()
+
+
+def _publish(root):
+    if root not in _published:
+        from stock_prediction.data import load_stock_data
+        from stock_prediction.training import scale_prices
+        from stock_prediction.window_store import WindowStore
+
+        store = WindowStore(root)
+        keys = [store.publish(symbol, scale_prices(frame['4. close'])[0], 20, 7)
+                for symbol, frame in load_stock_data(SYMBOLS, REPO_DIR).items()]
+        _published[root] = (store, keys)
+    return _published[root]
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/smaps_rollup'), reason='needs /proc/self/smaps_rollup')
+@pytest.mark.parametrize('workers', WORKER_COUNTS)
+@pytest.mark.parametrize('mode', ['rebuild', 'attach'])
+def test_window_store(recorder, tmp_path_factory, mode, workers):
+    store, keys = _publish(str(tmp_path_factory.getbasetemp() / 'window_store'))
+    task, argument = (_rebuild, None) if mode == 'rebuild' else (_attach, (store, keys))
+
+    def run():
+        context = multiprocessing.get_context('spawn')
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            return list(executor.map(task, [argument] * workers))
+
+    results = recorder.measure(f'window_store_{mode}', workers, run, items=workers, unit='workers',
+                               trace_memory=False)
+    entry = recorder.entries[-1]
+    entry['private_bytes'] = sum(private for _, private in results)
+    entry['private_bytes_per_worker'] = entry['private_bytes'] / workers
+    entry['window_bytes'] = sum(store.entries()[key]['bytes'] for key in keys)
+    np.testing.assert_allclose([total for total, _ in results], results[0][0])
+    # Every worker released its lease
+    assert not any(store.entries()[key]['leases'] for key in keys)
@@ -0,0 +1,103 @@
+"""
+Reusable building blocks for the stock price prediction pipeline.
+
+The exploratory walkthrough lives in GRU_Stock_Close_Price_Prediction.py; the
+functions that several cells (or several symbols) share are kept here so they
+can be imported without re-running the notebook.
+
+Submodules are imported on first attribute access, so `import stock_prediction`
+does not pull in pandas, torch or plotly until they are actually needed.
+"""
+import importlib
+
+# Public name -> submodule that defines it
+_EXPORTS = {
+    'retrieve_stock_data': 'data',
+    'load_stock_data': 'data',
+    'latest_data_file': 'data',
+    'StockDataCache': 'data',
+    'screen_stock_data': 'validation',
+    'exclude_spans': 'validation',
+    'CorporateActions': 'adjustments',
+    'IntradayStore': 'intraday',
+    'resample_bars': 'intraday',
+    'PricePanel': 'panel',
+    'build_price_panel': 'panel',
+    'load_price_panel': 'panel',
+    'correlation_matrix': 'correlation',
+    'RollingCorrelation': 'correlation',
+    'top_k_correlated': 'correlation',
+    'split_data_week_ahead_with_dates_multi': 'windows',
+    'split_data_week_ahead_with_dates_single': 'windows',
+    'window_dates': 'windows',
+    'chronological_validation_split': 'windows',
+    'WindowStore': 'window_store',
+    'GRU': 'model',
+    'LSTM': 'model',
+    'TemporalConvNet': 'model',
+    'TransformerForecaster': 'model',
+    'PinballLoss': 'model',
+    'Forecaster': 'zoo',
+    'register_model': 'zoo',
+    'train_instrumented': 'instrumentation',
+    'predict_instrumented': 'instrumentation',
+    'performance_mode': 'performance',
+    'pin_threads': 'performance',
+    'train_symbol': 'training',
+    'fit_gru': 'training',
+    'training_settings': 'training',
+    'artifact_settings': 'training',
+    'run_pipeline': 'pipeline',
+    'Ensemble': 'ensemble',
+    'member_specs': 'ensemble',
+    'train_ensemble': 'ensemble',
+    'predict_symbol': 'inference',
+    'predict_quantiles': 'inference',
+    'stack_params': 'inference',
+    'evaluate_symbol': 'evaluation',
+    'rmse_per_day': 'evaluation',
+    'interval_coverage': 'evaluation',
+    'quantile_calibration': 'evaluation',
+    'pinball_per_day': 'evaluation',
+    'prediction_frames': 'evaluation',
+    'store_predictions': 'evaluation',
+    'integrated_gradients': 'attribution',
+    'attribute_symbols': 'attribution',
+    'PredictionStore': 'prediction_store',
+    'AttributionStore': 'prediction_store',
+    'predictions_table': 'prediction_store',
+    'assemble_predictions': 'results',
+    'inverse_scale': 'results',
+    'window_offsets': 'results',
+    'lttb_indices': 'downsampling',
+    'downsample_series': 'downsampling',
+    'fit_baselines': 'baselines',
+    'baseline_forecasts': 'baselines',
+    'MetricsTable': 'metrics_table',
+    'DriftMonitor': 'monitoring',
+    'StreamingForecaster': 'streaming',
+    'RingBuffers': 'streaming',
+    'simulate_stream': 'streaming',
+    'plot_prediction_for_day': 'plotting',
+    'plot_close_price': 'plotting',
+    'plot_window_functions': 'plotting',
+    'plot_decomposition': 'plotting',
+    'RenderJob': 'rendering',
+    'history_jobs': 'rendering',
+    'prediction_jobs': 'rendering',
+    'render_figures': 'rendering',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{_EXPORTS[name]}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
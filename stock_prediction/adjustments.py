@@ -0,0 +1,299 @@
+"""
+Corporate-action adjustment of the historical data.
+
+retrieve_stock_data downloads unadjusted daily bars, so splits show up as jumps
+(PLUG's 1-for-10 reverse split multiplied its price by ten overnight on 2011-05-20).
+CorporateActions keeps the split and dividend factors of every symbol in a small CSV
+file per symbol and builds back-adjusted OHLCV series from them:
+
+- A split with factor r (new shares per old share: 2 for a 2-for-1 split, 0.1 for a
+  1-for-10 reverse split) divides the prices before its ex-date by r and multiplies
+  the volumes by r.
+- A cash dividend D multiplies the prices before its ex-date by 1 - D / close, where
+  close is the unadjusted close of the day before the ex-date.
+
+Adjusted series are cached with the actions they include. As every action only
+scales the rows before its ex-date, a new action rescales that prefix of the cached
+series and new bars are appended as they are, instead of recomputing everything.
+Removed or changed actions, or a rewritten history, rebuild the series.
+
+Actions come from Alpha Vantage's adjusted endpoint (retrieve_corporate_actions), from
+the splits flagged by the validation stage (split_actions), or from fixture files,
+so the adjustments can be checked offline.
+
+Usage:
+    actions = CorporateActions('corporate_actions')
+    actions.add('PLUG', [{'date': '2011-05-20', 'kind': 'split', 'value': 0.1}])
+    adjusted = actions.adjusted('PLUG', load_stock_data(['PLUG'])['PLUG'])
+"""
+import csv
+import hashlib
+import json
+import os
+
+import numpy as np
+
+ACTION_FIELDS = ['date', 'kind', 'value', 'source']
+ACTION_KINDS = ('split', 'dividend')
+
+PRICE_COLUMNS = ['1. open', '2. high', '3. low', '4. close']
+VOLUME_COLUMN = '5. volume'
+
+
+def _action_key(action):
+    return (str(action['date']), action['kind'], float(action['value']))
+
+
+def _factors(actions, dates, close):
+    """
+    Price and volume factors of each action, with the number of leading rows it scales.
+
+    Returns:
+    list: (rows, price_factor, volume_factor) per action.
+    """
+    factors = []
+    for action in actions:
+        rows = int(np.searchsorted(dates, np.datetime64(action['date'], 'D')))
+        if action['kind'] == 'split':
+            factors.append((rows, 1.0 / action['value'], action['value']))
+        elif rows > 0:
+            factors.append((rows, 1.0 - action['value'] / close[rows - 1], 1.0))
+    return factors
+
+
+def _hash_rows(dates, raw):
+    return hashlib.sha1(dates.tobytes() + np.ascontiguousarray(raw).tobytes()).hexdigest()
+
+
+class CorporateActions:
+    """
+    A directory of per-symbol corporate-action files, with cached adjusted series.
+    """
+
+    def __init__(self, root='corporate_actions', cache_dir='.adjustment_cache'):
+        self.root = root
+        self.cache_dir = cache_dir
+        # How the last adjusted() call was served, e.g. {'mode': 'incremental', 'rows': 2893}
+        self.last_update = None
+
+    def _path(self, symbol):
+        return os.path.join(self.root, f'{symbol}_actions.csv')
+
+    def actions(self, symbol):
+        """
+        Read the actions of a symbol, oldest first.
+
+        Returns:
+        list: One dict per action with the ACTION_FIELDS keys; 'value' is a float.
+        """
+        path = self._path(symbol)
+        if not os.path.exists(path):
+            return []
+        with open(path, newline='') as file:
+            actions = [dict(row, value=float(row['value'])) for row in csv.DictReader(file)]
+        return sorted(actions, key=lambda action: (action['date'], action['kind']))
+
+    def factor_after(self, symbol, frame, date):
+        """
+        Return the combined price factor of the actions with ex-dates after a date.
+
+        Prices adjusted for every action, divided by this factor, are in the units of the
+        prices adjusted on that date, e.g. those a model was trained on.
+
+        Parameters:
+        symbol (str): The stock symbol.
+        frame (DataFrame): Unadjusted data indexed by date, as returned by load_stock_data.
+        date (str): The date, e.g. the last bar adjusted for training.
+
+        Returns:
+        float: 1.0 when no action took effect since.
+        """
+        frame = frame.sort_index()
+        dates = frame.index.values.astype('datetime64[D]')
+        since = [action for action in self.actions(symbol)
+                 if len(dates) and np.datetime64(date, 'D') < np.datetime64(action['date'], 'D') <= dates[-1]]
+        factors = _factors(since, dates, frame['4. close'].to_numpy(dtype=np.float64))
+        return float(np.prod([price for _, price, _ in factors]))
+
+    def add(self, symbol, actions, source='manual', replace=True):
+        """
+        Record actions of a symbol.
+
+        Parameters:
+        symbol (str): The stock symbol.
+        actions (iterable): Dicts with 'date' ('YYYY-MM-DD'), 'kind' ('split' or 'dividend')
+            and 'value' (split factor or cash dividend per share), and optionally 'source'.
+        source (str): Source recorded for actions without one.
+        replace (bool): Whether an action replaces a recorded one of the same date and kind;
+            otherwise the recorded one is kept.
+
+        Returns:
+        int: Number of actions that were new or changed.
+        """
+        recorded = {(action['date'], action['kind']): action for action in self.actions(symbol)}
+        changed = 0
+        for action in actions:
+            if action['kind'] not in ACTION_KINDS:
+                raise ValueError(f"Unknown corporate action kind {action['kind']!r}, choose from {ACTION_KINDS}")
+            action = {'date': str(action['date'])[:10], 'kind': action['kind'], 'value': float(action['value']),
+                      'source': action.get('source', source)}
+            previous = recorded.get((action['date'], action['kind']))
+            if previous is not None and not replace:
+                continue
+            if previous is None or previous['value'] != action['value']:
+                changed += 1
+            recorded[(action['date'], action['kind'])] = action
+
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(symbol)
+        with open(path + '.tmp', 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=ACTION_FIELDS)
+            writer.writeheader()
+            writer.writerows(sorted(recorded.values(), key=lambda action: (action['date'], action['kind'])))
+        os.replace(path + '.tmp', path)
+        return changed
+
+    def adjusted(self, symbol, frame):
+        """
+        Back-adjust a symbol's OHLCV data for its recorded actions.
+
+        Parameters:
+        symbol (str): The stock symbol.
+        frame (DataFrame): Unadjusted data indexed by date, as returned by load_stock_data.
+
+        Returns:
+        DataFrame: The adjusted data, with the same index and columns.
+        """
+        frame = frame.sort_index()
+        dates = frame.index.values.astype('datetime64[D]')
+        raw = frame[PRICE_COLUMNS + [VOLUME_COLUMN]].to_numpy(dtype=np.float64)
+        # Actions dated after the last bar take effect once their ex-date is in the data
+        actions = [action for action in self.actions(symbol)
+                   if len(dates) and np.datetime64(action['date'], 'D') <= dates[-1]]
+
+        cached = self._load(symbol)
+        keys = {_action_key(action) for action in actions}
+        applied = {_action_key(action) for action in cached['actions']} if cached else set()
+        rows = cached['rows'] if cached else 0
+
+        if (cached is None or not applied <= keys or rows > len(dates)
+                or _hash_rows(dates[:rows], raw[:rows]) != cached['raw_hash']):
+            adjusted, price_factor, volume_factor = self._full(actions, dates, raw)
+            self.last_update = {'symbol': symbol, 'mode': 'full', 'rows': len(dates)}
+        else:
+            adjusted, price_factor, volume_factor = cached['adjusted'], cached['price_factor'], cached['volume_factor']
+            recomputed = 0
+            if rows < len(dates):
+                # New bars are unadjusted: the cached actions all precede them
+                price_factor = np.concatenate([price_factor, np.ones(len(dates) - rows)])
+                volume_factor = np.concatenate([volume_factor, np.ones(len(dates) - rows)])
+                adjusted = np.concatenate([adjusted, raw[rows:]])
+            new_actions = [action for action in actions if _action_key(action) not in applied]
+            for end, price, volume in _factors(new_actions, dates, raw[:, 3]):
+                # A new action only rescales the rows before its ex-date
+                price_factor[:end] *= price
+                volume_factor[:end] *= volume
+                adjusted[:end, :4] *= price
+                adjusted[:end, 4] *= volume
+                recomputed = max(recomputed, end)
+            mode = 'incremental' if new_actions or rows < len(dates) else 'cached'
+            self.last_update = {'symbol': symbol, 'mode': mode, 'rows': recomputed + len(dates) - rows}
+
+        if self.last_update['mode'] != 'cached':
+            self._save(symbol, actions, dates, raw, adjusted, price_factor, volume_factor)
+        result = frame.copy()
+        result[PRICE_COLUMNS + [VOLUME_COLUMN]] = adjusted
+        return result
+
+    @staticmethod
+    def _apply(raw, price_factor, volume_factor):
+        adjusted = raw.copy()
+        adjusted[:, :4] *= price_factor[:, None]
+        adjusted[:, 4] *= volume_factor
+        return adjusted
+
+    def _full(self, actions, dates, raw):
+        # Each factor scales the rows before its ex-date: accumulate them from the newest row back
+        price_steps, volume_steps = np.ones(len(dates) + 1), np.ones(len(dates) + 1)
+        for end, price, volume in _factors(actions, dates, raw[:, 3]):
+            price_steps[end] *= price
+            volume_steps[end] *= volume
+        price_factor = np.cumprod(price_steps[::-1])[::-1][1:]
+        volume_factor = np.cumprod(volume_steps[::-1])[::-1][1:]
+        return self._apply(raw, price_factor, volume_factor), price_factor, volume_factor
+
+    def _cache_path(self, symbol):
+        return os.path.join(self.cache_dir, f'{symbol}_adjusted.npz')
+
+    def _load(self, symbol):
+        if self.cache_dir is None or not os.path.exists(self._cache_path(symbol)):
+            return None
+        with np.load(self._cache_path(symbol)) as stored:
+            return {
+                'actions': json.loads(str(stored['actions'])),
+                'rows': len(stored['adjusted']),
+                'raw_hash': str(stored['raw_hash']),
+                'adjusted': stored['adjusted'],
+                'price_factor': stored['price_factor'],
+                'volume_factor': stored['volume_factor'],
+            }
+
+    def _save(self, symbol, actions, dates, raw, adjusted, price_factor, volume_factor):
+        if self.cache_dir is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._cache_path(symbol)
+        np.savez(path + '.tmp.npz', actions=np.array(json.dumps(actions)), raw_hash=np.array(_hash_rows(dates, raw)),
+                 adjusted=adjusted, price_factor=price_factor, volume_factor=volume_factor)
+        os.replace(path + '.tmp.npz', path)
+
+
+def split_actions(spans):
+    """
+    Turn the 'split' spans of the validation stage into split actions.
+
+    Parameters:
+    spans (DataFrame): Anomaly spans, from validation.screen_stock_data.
+
+    Returns:
+    dict: Lists of actions keyed by symbol, for CorporateActions.add.
+    """
+    splits = spans[spans['check'] == 'split']
+    actions = {}
+    for symbol, start, value in zip(splits['symbol'], splits['start'], splits['value']):
+        actions.setdefault(symbol, []).append({'date': start.strftime('%Y-%m-%d'), 'kind': 'split',
+                                               'value': float(value), 'source': 'validation'})
+    return actions
+
+
+def retrieve_corporate_actions(symbols, actions, api_key_file='AlphaVantage.txt'):
+    """
+    Download the splits and dividends of every symbol from Alpha Vantage's adjusted daily data.
+
+    Parameters:
+    symbols (list): The stock symbols.
+    actions (CorporateActions): The store the actions are added to.
+    api_key_file (str): The file holding the Alpha Vantage API key.
+
+    Returns:
+    dict: Number of new or changed actions per symbol.
+    """
+    from alpha_vantage.timeseries import TimeSeries
+
+    with open(api_key_file, 'r') as file:
+        api_key = file.read().strip()
+    ts = TimeSeries(key=api_key, output_format='pandas')
+
+    changed = {}
+    for symbol in symbols:
+        try:
+            data, _ = ts.get_daily_adjusted(symbol=symbol, outputsize='full')
+        except ValueError as e:
+            print(f"Error retrieving corporate actions for {symbol}: {e}")
+            continue
+        found = [{'date': date.strftime('%Y-%m-%d'), 'kind': 'split', 'value': value}
+                 for date, value in data['8. split coefficient'].items() if value != 1.0]
+        found += [{'date': date.strftime('%Y-%m-%d'), 'kind': 'dividend', 'value': value}
+                  for date, value in data['7. dividend amount'].items() if value > 0.0]
+        changed[symbol] = actions.add(symbol, found, source='alpha_vantage')
+    return changed
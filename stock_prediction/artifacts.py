@@ -0,0 +1,64 @@
+"""
+Saving and loading trained models as plain NumPy archives.
+
+An artifact holds the network weights, the architecture, the window sizes and the
+MinMaxScaler parameters the model was trained with. Because it is a .npz file, it
+can be loaded and evaluated (see inference.py) without importing torch.
+"""
+import json
+import os
+
+import numpy as np
+
+
+def artifact_path(model_dir, symbol):
+    """
+    Return the path of the model artifact for a symbol.
+    """
+    return os.path.join(model_dir, f'{symbol}_gru.npz')
+
+
+def save_model_artifact(path, model, scaler, **config):
+    """
+    Save a trained GRU together with its scaler and configuration.
+
+    Parameters:
+    path (str): Destination .npz file.
+    model (nn.Module): The trained model.
+    scaler (MinMaxScaler): The scaler fitted on the training prices.
+    config: Architecture and window settings, e.g. lookback, forecast_horizon, hidden_dim.
+
+    Returns:
+    str: The path written.
+    """
+    arrays = {name: tensor.detach().cpu().numpy() for name, tensor in model.state_dict().items()}
+    config = dict(config, scale=float(scaler.scale_[0]), min=float(scaler.min_[0]))
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    np.savez(path, config=np.array(json.dumps(config)), **arrays)
+    return path
+
+
+def load_model_artifact(path):
+    """
+    Load an artifact written by save_model_artifact.
+
+    Returns:
+    tuple: (params, config) where params maps state_dict names to arrays.
+    """
+    with np.load(path) as stored:
+        config = json.loads(str(stored['config']))
+        params = {name: stored[name] for name in stored.files if name != 'config'}
+    return params, config
+
+
+def model_version(config):
+    """
+    Identify the model an artifact holds, for example in stored predictions.
+
+    Parameters:
+    config (dict): The artifact configuration, as returned by load_model_artifact.
+
+    Returns:
+    str: 'gru-' followed by the training timestamp.
+    """
+    return f"gru-{config['trained_at']}"
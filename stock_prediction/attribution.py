@@ -0,0 +1,262 @@
+"""
+Attribution of the GRU forecasts to their input days.
+
+Integrated gradients against a set of background windows (the expected-gradients
+form of DeepSHAP): for every background window b, the gradients of the forecast are
+averaged along the straight path from b to the input x and multiplied by x - b, and
+the results are averaged over the background. The importances of a window then add
+up to its forecast minus the mean forecast of the background, for every forecast day,
+and give the contribution of every input timestep and feature.
+
+The cost is one forward pass and one backward pass per forecast day over windows x
+background x steps path points. Instead of running them per window, the path points
+of a whole batch of windows go through the model at once. The background windows are
+drawn from the model's training windows once and cached per model version, so every
+run explains against the same reference. Symbols are attributed in parallel worker
+processes, and the results are stored alongside the predictions (see
+PredictionStore.attributions).
+
+Usage:
+    results = attribute_symbols(['PLUG', 'NIO'], store=PredictionStore('predictions'))
+    results['PLUG']['attributions']  # (windows, forecast_horizon, lookback, features)
+"""
+import concurrent.futures
+import os
+import time
+
+import numpy as np
+
+# Points per integration path and background windows per model
+DEFAULT_STEPS = 8
+DEFAULT_BACKGROUND = 8
+
+
+def load_gru(params, config):
+    """
+    Build the torch GRU of a saved model artifact.
+
+    Parameters:
+    params (dict): state_dict arrays, as returned by load_model_artifact.
+    config (dict): The artifact config.
+
+    Returns:
+    GRU: The model in evaluation mode.
+    """
+    import torch
+
+    from .model import GRU
+
+    model = GRU(input_dim=config.get('input_dim', 1), hidden_dim=config['hidden_dim'],
+                num_layers=config['num_layers'], output_dim=config['forecast_horizon'],
+                strategy=config.get('strategy', 'direct'), block=config.get('block'),
+                quantiles=config.get('quantiles'))
+    model.load_state_dict({name: torch.from_numpy(np.asarray(value)) for name, value in params.items()})
+    return model.eval()
+
+
+def background_windows(x_train, size=DEFAULT_BACKGROUND, seed=0):
+    """
+    Draw background windows from the training windows, in chronological order.
+    """
+    rng = np.random.default_rng(seed)
+    chosen = np.sort(rng.choice(len(x_train), size=min(size, len(x_train)), replace=False))
+    return np.ascontiguousarray(x_train[chosen], dtype=np.float32)
+
+
+class BackgroundCache:
+    """
+    The background windows of every model version, saved as .npy files under root.
+    """
+
+    def __init__(self, root='.attribution_cache'):
+        self.root = root
+
+    def get(self, symbol, model_version, x_train, size=DEFAULT_BACKGROUND):
+        """
+        Load the cached background windows of a model version, drawing them on a miss.
+
+        Parameters:
+        symbol (str): The stock symbol.
+        model_version (str): The version of the model explained, see artifacts.model_version.
+        x_train (ndarray): The training windows the background is drawn from on a miss.
+        size (int): Number of background windows.
+
+        Returns:
+        ndarray: float32 windows of shape (size, lookback, features).
+        """
+        path = os.path.join(self.root, f'{symbol}-{model_version}-{size}.npy')
+        if os.path.exists(path):
+            return np.load(path)
+        background = background_windows(x_train, size)
+        os.makedirs(self.root, exist_ok=True)
+        with open(path + '.tmp', 'wb') as file:
+            np.save(file, background)
+        os.replace(path + '.tmp', path)
+        return background
+
+
+def integrated_gradients(model, x, background, steps=DEFAULT_STEPS, batch_size=64):
+    """
+    Attribute the forecasts of a GRU to its input timesteps and features.
+
+    Parameters:
+    model (GRU): The model; a quantile model is explained through its median forecast.
+    x (ndarray): Input windows of shape (windows, lookback, features).
+    background (ndarray): Reference windows of shape (background, lookback, features).
+    steps (int): Points per integration path (midpoint rule).
+    batch_size (int): Input windows whose path points are evaluated in one pass.
+
+    Returns:
+    ndarray: float32 importances of shape (windows, forecast_horizon, lookback, features).
+    """
+    import torch
+
+    from .inference import median_index
+
+    x = torch.as_tensor(np.asarray(x, dtype=np.float32))
+    background = torch.as_tensor(np.asarray(background, dtype=np.float32))
+    alphas = (torch.arange(steps, dtype=torch.float32) + 0.5) / steps
+    horizon = model.output_dim
+    windows, lookback, features = x.shape
+    attributions = np.empty((windows, horizon, lookback, features), dtype=np.float32)
+
+    for start in range(0, windows, batch_size):
+        batch = x[start:start + batch_size]
+        delta = batch[:, None] - background[None]  # (batch, background, lookback, features)
+        # Every path point of every window and background window, in one tensor
+        paths = background[None, :, None] + alphas[None, None, :, None, None] * delta[:, :, None]
+        paths = paths.reshape(-1, lookback, features).requires_grad_()
+        out = model(paths)
+        if model.quantiles is not None:
+            out = out[:, :, median_index(model.quantiles)]
+        for day in range(horizon):
+            # The path points are independent, so the gradient of the sum is every point's gradient
+            grads, = torch.autograd.grad(out[:, day].sum(), paths, retain_graph=day < horizon - 1)
+            mean_grads = grads.reshape(len(batch), len(background), steps, lookback, features).mean(dim=2)
+            attributions[start:start + len(batch), day] = (mean_grads * delta).mean(dim=1).numpy()
+    return attributions
+
+
+def attribute_symbol(symbol, data_dir='.', model_dir='models', split='test', steps=DEFAULT_STEPS,
+                     background_size=DEFAULT_BACKGROUND, cache_dir='.attribution_cache', batch_size=64, threads=None):
+    """
+    Attribute the forecasts of a symbol's saved model on its train or test windows.
+
+    Parameters:
+    symbol (str): The stock symbol.
+    data_dir (str): The directory holding the CSV files.
+    model_dir (str): The directory holding the model artifacts.
+    split (str): 'train' or 'test', the windows explained.
+    steps (int): Points per integration path.
+    background_size (int): Number of background windows, drawn from the training windows.
+    cache_dir (str): The directory of the BackgroundCache.
+    batch_size (int): Input windows per pass, see integrated_gradients.
+    threads (int): torch threads of this process, left unchanged by default.
+
+    Returns:
+    dict: 'attributions' of shape (windows, forecast_horizon, lookback, features), their
+    'target_dates' and 'as_of' dates, the 'model_version', the 'split', the 'completeness_error'
+    (largest gap between the summed importances and forecast minus background forecast,
+    in scaled units) and the 'seconds' spent.
+    """
+    import torch
+
+    from .artifacts import model_version
+    from .evaluation import artifact_windows
+    from .inference import median_index
+
+    start_time = time.perf_counter()
+    if threads is not None:
+        torch.set_num_threads(threads)
+    params, config, windows = artifact_windows(symbol, data_dir, model_dir)
+    version = model_version(config)
+    model = load_gru(params, config)
+    background = BackgroundCache(cache_dir).get(symbol, version, windows['train'][0], background_size)
+    x, _, dates, as_of = windows[split]
+    attributions = integrated_gradients(model, x, background, steps, batch_size)
+
+    # Integrated gradients are complete: the importances add up to the change of the forecast
+    with torch.no_grad():
+        forecasts = [model(torch.as_tensor(np.asarray(inputs, dtype=np.float32))) for inputs in (x, background)]
+    if model.quantiles is not None:
+        forecasts = [forecast[:, :, median_index(model.quantiles)] for forecast in forecasts]
+    expected = forecasts[0].numpy() - forecasts[1].numpy().mean(axis=0)
+    completeness_error = float(np.abs(attributions.sum(axis=(2, 3)) - expected).max()) if len(x) else 0.0
+
+    return {'attributions': attributions, 'target_dates': dates, 'as_of': as_of, 'model_version': version,
+            'split': split, 'completeness_error': completeness_error,
+            'seconds': time.perf_counter() - start_time}
+
+
+def attributions_table(symbol, result):
+    """
+    Build the Arrow table of a symbol's attributions in the attribution store schema.
+
+    Parameters:
+    symbol (str): The stock symbol.
+    result (dict): The output of attribute_symbol.
+
+    Returns:
+    Table: One row per window and forecast day, keyed like the prediction rows.
+    """
+    import pyarrow as pa
+
+    from .prediction_store import ATTRIBUTION_SCHEMA
+
+    attributions = result['attributions']
+    windows, horizon, lookback, features = attributions.shape
+    size = windows * horizon
+    flat = pa.array(attributions.reshape(-1), pa.float32())
+    return pa.table({
+        'symbol': pa.array([symbol] * size, pa.string()),
+        'as_of': pa.array(np.repeat(np.asarray(result['as_of'], dtype='datetime64[D]'), horizon)),
+        'horizon': pa.array(np.tile(np.arange(1, horizon + 1, dtype=np.int16), windows)),
+        'target_date': pa.array(np.asarray(result['target_dates'], dtype='datetime64[D]').reshape(-1)),
+        'model_version': pa.array([result['model_version']] * size, pa.string()),
+        'split': pa.array([result['split']] * size, pa.string()),
+        'features': pa.array(np.full(size, features, dtype=np.int16)),
+        # One list of lookback * features importances per row, without a Python object per value
+        'attribution': pa.ListArray.from_arrays(pa.array(np.arange(size + 1, dtype=np.int32) * lookback * features),
+                                                flat),
+    }, schema=ATTRIBUTION_SCHEMA)
+
+
+def attribute_symbols(symbols, data_dir='.', model_dir='models', store=None, split='test', steps=DEFAULT_STEPS,
+                      background_size=DEFAULT_BACKGROUND, cache_dir='.attribution_cache', batch_size=64,
+                      max_workers=None):
+    """
+    Attribute the forecasts of several symbols concurrently in worker processes.
+
+    Parameters:
+    symbols (list): The stock symbols, each with a saved model.
+    data_dir (str): The directory holding the CSV files.
+    model_dir (str): The directory holding the model artifacts.
+    store (PredictionStore): If given, the attributions are appended to its attribution store.
+    split (str): 'train' or 'test', the windows explained.
+    steps (int): Points per integration path.
+    background_size (int): Number of background windows per model.
+    cache_dir (str): The directory of the BackgroundCache.
+    batch_size (int): Input windows per pass, see integrated_gradients.
+    max_workers (int): Number of worker processes, os.cpu_count() by default; 1 runs in this process.
+
+    Returns:
+    dict: The output of attribute_symbol per symbol.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    # Split the CPU threads between the workers instead of oversubscribing them
+    threads = max(1, (os.cpu_count() or 1) // max_workers)
+    arguments = (data_dir, model_dir, split, steps, background_size, cache_dir, batch_size)
+    if max_workers == 1 or len(symbols) == 1:
+        results = {symbol: attribute_symbol(symbol, *arguments) for symbol in symbols}
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {symbol: executor.submit(attribute_symbol, symbol, *arguments, threads=threads)
+                       for symbol in symbols}
+            results = {symbol: future.result() for symbol, future in futures.items()}
+
+    if store is not None:
+        import pyarrow as pa
+
+        store.attributions().append(pa.concat_tables([attributions_table(symbol, result)
+                                                      for symbol, result in results.items()]))
+    return results
@@ -0,0 +1,157 @@
+"""
+Classical baseline forecasts: naive, seasonal naive, ETS and ARIMA.
+
+Baselines forecast the same test windows as split_data_week_ahead_with_dates_multi:
+from the last input day of every window (the as-of date) they predict the next
+forecast_horizon closing prices, so their errors compare directly with the GRU's.
+
+ETS and ARIMA are fitted once on the prices the GRU trains on (up to the last
+training target), then run over the whole series with the fitted parameters. The
+forecasts of every test window follow from the filtered state at its as-of date,
+computed for all windows at once, instead of refitting per window.
+
+Usage:
+    results = fit_baselines(['PLUG', 'NIO'])
+    MetricsTable('metrics.csv').append([row for rows in results.values() for row in rows['metrics']])
+"""
+import concurrent.futures
+import warnings
+
+import numpy as np
+
+from .data import load_stock_data
+from .metrics_table import metric_rows
+from .windows import window_split_sizes
+
+BASELINES = ('naive', 'seasonal_naive', 'ets', 'arima')
+
+# One trading week
+SEASON = 5
+
+
+def _naive(prices, origins, forecast_horizon):
+    # The last known price, for every forecast day
+    return np.repeat(prices[origins][:, None], forecast_horizon, axis=1)
+
+
+def _seasonal_naive(prices, origins, forecast_horizon, season=SEASON):
+    # The price one season before each target day, repeating the last known season
+    days = np.arange(1, forecast_horizon + 1)
+    offsets = days - season * np.ceil(days / season).astype(int)
+    return prices[origins[:, None] + offsets]
+
+
+def _state_space_forecasts(results, origins, forecast_horizon):
+    """
+    Forecast forecast_horizon steps ahead from the filtered state at every origin.
+    """
+    filtered = results.filter_results
+    # Time-invariant system matrices, stored with a trailing time axis of length 1
+    design = filtered.design[..., 0]
+    transition = filtered.transition[..., 0]
+    obs_intercept = filtered.obs_intercept[..., 0]
+    state_intercept = filtered.state_intercept[..., 0]
+
+    state = filtered.filtered_state[:, origins]
+    forecasts = np.empty((len(origins), forecast_horizon))
+    for day in range(forecast_horizon):
+        state = transition @ state + state_intercept[:, None]
+        forecasts[:, day] = (design @ state)[0] + obs_intercept[0]
+    return forecasts
+
+
+def _ets(prices, origins, forecast_horizon, fit_end):
+    from statsmodels.tsa.statespace.exponential_smoothing import ExponentialSmoothing
+
+    with warnings.catch_warnings():
+        # Convergence warnings of the likelihood optimisation are expected on some series
+        warnings.simplefilter('ignore')
+        fitted = ExponentialSmoothing(prices[:fit_end], trend=True, damped_trend=True).fit(disp=False)
+    return _state_space_forecasts(fitted.apply(prices), origins, forecast_horizon)
+
+
+def _arima(prices, origins, forecast_horizon, fit_end, order=(1, 1, 1)):
+    from statsmodels.tsa.arima.model import ARIMA
+
+    with warnings.catch_warnings():
+        # Start parameter and convergence warnings are expected; statsmodels enables them on import
+        warnings.simplefilter('ignore')
+        fitted = ARIMA(prices[:fit_end], order=order).fit()
+    return _state_space_forecasts(fitted.apply(prices), origins, forecast_horizon)
+
+
+def baseline_forecasts(prices, lookback=20, forecast_horizon=7, baselines=BASELINES):
+    """
+    Forecast the test windows of a price series with every baseline.
+
+    Parameters:
+    prices (ndarray): Closing prices, oldest first.
+    lookback (int): Number of input days per window, as for the GRU.
+    forecast_horizon (int): Number of days predicted per window.
+    baselines (iterable): Names of the baselines to run, from BASELINES.
+
+    Returns:
+    tuple: (forecasts, actual, origins) where forecasts maps each baseline to an array of
+    shape (test windows, forecast_horizon), actual holds the target prices and origins
+    the positions of the as-of days.
+    """
+    prices = np.asarray(prices, dtype=float)
+    train_size, test_size = window_split_sizes(len(prices), lookback, forecast_horizon)
+    origins = train_size + lookback - 1 + np.arange(test_size)
+    actual = prices[origins[:, None] + np.arange(1, forecast_horizon + 1)]
+    # The last price a training window targets; later prices are only filtered, not fitted
+    fit_end = train_size - 1 + lookback + forecast_horizon
+
+    forecasts = {}
+    for name in baselines:
+        if name == 'naive':
+            forecasts[name] = _naive(prices, origins, forecast_horizon)
+        elif name == 'seasonal_naive':
+            forecasts[name] = _seasonal_naive(prices, origins, forecast_horizon)
+        elif name == 'ets':
+            forecasts[name] = _ets(prices, origins, forecast_horizon, fit_end)
+        elif name == 'arima':
+            forecasts[name] = _arima(prices, origins, forecast_horizon, fit_end)
+        else:
+            raise ValueError(f"Unknown baseline: {name}")
+    return forecasts, actual, origins
+
+
+def _fit_symbol(symbol, data_dir, start, end, lookback, forecast_horizon, baselines, exclude, adjust):
+    prices = load_stock_data([symbol], data_dir, exclude=exclude, adjust=adjust)[symbol][start:end]['4. close']
+    forecasts, actual, origins = baseline_forecasts(prices.to_numpy(), lookback, forecast_horizon, baselines)
+    return {
+        'forecasts': forecasts,
+        'actual': actual,
+        'as_of': prices.index.values[origins],
+        'metrics': [row for name, forecast in forecasts.items() for row in metric_rows(symbol, name, actual, forecast)],
+    }
+
+
+def fit_baselines(symbols, data_dir='.', start='2019', end='2024', lookback=20, forecast_horizon=7,
+                  baselines=BASELINES, max_workers=None, exclude=None, adjust=False):
+    """
+    Run the baselines of every symbol concurrently in worker processes.
+
+    Parameters:
+    symbols (list): The stock symbols.
+    data_dir (str): The directory holding the CSV files.
+    start, end (str): Date range of the closing prices used, as for train_symbol.
+    lookback (int): Number of input days per window.
+    forecast_horizon (int): Number of days predicted per window.
+    baselines (iterable): Names of the baselines to run, from BASELINES.
+    max_workers (int): Number of worker processes, os.cpu_count() by default.
+    exclude (iterable): Validation checks whose flagged rows are dropped, as for train_symbol.
+    adjust (bool): Forecast the prices back-adjusted for the recorded splits and dividends,
+        as for train_symbol. Baselines only compare with GRUs trained on the same series.
+
+    Returns:
+    dict: Per symbol, 'forecasts' (per baseline), 'actual', 'as_of' and 'metrics' rows
+    for the MetricsTable.
+    """
+    baselines = tuple(baselines)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {symbol: executor.submit(_fit_symbol, symbol, data_dir, start, end, lookback, forecast_horizon,
+                                           baselines, exclude, adjust)
+                   for symbol in symbols}
+        return {symbol: future.result() for symbol, future in futures.items()}
@@ -0,0 +1,484 @@
+"""
+Command line interface: fetch, train, predict, evaluate, explain, baselines, validate, adjust, render, nightly,
+monitor and replay.
+
+Usage:
+    python -m stock_prediction fetch PLUG NIO
+    python -m stock_prediction train PLUG --epochs 105
+    python -m stock_prediction predict PLUG
+    python -m stock_prediction evaluate PLUG
+    python -m stock_prediction explain PLUG NIO --store predictions
+    python -m stock_prediction baselines PLUG NIO
+    python -m stock_prediction validate CHPT
+    python -m stock_prediction adjust PLUG
+    python -m stock_prediction render PLUG NIO --output-dir reports
+    python -m stock_prediction nightly --fetch
+    python -m stock_prediction monitor --store predictions --retrain
+    python -m stock_prediction replay PLUG NIO --start 2023 --speedup 864000
+
+Only argparse is imported up front; every command imports what it needs when it
+runs, so `predict` (NumPy only) starts quickly.
+"""
+import argparse
+import sys
+
+DEFAULT_SYMBOLS = ['PLUG', 'NIO', 'NTLA', 'SNAP', 'CHPT']
+
+
+def _fetch(args):
+    if args.intraday:
+        from .intraday import IntradayStore, retrieve_intraday_data
+
+        retrieve_intraday_data(args.symbols, IntradayStore(args.intraday_dir), args.api_key_file)
+        return
+
+    from .data import retrieve_stock_data
+
+    retrieve_stock_data(args.symbols, args.data_dir, args.api_key_file)
+
+
+def _train(args):
+    import logging
+
+    from .instrumentation import JsonLinesSink, LoggingSink
+    from .training import train_symbol
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    sinks = [LoggingSink()]
+    if args.metrics_file:
+        sinks.append(JsonLinesSink(args.metrics_file))
+
+    metrics_table = None
+    if args.skip_beaten:
+        from .metrics_table import MetricsTable
+
+        metrics_table = MetricsTable(args.metrics_table)
+
+    performance = None
+    if args.performance or args.compile or args.threads or args.cpus or args.worker:
+        worker, workers = args.worker or (None, None)
+        performance = {'compile': args.compile, 'num_threads': args.threads, 'cpus': args.cpus, 'worker': worker,
+                       'workers': workers}
+
+    quantiles = args.quantiles
+    if quantiles == []:
+        from .model import DEFAULT_QUANTILES
+
+        quantiles = DEFAULT_QUANTILES
+
+    for symbol in args.symbols:
+        baseline = metrics_table.baseline_wins(symbol) if metrics_table is not None else None
+        if baseline is not None:
+            print(f"{symbol}: skipped, the {baseline} baseline scores at least as well as the GRU")
+            continue
+        summary = train_symbol(symbol, args.data_dir, args.model_dir, start=args.start, end=args.end,
+                               lookback=args.lookback, forecast_horizon=args.horizon,
+                               num_epochs=args.epochs, sinks=sinks, patience=args.patience,
+                               performance=performance, exclude=args.exclude, adjust=args.adjust,
+                               strategy=args.strategy, block=args.block, quantiles=quantiles)
+        stopped = f", stopped early ({summary['epochs_saved']} epochs saved)" if summary['epochs_saved'] else ''
+        loss = 'pinball loss' if quantiles else 'MSE'
+        print(f"{symbol}: final {loss} {summary['final_loss']:.6f} in {summary['training_seconds']:.1f}s{stopped} "
+              f"-> {summary['artifact']}")
+
+
+def _predict(args):
+    from .inference import median_index, predict_quantiles, predict_symbol
+
+    forecasts = {}
+    for symbol in args.symbols:
+        if args.quantiles:
+            quantile_forecast = predict_quantiles(symbol, args.data_dir, args.model_dir, horizon=args.horizon)
+            levels = list(quantile_forecast[0][1])
+            forecasts[symbol] = [(date, values[levels[median_index(levels)]]) for date, values in quantile_forecast]
+            for day, (date, values) in enumerate(quantile_forecast, start=1):
+                print(f"{symbol}\t{date}\tDay {day}\t" + '\t'.join(f"q{level:g} {value:.4f}"
+                                                                   for level, value in values.items()))
+            continue
+        forecasts[symbol] = predict_symbol(symbol, args.data_dir, args.model_dir, horizon=args.horizon)
+        for day, (date, value) in enumerate(forecasts[symbol], start=1):
+            print(f"{symbol}\t{date}\tDay {day}\t{value:.4f}")
+
+    if args.store:
+        # Imported only here, so plain predictions stay free of pyarrow
+        from .artifacts import artifact_path, load_model_artifact, model_version
+        from .data import read_recent_closes
+        from .prediction_store import PredictionStore, predictions_table
+
+        store = PredictionStore(args.store)
+        for symbol, forecast in forecasts.items():
+            _, config = load_model_artifact(artifact_path(args.model_dir, symbol))
+            as_of = read_recent_closes(symbol, 1, args.data_dir)[0]
+            dates, values = zip(*forecast)
+            store.append(predictions_table(symbol, [values], None, [dates], as_of, model_version(config)))
+
+
+def _evaluate(args):
+    from .evaluation import evaluate_symbol, store_predictions
+    from .metrics_table import MetricsTable
+
+    metrics_table = MetricsTable(args.metrics_table)
+    for symbol in args.symbols:
+        scores = evaluate_symbol(symbol, args.data_dir, args.model_dir, metrics_table)
+        for day, (train_score, test_score) in enumerate(zip(scores['train_rmse'], scores['test_rmse']), start=1):
+            line = f"{symbol}\tDay {day}\tTrain RMSE {train_score:.4f}\tTest RMSE {test_score:.4f}"
+            if 'test_coverage' in scores:
+                line += (f"\tTest coverage {scores['test_coverage'][day - 1]:.2f} of {scores['coverage_level']:.2f}"
+                         f"\tCalibration error {scores['test_calibration_error'][day - 1]:.3f}")
+            print(line)
+
+    if args.store:
+        from .prediction_store import PredictionStore
+
+        store = PredictionStore(args.store)
+        for symbol in args.symbols:
+            store_predictions(symbol, store, args.data_dir, args.model_dir)
+
+
+def _explain(args):
+    from .attribution import attribute_symbols
+
+    store = None
+    if args.store:
+        from .prediction_store import PredictionStore
+
+        store = PredictionStore(args.store)
+    results = attribute_symbols(args.symbols, args.data_dir, args.model_dir, store, split=args.split,
+                                steps=args.steps, background_size=args.background, max_workers=args.workers)
+    for symbol, result in results.items():
+        # Mean absolute importance per input day, most recent day first
+        importance = abs(result['attributions']).sum(axis=3).mean(axis=(0, 1))[::-1]
+        share = importance / importance.sum()
+        windows = len(result['attributions'])
+        print(f"{symbol}: {windows} {result['split']} windows in {result['seconds']:.1f}s, "
+              f"completeness error {result['completeness_error']:.2e}")
+        print(f"{symbol}\tShare of importance, latest day first\t" + ' '.join(f"{value:.3f}" for value in share))
+
+
+def _baselines(args):
+    from .baselines import fit_baselines
+    from .metrics_table import MetricsTable
+
+    results = fit_baselines(args.symbols, args.data_dir, start=args.start, end=args.end, lookback=args.lookback,
+                            forecast_horizon=args.horizon, max_workers=args.workers, exclude=args.exclude,
+                            adjust=args.adjust)
+    metrics_table = MetricsTable(args.metrics_table)
+    metrics_table.append([row for result in results.values() for row in result['metrics']])
+
+    summary = metrics_table.summary(args.symbols)
+    print(summary.round(4).to_string())
+
+
+def _validate(args):
+    import pandas as pd
+
+    from .data import load_stock_data
+    from .validation import screen_stock_data
+
+    spans = screen_stock_data(load_stock_data(args.symbols, args.data_dir), args.data_dir)
+    if args.check:
+        spans = spans[spans['check'].isin(args.check)]
+    if spans.empty:
+        print("No anomalies found")
+        return
+    with pd.option_context('display.max_rows', None, 'display.width', 120):
+        print(spans.to_string(index=False))
+    print(spans.groupby(['symbol', 'check'])['rows'].agg(['count', 'sum'])
+          .rename(columns={'count': 'spans', 'sum': 'rows'}).to_string())
+
+
+def _adjust(args):
+    from .adjustments import CorporateActions, retrieve_corporate_actions, split_actions
+    from .data import load_stock_data
+
+    actions = CorporateActions(args.actions_dir)
+    if args.fetch:
+        retrieve_corporate_actions(args.symbols, actions, args.api_key_file)
+
+    stock_data = load_stock_data(args.symbols, args.data_dir)
+    if args.from_validation:
+        from .validation import screen_stock_data
+
+        for symbol, found in split_actions(screen_stock_data(stock_data, args.data_dir)).items():
+            actions.add(symbol, found, source='validation', replace=False)
+
+    for symbol, frame in stock_data.items():
+        actions.adjusted(symbol, frame)
+        recorded = actions.actions(symbol)
+        listed = ', '.join(f"{action['kind']} {action['value']:g} on {action['date']}" for action in recorded)
+        print(f"{symbol}: {listed or 'no corporate actions'} ({actions.last_update['mode']}, "
+              f"{actions.last_update['rows']} rows adjusted)")
+
+
+def _render(args):
+    import os
+
+    from .artifacts import artifact_path
+    from .data import load_stock_data
+    from .evaluation import prediction_frames
+    from .rendering import history_jobs, prediction_jobs, render_figures
+
+    jobs = history_jobs(load_stock_data(args.symbols, args.data_dir))
+    for symbol in args.symbols:
+        if os.path.exists(artifact_path(args.model_dir, symbol)):
+            jobs += prediction_jobs(symbol, *prediction_frames(symbol, args.data_dir, args.model_dir))
+        else:
+            print(f"No model found for {symbol}, skipping its prediction figures")
+
+    summary = render_figures(jobs, args.output_dir, max_workers=args.workers, force=args.force)
+    for path, error in sorted(summary['failed'].items()):
+        print(f"Failed to render {path}: {error}")
+    print(f"{len(summary['rendered'])} figures rendered, {len(summary['skipped'])} unchanged, "
+          f"{len(summary['failed'])} failed -> {args.output_dir}")
+    return 1 if summary['failed'] else 0
+
+
+def _nightly(args):
+    from .pipeline import STAGE_NAMES, run_pipeline
+
+    summary = run_pipeline(args.symbols, args.data_dir, args.model_dir, args.output_dir, args.cache_dir,
+                           stages=args.stages, fetch=args.fetch, api_key_file=args.api_key_file,
+                           max_workers=args.workers, force=args.force, start=args.start, end=args.end,
+                           lookback=args.lookback, forecast_horizon=args.horizon, num_epochs=args.epochs,
+                           patience=args.patience, exclude=args.exclude, adjust=args.adjust, strategy=args.strategy)
+    for stage in STAGE_NAMES:
+        counts = {state: sum(1 for node in summary[state] if node.split('/')[0] == stage)
+                  for state in ('ran', 'cached', 'blocked')}
+        failed = sum(1 for node in summary['failed'] if node.split('/')[0] == stage)
+        if any(counts.values()) or failed:
+            print(f"{stage:<9} {counts['ran']} ran, {counts['cached']} cached, {failed} failed, "
+                  f"{counts['blocked']} blocked")
+    for node, error in sorted(summary['failed'].items()):
+        print(f"Failed {node}: {error}")
+    return 1 if summary['failed'] else 0
+
+
+def _monitor(args):
+    import pandas as pd
+
+    from .metrics_table import MetricsTable
+    from .monitoring import DriftMonitor
+    from .prediction_store import PredictionStore
+
+    metrics_table = MetricsTable(args.metrics_table)
+    monitor = DriftMonitor(args.state, halflife=args.halflife, threshold=args.threshold, min_samples=args.min_samples)
+    status = monitor.update(PredictionStore(args.store), args.data_dir, args.symbols or None, metrics_table)
+    if status.empty:
+        print(f"No realized forecasts in {args.store} yet")
+        return
+    with pd.option_context('display.max_rows', None, 'display.width', 120):
+        print(status.drop(columns='model_version').round(4).to_string(index=False))
+
+    drifted = monitor.drifted(metrics_table)
+    print(f"Drifted: {', '.join(drifted) or 'none'}")
+    if args.retrain:
+        from .artifacts import artifact_path, load_model_artifact
+        from .evaluation import evaluate_symbol
+        from .training import train_symbol, training_settings
+
+        # Only the drifted symbols are retrained, with the settings of their current model, and
+        # re-evaluated so their test RMSE is current
+        for symbol in drifted:
+            _, config = load_model_artifact(artifact_path(args.model_dir, symbol))
+            settings = training_settings(config)
+            if args.epochs is not None:
+                settings['num_epochs'] = args.epochs
+            summary = train_symbol(symbol, args.data_dir, args.model_dir, **settings)
+            evaluate_symbol(symbol, args.data_dir, args.model_dir, metrics_table)
+            loss = 'pinball loss' if settings.get('quantiles') else 'MSE'
+            print(f"{symbol}: retrained, final {loss} {summary['final_loss']:.6f} -> {summary['artifact']}")
+
+
+def _replay(args):
+    from .streaming import StreamingForecaster, simulate_stream
+
+    forecaster = StreamingForecaster(args.symbols, args.model_dir)
+    stats = simulate_stream(forecaster, args.data_dir, args.speedup, args.start, args.end)
+    print(f"{stats['messages']} bars in {stats['seconds']:.2f}s ({stats['throughput']:.0f}/s), "
+          f"{stats['forecasts']} forecasts in {stats['passes']} passes")
+    print(f"Latency: median {stats['latency_p50_ms']:.2f} ms, p99 {stats['latency_p99_ms']:.2f} ms, "
+          f"max {stats['latency_max_ms']:.2f} ms; largest lag behind schedule {stats['lag_seconds'] * 1000:.1f} ms")
+    for symbol, (as_of, prices) in sorted(forecaster.latest.items()):
+        print(f"{symbol}\t{as_of}\t" + ' '.join(f"{price:.2f}" for price in prices))
+
+
+def build_parser():
+    # Options shared by every command
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--data-dir', default='.', help='directory holding the historical data CSV files')
+    common.add_argument('--model-dir', default='models', help='directory holding the model artifacts')
+    common.add_argument('--metrics-table', default='metrics.csv',
+                        help='CSV file of test scores shared by the GRU and the baselines')
+
+    parser = argparse.ArgumentParser(prog='stock_prediction', description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    fetch = commands.add_parser('fetch', parents=[common], help='download daily data from Alpha Vantage')
+    fetch.add_argument('symbols', nargs='*', default=DEFAULT_SYMBOLS)
+    fetch.add_argument('--api-key-file', default='AlphaVantage.txt')
+    fetch.add_argument('--intraday', action='store_true',
+                       help='download minute bars into the intraday store instead of daily data')
+    fetch.add_argument('--intraday-dir', default='intraday')
+    fetch.set_defaults(handler=_fetch)
+
+    train = commands.add_parser('train', parents=[common], help='train the seven-day GRU per symbol')
+    train.add_argument('symbols', nargs='*', default=DEFAULT_SYMBOLS)
+    train.add_argument('--start', default='2019')
+    train.add_argument('--end', default='2024')
+    train.add_argument('--lookback', type=int, default=20)
+    train.add_argument('--horizon', type=int, default=7)
+    train.add_argument('--epochs', type=int, default=105)
+    train.add_argument('--patience', type=int,
+                       help='stop when the validation loss has not improved for this many epochs')
+    train.add_argument('--metrics-file', help='also append per-epoch metrics to this JSON lines file')
+    train.add_argument('--verbose', action='store_true', help='log per-epoch metrics')
+    train.add_argument('--skip-beaten', action='store_true',
+                       help='skip symbols where a baseline scores at least as well as the last evaluated GRU')
+    train.add_argument('--exclude', nargs='+', metavar='CHECK',
+                       help='drop the rows flagged by these validation checks before windowing, e.g. zero_volume')
+    train.add_argument('--adjust', action='store_true',
+                       help='train on prices adjusted for the splits and dividends in corporate_actions/')
+    train.add_argument('--strategy', choices=['direct', 'recursive', 'hybrid'], default='direct',
+                       help='predict the horizon at once (direct), one day at a time fed back in (recursive) '
+                            'or a block of days at a time (hybrid)')
+    train.add_argument('--block', type=int, help='days per prediction of the hybrid strategy (default 5)')
+    train.add_argument('--quantiles', nargs='*', type=float, metavar='Q',
+                       help='forecast these quantiles of every day, trained on the pinball loss '
+                            '(without values: 0.1 0.5 0.9)')
+    train.add_argument('--performance', action='store_true',
+                       help='CPU performance mode: bfloat16 autocast where supported and pinned threads')
+    train.add_argument('--compile', action='store_true',
+                       help='compile the model with torch.compile (implies --performance)')
+    train.add_argument('--threads', type=int,
+                       help='torch threads of the performance mode (default: one per bound CPU)')
+    train.add_argument('--cpus', nargs='+', type=int, metavar='CPU',
+                       help='bind the performance mode to these CPU ids')
+    train.add_argument('--worker', nargs=2, type=int, metavar=('INDEX', 'COUNT'),
+                       help='bind the performance mode to slice INDEX of COUNT of the allowed CPUs, '
+                            'so that COUNT co-located trainings share the machine')
+    train.set_defaults(handler=_train)
+
+    predict = commands.add_parser('predict', parents=[common], help='forecast the next days from the latest data')
+    predict.add_argument('symbols', nargs='*', default=DEFAULT_SYMBOLS)
+    predict.add_argument('--horizon', type=int,
+                         help='days to forecast (default: the trained horizon; longer needs a recursive or hybrid model)')
+    predict.add_argument('--quantiles', action='store_true',
+                         help='print every quantile forecast of a model trained with --quantiles')
+    predict.add_argument('--store', help='also append the forecasts to the prediction store in this directory')
+    predict.set_defaults(handler=_predict)
+
+    evaluate = commands.add_parser('evaluate', parents=[common], help='report train and test RMSE per forecast day')
+    evaluate.add_argument('symbols', nargs='*', default=DEFAULT_SYMBOLS)
+    evaluate.add_argument('--store', help='also append the train and test predictions to the prediction store '
+                                          'in this directory')
+    evaluate.set_defaults(handler=_evaluate)
+
+    explain = commands.add_parser('explain', parents=[common],
+                                  help='attribute the forecasts to their input days with integrated gradients')
+    explain.add_argument('symbols', nargs='*', default=DEFAULT_SYMBOLS)
+    explain.add_argument('--split', choices=['train', 'test'], default='test', help='the windows explained')
+    explain.add_argument('--steps', type=int, default=8, help='points per integration path')
+    explain.add_argument('--background', type=int, default=8,
+                         help='background windows drawn from the training windows (cached per model version)')
+    explain.add_argument('--workers', type=int, help='number of worker processes (default: one per CPU)')
+    explain.add_argument('--store', help='also append the attributions alongside the predictions of the prediction '
+                                         'store in this directory')
+    explain.set_defaults(handler=_explain)
+
+    baselines = commands.add_parser('baselines', parents=[common],
+                                    help='score naive, seasonal naive, ETS and ARIMA forecasts per symbol')
+    baselines.add_argument('symbols', nargs='*', default=DEFAULT_SYMBOLS)
+    baselines.add_argument('--start', default='2019')
+    baselines.add_argument('--end', default='2024')
+    baselines.add_argument('--lookback', type=int, default=20)
+    baselines.add_argument('--horizon', type=int, default=7)
+    baselines.add_argument('--workers', type=int, help='number of worker processes (default: one per CPU)')
+    baselines.add_argument('--exclude', nargs='+', metavar='CHECK',
+                           help='drop the rows flagged by these validation checks, as train --exclude')
+    baselines.add_argument('--adjust', action='store_true',
+                           help='forecast the adjusted prices, as train --adjust')
+    baselines.set_defaults(handler=_baselines)
+
+    validate = commands.add_parser('validate', parents=[common],
+                                   help='flag missing dates, zero-volume runs, price spikes and splits')
+    validate.add_argument('symbols', nargs='*', default=DEFAULT_SYMBOLS)
+    validate.add_argument('--check', nargs='+', metavar='CHECK',
+                          help='only report these checks: missing_values, missing_dates, zero_volume, '
+                               'price_spike or split')
+    validate.set_defaults(handler=_validate)
+
+    adjust = commands.add_parser('adjust', parents=[common],
+                                 help='record splits and dividends and rebuild the adjusted price series')
+    adjust.add_argument('symbols', nargs='*', default=DEFAULT_SYMBOLS)
+    adjust.add_argument('--actions-dir', default='corporate_actions')
+    adjust.add_argument('--fetch', action='store_true', help='download splits and dividends from Alpha Vantage')
+    adjust.add_argument('--api-key-file', default='AlphaVantage.txt')
+    adjust.add_argument('--from-validation', action='store_true',
+                        help='record the splits flagged by the validate command')
+    adjust.set_defaults(handler=_adjust)
+
+    render = commands.add_parser('render', parents=[common], help='draw every figure to PNG and HTML files')
+    render.add_argument('symbols', nargs='*', default=DEFAULT_SYMBOLS)
+    render.add_argument('--output-dir', default='reports')
+    render.add_argument('--workers', type=int, help='number of worker processes (default: one per CPU)')
+    render.add_argument('--force', action='store_true', help='redraw figures whose inputs are unchanged')
+    render.set_defaults(handler=_render)
+
+    nightly = commands.add_parser('nightly', parents=[common],
+                                  help='run fetch to plot for every symbol, redoing only the stages whose inputs changed')
+    nightly.add_argument('symbols', nargs='*', default=DEFAULT_SYMBOLS)
+    nightly.add_argument('--fetch', action='store_true', help='download the latest daily data first')
+    nightly.add_argument('--api-key-file', default='AlphaVantage.txt')
+    nightly.add_argument('--stages', nargs='+', metavar='STAGE',
+                         help='only run these stages and the ones they depend on: fetch, validate, scale, window, '
+                              'train, predict, evaluate or plot')
+    nightly.add_argument('--cache-dir', default='.pipeline_cache')
+    nightly.add_argument('--output-dir', default='reports')
+    nightly.add_argument('--workers', type=int, help='number of worker processes (default: one per CPU)')
+    nightly.add_argument('--force', action='store_true', help='rerun every stage even if its inputs are unchanged')
+    nightly.add_argument('--start', default='2019')
+    nightly.add_argument('--end', default='2024')
+    nightly.add_argument('--lookback', type=int, default=20)
+    nightly.add_argument('--horizon', type=int, default=7)
+    nightly.add_argument('--epochs', type=int, default=105)
+    nightly.add_argument('--patience', type=int)
+    nightly.add_argument('--exclude', nargs='+', metavar='CHECK')
+    nightly.add_argument('--adjust', action='store_true')
+    nightly.add_argument('--strategy', choices=['direct', 'recursive', 'hybrid'], default='direct')
+    nightly.set_defaults(handler=_nightly)
+
+    monitor = commands.add_parser('monitor', parents=[common],
+                                  help='track the error of stored forecasts as actuals arrive and flag drift')
+    monitor.add_argument('symbols', nargs='*', help='symbols to update (default: every symbol in the store)')
+    monitor.add_argument('--store', default='predictions', help='the prediction store written by predict --store')
+    monitor.add_argument('--state', default='drift_state.json', help='file holding the rolling error statistics')
+    monitor.add_argument('--halflife', type=float, default=20,
+                         help='realized forecasts after which an error weighs half as much')
+    monitor.add_argument('--threshold', type=float, default=1.5,
+                         help='ratio of rolling to test RMSE above which a forecast day drifts')
+    monitor.add_argument('--min-samples', type=int, default=5)
+    monitor.add_argument('--retrain', action='store_true', help='retrain and re-evaluate the drifted symbols')
+    monitor.add_argument('--epochs', type=int,
+                         help='training epochs of the retrained models (default: those of the current model)')
+    monitor.set_defaults(handler=_monitor)
+
+    replay = commands.add_parser('replay', parents=[common],
+                                 help='stream the CSV history through the saved models and time the forecasts')
+    replay.add_argument('symbols', nargs='*', default=DEFAULT_SYMBOLS)
+    replay.add_argument('--speedup', type=float,
+                        help='replay speed relative to real time, e.g. 86400 for a day per second '
+                             '(default: as fast as possible)')
+    replay.add_argument('--start', help='first date replayed; earlier bars fill the ring buffers')
+    replay.add_argument('--end', help='last date replayed')
+    replay.set_defaults(handler=_replay)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args) or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
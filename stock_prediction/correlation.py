@@ -0,0 +1,223 @@
+"""
+Return correlation matrices across many tickers.
+
+Correlations are computed from sufficient statistics (counts, sums, sums of squares
+and cross products) that are built with matrix products, so the heavy lifting is
+done by BLAS. Missing returns are handled pairwise, like pandas' DataFrame.corr:
+each pair of symbols uses only the days on which both traded.
+"""
+from collections import deque
+
+import numpy as np
+
+
+def _masked(returns):
+    """
+    Split returns into zero-filled values and a float validity mask.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    mask = ~np.isnan(returns)
+    values = np.where(mask, returns, 0.0)
+    return values, mask.astype(np.float64)
+
+
+def _pair_statistics(xa, ma, xb, mb):
+    """
+    Sufficient statistics for every (column of a, column of b) pair over shared valid rows.
+    """
+    n = ma.T @ mb
+    sum_a = xa.T @ mb
+    sum_b = ma.T @ xb
+    sum_aa = (xa * xa).T @ mb
+    sum_bb = ma.T @ (xb * xb)
+    sum_ab = xa.T @ xb
+    return n, sum_a, sum_b, sum_aa, sum_bb, sum_ab
+
+
+def _correlation_from_statistics(n, sum_a, sum_b, sum_aa, sum_bb, sum_ab, min_periods):
+    """
+    Turn pairwise sufficient statistics into Pearson correlations.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sum_ab - sum_a * sum_b / n
+        var_a = sum_aa - sum_a * sum_a / n
+        var_b = sum_bb - sum_b * sum_b / n
+        corr = cov / np.sqrt(var_a * var_b)
+    corr[n < min_periods] = np.nan
+    return np.clip(corr, -1.0, 1.0, out=corr)
+
+
+def correlation_matrix(returns, block_size=512, min_periods=2):
+    """
+    Compute the full return correlation matrix in column blocks.
+
+    Only blocks on or above the diagonal are computed; the lower triangle is mirrored.
+    block_size bounds the size of the temporary arrays to (rows x block_size).
+
+    Parameters:
+    returns (ndarray): Array of shape (days, symbols), NaN where a return is missing.
+    block_size (int): Number of symbols per block.
+    min_periods (int): Minimum number of shared days for a pair to get a correlation.
+
+    Returns:
+    ndarray: Symmetric (symbols x symbols) correlation matrix.
+    """
+    values, mask = _masked(returns)
+    n_symbols = values.shape[1]
+    corr = np.empty((n_symbols, n_symbols))
+
+    if mask.all():
+        # Without gaps every pair shares all rows, so one standardized product suffices
+        centered = values - values.mean(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            standardized = centered / np.sqrt((centered * centered).sum(axis=0))
+        for i in range(0, n_symbols, block_size):
+            block = standardized[:, i:i + block_size]
+            corr[i:i + block_size, i:] = block.T @ standardized[:, i:]
+            corr[i:, i:i + block_size] = corr[i:i + block_size, i:].T
+        if values.shape[0] < min_periods:
+            corr[:] = np.nan
+        return np.clip(corr, -1.0, 1.0, out=corr)
+
+    for i in range(0, n_symbols, block_size):
+        a = slice(i, i + block_size)
+        statistics = _pair_statistics(values[:, a], mask[:, a], values[:, i:], mask[:, i:])
+        corr[a, i:] = _correlation_from_statistics(*statistics, min_periods)
+        corr[i:, a] = corr[a, i:].T
+    return corr
+
+
+class RollingCorrelation:
+    """
+    Correlation matrix over the most recent `window` days, updated incrementally.
+
+    New days are added to the running statistics with one matrix product per batch
+    of rows, and days that fall out of the window are subtracted the same way, so a
+    daily update costs O(symbols^2) instead of recomputing the whole window.
+
+    Attributes:
+    - window: Number of days the correlation covers.
+    - min_periods: Minimum number of shared days for a pair to get a correlation.
+    - recompute_every: Rebuild the statistics from the buffered rows after this many
+      updates to stop floating-point drift from accumulating (None disables it).
+    """
+
+    def __init__(self, n_symbols, window, min_periods=2, recompute_every=250):
+        self.n_symbols = n_symbols
+        self.window = window
+        self.min_periods = min_periods
+        self.recompute_every = recompute_every
+        self._rows = deque()
+        self._updates = 0
+        self._reset()
+
+    def _reset(self):
+        shape = (self.n_symbols, self.n_symbols)
+        self._n = np.zeros(shape)
+        self._sum = np.zeros(shape)
+        self._sum_sq = np.zeros(shape)
+        self._sum_cross = np.zeros(shape)
+
+    def _accumulate(self, rows, sign):
+        values, mask = _masked(rows)
+        # Statistics for the (all, all) pair are symmetric except for the sums, whose
+        # transposes give the second member of each pair.
+        self._n += sign * (mask.T @ mask)
+        self._sum += sign * (values.T @ mask)
+        self._sum_sq += sign * ((values * values).T @ mask)
+        self._sum_cross += sign * (values.T @ values)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def update(self, rows):
+        """
+        Add one or more new days of returns.
+
+        Parameters:
+        rows (ndarray): Array of shape (symbols,) or (days, symbols).
+
+        Returns:
+        RollingCorrelation: self, so calls can be chained with matrix().
+        """
+        rows = np.atleast_2d(np.asarray(rows, dtype=np.float64))
+        if rows.shape[1] != self.n_symbols:
+            raise ValueError(f"Expected rows with {self.n_symbols} symbols, got {rows.shape[1]}")
+
+        rows = rows[-self.window:]
+        self._accumulate(rows, 1.0)
+        self._rows.extend(rows)
+
+        expired = len(self._rows) - self.window
+        if expired > 0:
+            self._accumulate(np.array([self._rows.popleft() for _ in range(expired)]), -1.0)
+
+        self._updates += 1
+        if self.recompute_every and self._updates % self.recompute_every == 0:
+            self._reset()
+            self._accumulate(np.array(self._rows), 1.0)
+        return self
+
+    def matrix(self):
+        """
+        Return the correlation matrix of the days currently in the window.
+        """
+        return _correlation_from_statistics(self._n, self._sum, self._sum.T, self._sum_sq,
+                                            self._sum_sq.T, self._sum_cross, self.min_periods)
+
+
+def rolling_correlation(returns, window, step=1, min_periods=2):
+    """
+    Yield rolling correlation matrices over a returns array.
+
+    Parameters:
+    returns (ndarray): Array of shape (days, symbols).
+    window (int): Number of days per correlation matrix.
+    step (int): Number of days between consecutive matrices.
+    min_periods (int): Minimum number of shared days for a pair to get a correlation.
+
+    Yields:
+    tuple: (end_row, matrix) where end_row is the index of the last day in the window.
+    A ValueError is raised if returns holds fewer days than one window.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    if returns.shape[0] < window:
+        raise ValueError(f"{returns.shape[0]} days of returns are fewer than the window of {window} days")
+    rolling = RollingCorrelation(returns.shape[1], window, min_periods)
+    rolling.update(returns[:window])
+    yield window - 1, rolling.matrix()
+    for end in range(window - 1 + step, returns.shape[0], step):
+        rolling.update(returns[end - step + 1:end + 1])
+        yield end, rolling.matrix()
+
+
+def top_k_correlated(corr, symbols, k=5):
+    """
+    Find the k most correlated other symbols for every symbol.
+
+    Parameters:
+    corr (ndarray): A (symbols x symbols) correlation matrix.
+    symbols (list): Symbol names in matrix order.
+    k (int): Number of neighbours to return per symbol.
+
+    Returns:
+    dict: For each symbol, a list of (symbol, correlation) tuples, highest first.
+    """
+    scores = np.array(corr, dtype=np.float64, copy=True)
+    np.fill_diagonal(scores, -np.inf)
+    scores[np.isnan(scores)] = -np.inf
+
+    k = min(k, len(symbols) - 1)
+    if k <= 0:
+        return {symbol: [] for symbol in symbols}
+
+    # argpartition finds each row's top k in linear time; only those k are sorted
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+
+    neighbours = {}
+    for i, symbol in enumerate(symbols):
+        neighbours[symbol] = [(symbols[j], float(corr[i, j])) for j in top[i] if np.isfinite(scores[i, j])]
+    return neighbours
@@ -0,0 +1,279 @@
+"""
+Retrieval and loading of the historical data CSV files.
+
+pandas and alpha_vantage are imported inside the functions that need them, so
+importing this module (for example from the command line interface) stays cheap.
+"""
+import collections
+import collections.abc
+import csv
+import glob
+import os
+
+
+def latest_data_file(symbol, data_dir='.'):
+    """
+    Find the most recent historical data CSV file for a symbol.
+
+    File names start with the first and last dates of the data they hold, so the
+    lexicographically last match is the most up-to-date one.
+
+    Parameters:
+    symbol (str): The stock symbol to look for.
+    data_dir (str): The directory holding the CSV files.
+
+    Returns:
+    str or None: The path of the most recent file, or None if there is none.
+    """
+    files = glob.glob(os.path.join(data_dir, f'*{symbol}_historical_data.csv'))
+    if not files:
+        return None
+    files.sort()
+    return files[-1]
+
+
+def retrieve_stock_data(symbols, data_dir='.', api_key_file='AlphaVantage.txt'):
+    """
+    Retrieve historical stock data for a given list of symbols using Alpha Vantage API.
+    Deletes old CSV files if newer data is found and downloaded. If API limit is reached, it will print a message and continue with the next symbol.
+
+    Parameters:
+    symbols (list): A list of stock symbols to retrieve data for.
+    data_dir (str): The directory the CSV files are written to.
+    api_key_file (str): The file holding the Alpha Vantage API key.
+
+    Returns:
+    None
+    """
+    from alpha_vantage.timeseries import TimeSeries
+
+    # Read the API key from the file
+    with open(api_key_file, 'r') as file:
+        api_key = file.read().strip()
+
+    # Create a TimeSeries object with your API key
+    ts = TimeSeries(key=api_key, output_format='pandas')
+
+    # Loop through the symbols and retrieve the historical data
+    for symbol in symbols:
+        try:
+            # Get the historical data for the symbol
+            data, meta_data = ts.get_daily(symbol=symbol, outputsize='full')
+
+            # Sort the data by index (date) just in case
+            data.sort_index(inplace=True)
+
+            # Get the first and last dates
+            first_date = data.index[0].strftime('%Y-%m-%d')
+            last_date = data.index[-1].strftime('%Y-%m-%d')
+
+            # Generate the new file name
+            new_file_name = os.path.join(data_dir, f'{first_date}_{last_date}_{symbol}_historical_data.csv')
+
+            # Check if a file for this symbol already exists
+            existing_files = [f for f in os.listdir(data_dir) if f.endswith(f'{symbol}_historical_data.csv')]
+            if existing_files:
+                # Sort files to find the most recent one
+                existing_files.sort()
+                most_recent_file = existing_files[-1]
+
+                # Extract dates from the most recent file name
+                existing_first_date, existing_last_date, *_ = most_recent_file.split('_')
+
+                # Compare dates (strings comparison works because of the YYYY-MM-DD format)
+                if existing_first_date <= first_date and existing_last_date >= last_date:
+                    print(f"Data already up-to-date for {symbol}")
+                    continue
+                else:
+                    # Remove older files
+                    for file in existing_files:
+                        os.remove(os.path.join(data_dir, file))
+                        print(f"Old file {file} deleted for {symbol}")
+
+            # Save the new data to a CSV file
+            data.to_csv(new_file_name)
+            print(f"New data saved for {symbol}: {new_file_name}")
+
+        except ValueError as e:
+            print(f"Error retrieving data for {symbol}: {e}")
+            # Optional: sleep for some time before continuing, or handle the error as needed
+            # time.sleep(60)  # Sleep for 1 minute, for example
+
+
+def load_stock_data(symbols, data_dir='.', exclude=None, validation_cache='.validation_cache', adjust=False,
+                    actions_dir='corporate_actions', memory_budget=None):
+    """
+    Load the most recent, up-to-date historical data CSV files into variables.
+    The 'Date' column in each CSV file is used as the DataFrame index and parsed as dates.
+
+    Parameters:
+    symbols (list): A list of stock symbols to load data for.
+    data_dir (str): The directory holding the CSV files.
+    exclude (iterable): Validation checks (see validation.CHECKS) whose flagged rows are
+        dropped, e.g. ['zero_volume']; None loads every row without screening.
+    validation_cache (str): Directory of the cached screening results, or None.
+    adjust (bool): Back-adjust the data for the splits and dividends recorded in actions_dir
+        (see adjustments.CorporateActions). Screening for exclude runs on the unadjusted data.
+    actions_dir (str): The directory holding the corporate-action files.
+    memory_budget (int): If given, load nothing now and return a StockDataCache that loads
+        each symbol on first access and keeps at most this many bytes of frames.
+
+    Returns:
+    dict: A dictionary containing the loaded data frames, with stock symbols as keys.
+    """
+    if memory_budget is not None:
+        return StockDataCache(symbols, data_dir, memory_budget, exclude=exclude, validation_cache=validation_cache,
+                              adjust=adjust, actions_dir=actions_dir)
+
+    import pandas as pd
+
+    data_frames = {}
+
+    for symbol in symbols:
+        # Find the most recent CSV file for the symbol
+        most_recent_file = latest_data_file(symbol, data_dir)
+        if most_recent_file:
+            # Load the CSV file into a data frame with 'Date' as the index column and parse dates
+            data_frames[symbol] = pd.read_csv(most_recent_file, index_col='date', parse_dates=['date'])
+            print(f"Data loaded for {symbol}: {most_recent_file}")
+        else:
+            print(f"No data found for {symbol}")
+
+    if exclude is not None:
+        from .validation import screen_stock_data
+
+        spans = screen_stock_data(data_frames, data_dir, validation_cache)
+
+    if adjust:
+        from .adjustments import CorporateActions
+
+        actions = CorporateActions(actions_dir)
+        data_frames = {symbol: actions.adjusted(symbol, frame) for symbol, frame in data_frames.items()}
+
+    if exclude is not None:
+        from .validation import exclude_spans
+
+        for symbol, frame in data_frames.items():
+            data_frames[symbol] = exclude_spans(frame, spans[spans['symbol'] == symbol], exclude)
+            if len(data_frames[symbol]) < len(frame):
+                print(f"Excluded {len(frame) - len(data_frames[symbol])} flagged rows for {symbol}")
+
+    return data_frames
+
+
+class StockDataCache(collections.abc.Mapping):
+    """
+    A read-only stock_data mapping that loads symbols on first access, within a memory budget.
+
+    It has the interface of the dict returned by load_stock_data, so stock_data['PLUG']
+    and loops over stock_data.items() keep working, but a frame is only read when it
+    is first looked up. Once the loaded frames exceed memory_budget bytes, the least
+    recently used ones are dropped and read again if they are looked up later. The
+    most recently used frame is always kept, even if it alone exceeds the budget.
+
+    Usage:
+        stock_data = load_stock_data(all_symbols, memory_budget=512 * 2**20)
+        stock_data['PLUG']['4. close']
+        stock_data.stats()
+    """
+
+    def __init__(self, symbols, data_dir='.', memory_budget=None, **load_options):
+        """
+        Parameters:
+        symbols (list): The stock symbols; those without a data file are left out.
+        data_dir (str): The directory holding the CSV files.
+        memory_budget (int): Bytes of frames kept loaded, unbounded if None.
+        load_options: Keyword arguments of load_stock_data, e.g. exclude=['zero_volume'].
+        """
+        # One directory listing instead of a glob per symbol, for universes of thousands of tickers
+        suffix = '_historical_data.csv'
+        available = set()
+        if os.path.isdir(data_dir):
+            for name in os.listdir(data_dir):
+                if name.endswith(suffix) and name.count('_') >= 3:
+                    available.add(name[:-len(suffix)].split('_', 2)[2])
+        self.symbols = [symbol for symbol in symbols if symbol in available]
+        for symbol in symbols:
+            if symbol not in available:
+                print(f"No data found for {symbol}")
+        self.data_dir = data_dir
+        self.memory_budget = memory_budget
+        self.load_options = load_options
+        self._frames = collections.OrderedDict()
+        self._sizes = {}
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def __getitem__(self, symbol):
+        if symbol in self._frames:
+            self._stats['hits'] += 1
+            self._frames.move_to_end(symbol)
+            return self._frames[symbol]
+        if symbol not in self.symbols:
+            raise KeyError(symbol)
+
+        self._stats['misses'] += 1
+        frame = load_stock_data([symbol], self.data_dir, **self.load_options)[symbol]
+        self._frames[symbol] = frame
+        self._sizes[symbol] = int(frame.memory_usage(deep=True).sum())
+        if self.memory_budget is not None:
+            while len(self._frames) > 1 and sum(self._sizes.values()) > self.memory_budget:
+                evicted, _ = self._frames.popitem(last=False)
+                del self._sizes[evicted]
+                self._stats['evictions'] += 1
+        return frame
+
+    def __contains__(self, symbol):
+        # Membership must not load the frame
+        return symbol in self.symbols
+
+    def __iter__(self):
+        return iter(self.symbols)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def stats(self):
+        """
+        Report the cache activity.
+
+        Returns:
+        dict: 'hits', 'misses' and 'evictions' counts, the 'loaded' symbols and their 'bytes',
+        and the 'memory_budget'.
+        """
+        return dict(self._stats, loaded=list(self._frames), bytes=sum(self._sizes.values()),
+                    memory_budget=self.memory_budget)
+
+    def clear(self):
+        """
+        Drop every loaded frame, keeping the counts.
+        """
+        self._frames.clear()
+        self._sizes.clear()
+
+
+def read_recent_closes(symbol, count, data_dir='.', column='4. close'):
+    """
+    Read the last `count` closing prices of a symbol without pandas.
+
+    This keeps the prediction path of the command line interface free of the pandas
+    import, which dominates its start-up time otherwise.
+
+    Parameters:
+    symbol (str): The stock symbol to read.
+    count (int): Number of most recent rows to return.
+    data_dir (str): The directory holding the CSV files.
+    column (str): The price column to read.
+
+    Returns:
+    tuple: (dates, closes) as lists of 'YYYY-MM-DD' strings and floats, oldest first.
+    """
+    path = latest_data_file(symbol, data_dir)
+    if path is None:
+        raise FileNotFoundError(f"No data found for {symbol}")
+
+    with open(path, newline='') as file:
+        rows = list(csv.DictReader(file))
+    # Files written by retrieve_stock_data are sorted by date already
+    rows.sort(key=lambda row: row['date'])
+    rows = rows[-count:]
+    return [row['date'] for row in rows], [float(row[column]) for row in rows]
@@ -0,0 +1,73 @@
+"""
+Downsampling of long series for plotting, with Largest-Triangle-Three-Buckets (LTTB).
+
+LTTB keeps the first and last points and, from each of max_points - 2 equal buckets
+in between, the point forming the largest triangle with the point kept from the
+previous bucket and the mean of the next bucket. Peaks and troughs survive, so a
+line drawn from a few thousand points looks like the full series.
+"""
+import numpy as np
+
+
+def lttb_indices(x, y, max_points):
+    """
+    Select the indices of the points kept by LTTB.
+
+    Parameters:
+    x (ndarray): Increasing x values (for dates, any numeric encoding such as seconds).
+    y (ndarray): The y values, without NaNs.
+    max_points (int): Number of points to keep; at least 3.
+
+    Returns:
+    ndarray: Sorted indices into x and y, all of them if there are max_points or fewer.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if max_points >= n:
+        return np.arange(n)
+    if max_points < 3:
+        raise ValueError("max_points must be at least 3")
+
+    # Bucket i covers edges[i]:edges[i + 1], excluding the first and last points
+    edges = (np.arange(max_points - 1) * ((n - 2) / (max_points - 2))).astype(int) + 1
+    edges[-1] = n - 1
+
+    selected = np.empty(max_points, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        # The point after the last bucket is the last point itself
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        mean_x = x[end:next_end].mean()
+        mean_y = y[end:next_end].mean()
+
+        # Twice the triangle areas; the factor does not change the argmax
+        area = np.abs((x[a] - mean_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (mean_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample_series(series, max_points):
+    """
+    Downsample a pandas Series with LTTB, keeping its index.
+
+    Parameters:
+    series (Series): Values indexed by date (or any numeric index). NaNs are dropped.
+    max_points (int): Number of points to keep, or None to keep them all.
+
+    Returns:
+    Series: The kept points, in index order.
+    """
+    series = series.dropna()
+    if max_points is None or len(series) <= max_points:
+        return series
+
+    index = series.index
+    if index.dtype.kind == 'M':
+        x = index.values.astype('datetime64[s]').astype(np.int64)
+    else:
+        x = np.asarray(index, dtype=float)
+    return series.iloc[lttb_indices(x - x[0], series.to_numpy(), max_points)]
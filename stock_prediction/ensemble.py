@@ -0,0 +1,170 @@
+"""
+Ensembles of GRU forecasters trained concurrently in worker processes.
+
+The training windows of the symbol are published once to a WindowStore and every
+worker attaches to them, so members share one mapped copy of the windows instead of
+each receiving (or rebuilding) its own. Members differ by seed and, optionally, hyperparameters.
+Their forecasts are combined by averaging or by stacking weights fitted per
+forecast day, and the spread across members is reported as the uncertainty.
+
+Usage:
+    ensemble = train_ensemble('PLUG', scaled_prices, member_specs(5))
+    forecast, spread = ensemble.predict(x_test)
+"""
+import concurrent.futures
+import os
+
+import numpy as np
+
+from .inference import gru_forward_numpy
+
+# Hyperparameters of a member, as used for the notebook's seven-day model
+DEFAULT_MEMBER = {'seed': 0, 'hidden_dim': 32, 'num_layers': 2, 'lr': 0.01, 'num_epochs': 105}
+
+
+def member_specs(count, seeds=None, **overrides):
+    """
+    Describe `count` members that differ by seed only.
+
+    Parameters:
+    count (int): Number of members.
+    seeds (list): Seed of every member, 0 to count - 1 by default.
+    overrides: Hyperparameters shared by all members, e.g. hidden_dim=64.
+
+    Returns:
+    list: One dict of hyperparameters per member.
+    """
+    seeds = range(count) if seeds is None else seeds
+    return [dict(DEFAULT_MEMBER, **overrides, seed=seed) for seed in seeds]
+
+
+def _train_member(spec, store, key, threads):
+    import torch
+
+    from .instrumentation import train_instrumented
+    from .model import GRU
+
+    torch.set_num_threads(threads)
+    torch.manual_seed(spec['seed'])
+
+    # The lease keeps the windows from being evicted while the member trains on them
+    with store.attach(key) as windows:
+        x_train = torch.from_numpy(windows['x_train'])
+        y_train = torch.from_numpy(windows['y_train'])
+
+        model = GRU(input_dim=x_train.shape[2], hidden_dim=spec['hidden_dim'], num_layers=spec['num_layers'],
+                    output_dim=y_train.shape[1])
+        criterion = torch.nn.MSELoss(reduction='mean')
+        optimiser = torch.optim.Adam(model.parameters(), lr=spec['lr'])
+        hist, summary = train_instrumented(model, criterion, optimiser, x_train, y_train, spec['num_epochs'],
+                                           labels={'member_seed': spec['seed']})
+
+    params = {name: tensor.detach().numpy() for name, tensor in model.state_dict().items()}
+    return params, hist, summary
+
+
+class Ensemble:
+    """
+    Trained ensemble members and the weights combining their forecasts.
+    """
+
+    def __init__(self, members, specs, histories=None, summaries=None):
+        # One state_dict of NumPy arrays per member, as in the model artifacts
+        self.members = members
+        self.specs = specs
+        self.histories = histories or []
+        self.summaries = summaries or []
+        self.weights = None
+
+    def member_predictions(self, x):
+        """
+        Forecast with every member.
+
+        Parameters:
+        x (ndarray): Input windows of shape (samples, lookback, 1).
+
+        Returns:
+        ndarray: Forecasts of shape (members, samples, forecast_horizon).
+        """
+        x = np.asarray(x, dtype=np.float32)
+        return np.stack([gru_forward_numpy(params, x, spec['num_layers'])
+                         for params, spec in zip(self.members, self.specs)])
+
+    def fit_stacking(self, x, y, ridge=1e-3):
+        """
+        Fit per-day member weights by ridge-regularised least squares.
+
+        Use windows the members were not trained on, e.g. the end of the training period.
+
+        Parameters:
+        x (ndarray): Input windows of shape (samples, lookback, 1).
+        y (ndarray): Targets of shape (samples, forecast_horizon).
+        ridge (float): Regularisation pulling the weights towards zero.
+
+        Returns:
+        ndarray: The weights, of shape (members, forecast_horizon).
+        """
+        predictions = self.member_predictions(x)
+        # Normal equations of every forecast day at once: (days, members, members) systems
+        gram = np.einsum('knd,jnd->dkj', predictions, predictions)
+        gram += ridge * len(y) * np.eye(len(self.members))
+        rhs = np.einsum('knd,nd->dk', predictions, np.asarray(y, dtype=np.float64))
+        self.weights = np.linalg.solve(gram, rhs[..., None])[..., 0].T
+        return self.weights
+
+    def predict(self, x, method='mean'):
+        """
+        Forecast with the ensemble.
+
+        Parameters:
+        x (ndarray): Input windows of shape (samples, lookback, 1).
+        method (str): 'mean' to average the members, or 'stacking' to use the weights
+            fitted by fit_stacking.
+
+        Returns:
+        tuple: (forecast, spread) arrays of shape (samples, forecast_horizon); the spread
+        is the standard deviation of the member forecasts.
+        """
+        predictions = self.member_predictions(x)
+        if method == 'mean':
+            forecast = predictions.mean(axis=0)
+        elif method == 'stacking':
+            if self.weights is None:
+                raise ValueError("Call fit_stacking before predicting with method='stacking'")
+            forecast = np.einsum('knd,kd->nd', predictions, self.weights)
+        else:
+            raise ValueError(f"Unknown combination method: {method}")
+        return forecast, predictions.std(axis=0)
+
+
+def train_ensemble(symbol, scaled, specs, lookback=20, forecast_horizon=7, max_workers=None, store=None):
+    """
+    Train one GRU per member spec on the training windows of a symbol, concurrently in worker processes.
+
+    Parameters:
+    symbol (str): The stock symbol.
+    scaled (DataFrame): Scaled prices with a 'Scaled Price' column, as returned by scale_prices.
+    specs (list): Hyperparameters of every member, e.g. from member_specs.
+    lookback (int): Number of input days per window.
+    forecast_horizon (int): Number of days predicted per window.
+    max_workers (int): Number of worker processes, one per CPU (at most one per member) by default.
+    store (WindowStore): The store the windows are published to, WindowStore() by default.
+
+    Returns:
+    Ensemble: The trained members, in the order of specs.
+    """
+    from .window_store import WindowStore
+
+    store = store if store is not None else WindowStore()
+    key = store.publish(symbol, scaled, lookback, forecast_horizon)
+    if max_workers is None:
+        max_workers = min(len(specs), os.cpu_count() or 1)
+    # Split the CPU threads between the workers instead of oversubscribing them
+    threads = max(1, (os.cpu_count() or 1) // max_workers)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(_train_member, specs, [store] * len(specs), [key] * len(specs),
+                                    [threads] * len(specs)))
+
+    members, histories, summaries = zip(*results)
+    return Ensemble(list(members), list(specs), list(histories), list(summaries))
@@ -0,0 +1,254 @@
+"""
+Error metrics for the forecasts.
+"""
+import math
+
+import numpy as np
+
+from .artifacts import artifact_path, load_model_artifact
+from .data import load_stock_data
+from .inference import gru_forward_numpy, median_index
+from .results import inverse_scale, target_dates, window_offsets
+from .windows import split_data_week_ahead_with_dates_multi
+
+
+def rmse_per_day(y_true, y_pred):
+    """
+    Calculate the root mean squared error (RMSE) for every day of the forecast horizon.
+
+    Parameters:
+    y_true (ndarray): Actual values of shape (samples, forecast_horizon).
+    y_pred (ndarray): Predicted values of the same shape.
+
+    Returns:
+    list: One RMSE per forecast day, in day order.
+    """
+    from sklearn.metrics import mean_squared_error
+
+    return [math.sqrt(mean_squared_error(y_true[:, i], y_pred[:, i])) for i in range(y_true.shape[1])]
+
+
+def pinball_per_day(y_true, y_quantiles, quantiles):
+    """
+    Calculate the mean pinball loss of every quantile and forecast day.
+
+    Parameters:
+    y_true (ndarray): Actual values of shape (samples, forecast_horizon).
+    y_quantiles (ndarray): Quantile forecasts of shape (samples, forecast_horizon, quantiles).
+    quantiles (sequence): The quantile levels, in the order of the last axis.
+
+    Returns:
+    ndarray: Losses of shape (forecast_horizon, quantiles).
+    """
+    levels = np.asarray(quantiles, dtype=float)
+    errors = np.asarray(y_true, dtype=float)[:, :, None] - np.asarray(y_quantiles, dtype=float)
+    return np.maximum(levels * errors, (levels - 1.0) * errors).mean(axis=0)
+
+
+def interval_coverage(y_true, lower, upper):
+    """
+    Calculate the share of actual values inside the forecast intervals, per forecast day.
+
+    Parameters:
+    y_true (ndarray): Actual values of shape (samples, forecast_horizon).
+    lower (ndarray): Lower interval bounds of the same shape, e.g. the 0.1 quantile forecasts.
+    upper (ndarray): Upper interval bounds of the same shape, e.g. the 0.9 quantile forecasts.
+
+    Returns:
+    ndarray: Coverage of shape (forecast_horizon,); an 80% interval should cover 0.8.
+    """
+    y_true = np.asarray(y_true)
+    return ((y_true >= lower) & (y_true <= upper)).mean(axis=0)
+
+
+def quantile_calibration(y_true, y_quantiles):
+    """
+    Calculate the share of actual values at or below every quantile forecast, per forecast day.
+
+    For a calibrated model the share matches the quantile level: 10% of the actual
+    prices fall at or below the 0.1 quantile forecasts.
+
+    Parameters:
+    y_true (ndarray): Actual values of shape (samples, forecast_horizon).
+    y_quantiles (ndarray): Quantile forecasts of shape (samples, forecast_horizon, quantiles).
+
+    Returns:
+    ndarray: Observed frequencies of shape (forecast_horizon, quantiles).
+    """
+    return (np.asarray(y_true)[:, :, None] <= y_quantiles).mean(axis=0)
+
+
+def daily_frames(values, dates, forecast_horizon, label):
+    """
+    Build the per-day DataFrame dictionary the notebook post-processing produces.
+
+    Parameters:
+    values (ndarray): Prices of shape (samples, forecast_horizon).
+    dates (array-like): Target dates of shape (samples, forecast_horizon); the per-window
+        date lists returned by the split functions are accepted as is.
+    forecast_horizon (int): Number of days per window.
+    label (str): 'Predicted' or 'Actual', used in the column names.
+
+    Returns:
+    dict: DataFrames keyed by "Day N", with a "<label> Day N" column indexed by date.
+    """
+    import pandas as pd
+
+    dates = np.asarray(dates, dtype='datetime64[ns]').reshape(len(values), forecast_horizon)
+    return {f"Day {day + 1}": pd.DataFrame({f"{label} Day {day + 1}": values[:, day]},
+                                           index=pd.DatetimeIndex(dates[:, day]))
+            for day in range(forecast_horizon)}
+
+
+def artifact_windows(symbol, data_dir='.', model_dir='models'):
+    """
+    Rebuild the scaled train and test windows a saved model was trained on.
+
+    The prices are prepared as for training and scaled with the parameters stored in
+    the artifact, so the windows match.
+
+    Returns:
+    tuple: (params, config, windows) where windows maps 'train' and 'test' to (x, y,
+        target_dates, as_of): the scaled inputs and targets, the datetime64 target dates
+        of shape (windows, forecast_horizon) and the as-of date of every window.
+    """
+    import pandas as pd
+
+    params, config = load_model_artifact(artifact_path(model_dir, symbol))
+    stock_data = load_stock_data([symbol], data_dir, exclude=config.get('exclude'),
+                                 adjust=config.get('adjusted', False))
+    prices = stock_data[symbol][config['start']:config['end']]['4. close']
+    scaled_prices = pd.DataFrame(prices.values * config['scale'] + config['min'], index=prices.index,
+                                 columns=['Scaled Price'])
+
+    x_train, y_train, x_test, y_test, _, _ = split_data_week_ahead_with_dates_multi(
+        scaled_prices, config['lookback'], config['forecast_horizon'])
+
+    windows = {}
+    start = 0
+    for name, x, y in (('train', x_train, y_train), ('test', x_test, y_test)):
+        offsets = window_offsets(len(prices), config['lookback'], config['forecast_horizon'], start, len(x))
+        as_of, dates = target_dates(prices.index, offsets, config['forecast_horizon'])
+        windows[name] = (x, y, dates, as_of)
+        start += len(x)
+    return params, config, windows
+
+
+def _predict_splits(symbol, data_dir, model_dir, quantiles=False):
+    """
+    Run a saved model over the train and test windows it was trained on.
+
+    The predictions of a quantile model are its median forecasts, or with quantiles=True
+    all its quantile forecasts, with a last axis of config['quantiles'].
+
+    Returns:
+    tuple: (config, splits) where splits maps 'train' and 'test' to (actual, predicted,
+        target_dates, as_of): prices in USD of shape (windows, forecast_horizon), the
+        datetime64 target dates of the same shape and the as-of date of every window.
+    """
+    params, config, windows = artifact_windows(symbol, data_dir, model_dir)
+    splits = {}
+    for name, (x, y, dates, as_of) in windows.items():
+        predicted = gru_forward_numpy(params, x, config['num_layers'], config.get('strategy', 'direct'),
+                                      config['forecast_horizon'], config.get('quantiles'))
+        if config.get('quantiles') is not None and not quantiles:
+            predicted = predicted[:, :, median_index(config['quantiles'])]
+        # The affine scaling stored in the artifact, undone on the whole array
+        splits[name] = (inverse_scale(y, config['scale'], config['min']),
+                        inverse_scale(predicted, config['scale'], config['min']), dates, as_of)
+    return config, splits
+
+
+def evaluate_symbol(symbol, data_dir='.', model_dir='models', metrics_table=None):
+    """
+    Compute the train and test RMSE per forecast day of a saved model.
+
+    The prices are scaled with the parameters stored in the artifact and split into
+    the same windows the model was trained on. A quantile model is scored on its
+    median forecasts, and on the calibration of its quantiles.
+
+    Parameters:
+    symbol (str): The stock symbol.
+    data_dir (str): The directory holding the CSV files.
+    model_dir (str): The directory holding the model artifacts.
+    metrics_table (MetricsTable): If given, the test scores are appended to it as model 'gru'.
+
+    Returns:
+    dict: 'train_rmse' and 'test_rmse' lists, one value per forecast day. For a quantile
+    model also, per split: '<split>_coverage' (share of actual prices between the lowest and
+    highest quantile forecasts, per day, with the nominal 'coverage_level'),
+    '<split>_calibration' (per day, the share at or below every quantile forecast),
+    '<split>_calibration_error' (per day, the mean absolute difference of those shares
+    from the quantile levels) and '<split>_pinball' (per day, the mean pinball loss).
+    """
+    config, splits = _predict_splits(symbol, data_dir, model_dir, quantiles=True)
+    quantiles = config.get('quantiles')
+    point = splits
+    if quantiles is not None:
+        middle = median_index(quantiles)
+        point = {name: (actual, predicted[:, :, middle], dates, as_of)
+                 for name, (actual, predicted, dates, as_of) in splits.items()}
+    if metrics_table is not None:
+        from .metrics_table import GRU_MODEL, metric_rows
+
+        actual, predicted, _, _ = point['test']
+        metrics_table.append(metric_rows(symbol, GRU_MODEL, actual, predicted))
+    scores = {f'{name}_rmse': rmse_per_day(actual, predicted) for name, (actual, predicted, _, _) in point.items()}
+    if quantiles is None:
+        return scores
+
+    scores['coverage_level'] = quantiles[-1] - quantiles[0]
+    for name, (actual, predicted, _, _) in splits.items():
+        calibration = quantile_calibration(actual, predicted)
+        scores[f'{name}_coverage'] = interval_coverage(actual, predicted[:, :, 0], predicted[:, :, -1]).tolist()
+        scores[f'{name}_calibration'] = calibration.tolist()
+        scores[f'{name}_calibration_error'] = np.abs(calibration - quantiles).mean(axis=1).tolist()
+        scores[f'{name}_pinball'] = pinball_per_day(actual, predicted, quantiles).mean(axis=1).tolist()
+    return scores
+
+
+def prediction_frames(symbol, data_dir='.', model_dir='models'):
+    """
+    Build the per-day prediction and actual DataFrames of a saved model, as plotted
+    by plot_prediction_for_day.
+
+    Parameters:
+    symbol (str): The stock symbol.
+    data_dir (str): The directory holding the CSV files.
+    model_dir (str): The directory holding the model artifacts.
+
+    Returns:
+    tuple: (train_predict, train_original, test_predict, test_original) dictionaries.
+    """
+    config, splits = _predict_splits(symbol, data_dir, model_dir)
+    horizon = config['forecast_horizon']
+    frames = []
+    for name in ('train', 'test'):
+        actual, predicted, dates, _ = splits[name]
+        frames += [daily_frames(predicted, dates, horizon, 'Predicted'), daily_frames(actual, dates, horizon, 'Actual')]
+    return tuple(frames)
+
+
+def store_predictions(symbol, store, data_dir='.', model_dir='models'):
+    """
+    Append the train and test predictions of a saved model to a prediction store.
+
+    Parameters:
+    symbol (str): The stock symbol.
+    store (PredictionStore): The store appended to.
+    data_dir (str): The directory holding the CSV files.
+    model_dir (str): The directory holding the model artifacts.
+
+    Returns:
+    list: The paths of the files written.
+    """
+    import pyarrow as pa
+
+    from .artifacts import model_version
+    from .prediction_store import predictions_table
+
+    config, splits = _predict_splits(symbol, data_dir, model_dir)
+    return store.append(pa.concat_tables([
+        predictions_table(symbol, predicted, actual, dates, as_of, model_version(config), split=name)
+        for name, (actual, predicted, dates, as_of) in splits.items()
+    ]))
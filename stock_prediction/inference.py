@@ -0,0 +1,262 @@
+"""
+Forecasting with saved model artifacts using NumPy only.
+
+The GRU forward pass is re-implemented with NumPy so that producing a forecast
+does not pay the start-up cost of importing torch (or pandas).
+"""
+import datetime
+
+import numpy as np
+
+from .artifacts import artifact_path, load_model_artifact
+from .data import read_recent_closes
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _gru_layers(params, x, num_layers, hidden=None):
+    """
+    Run the stacked GRU layers over a sequence, optionally from given hidden states.
+
+    The weights may carry a leading models axis (see stack_params), in which case x holds
+    one sequence per model.
+
+    Returns:
+    tuple: (outputs of the last layer of shape (batch_size, seq_length, hidden_dim),
+    list of the final hidden state of every layer, of shape (batch_size, 1, hidden_dim))
+    """
+    layer_input = np.asarray(x, dtype=np.float32)
+    final = []
+    for layer in range(num_layers):
+        w_ih = params[f'gru.weight_ih_l{layer}']
+        w_hh = params[f'gru.weight_hh_l{layer}']
+        b_ih = params[f'gru.bias_ih_l{layer}']
+        b_hh = params[f'gru.bias_hh_l{layer}']
+        hidden_dim = w_hh.shape[-1]
+
+        # Input contributions to the reset, update and new gates for every timestep at once
+        gates_x = layer_input @ np.swapaxes(w_ih, -1, -2) + b_ih
+        w_hh = np.swapaxes(w_hh, -1, -2)
+        # The hidden state keeps a length-one time axis, so it multiplies per-model weights too
+        h = np.zeros((layer_input.shape[0], 1, hidden_dim), dtype=np.float32) if hidden is None else hidden[layer]
+        outputs = np.empty((layer_input.shape[0], layer_input.shape[1], hidden_dim), dtype=np.float32)
+        for t in range(layer_input.shape[1]):
+            gates_h = h @ w_hh + b_hh
+            x_t = gates_x[:, t:t + 1]
+            r = _sigmoid(x_t[..., :hidden_dim] + gates_h[..., :hidden_dim])
+            z = _sigmoid(x_t[..., hidden_dim:2 * hidden_dim] + gates_h[..., hidden_dim:2 * hidden_dim])
+            n = np.tanh(x_t[..., 2 * hidden_dim:] + r * gates_h[..., 2 * hidden_dim:])
+            h = (1.0 - z) * n + z * h
+            outputs[:, t] = h[:, 0]
+        final.append(h)
+        layer_input = outputs
+    return layer_input, final
+
+
+def stack_params(params_list):
+    """
+    Stack the parameters of models with the same architecture along a leading models axis.
+
+    gru_forward_numpy then runs all of them in one pass, over one input sequence per model,
+    instead of one pass per model.
+
+    Parameters:
+    params_list (list): state_dict arrays of GRU models with identical shapes.
+
+    Returns:
+    dict: Weights of shape (models, rows, columns) and biases of shape (models, 1, size).
+    """
+    stacked = {}
+    for name in params_list[0]:
+        values = np.stack([np.asarray(params[name], dtype=np.float32) for params in params_list])
+        # Biases get a length-one axis, to broadcast over the batched matrix products
+        stacked[name] = values[:, None] if values.ndim == 2 else values
+    return stacked
+
+
+def median_index(quantiles):
+    """
+    Return the position of the quantile closest to the median, the point forecast of a quantile model.
+    """
+    return min(range(len(quantiles)), key=lambda index: abs(quantiles[index] - 0.5))
+
+
+def _decode(params, outputs, quantiles=None):
+    """
+    Map the last hidden outputs to the next block, of shape (batch_size, block[, quantiles]).
+    """
+    forecast = (outputs[:, -1:, :] @ np.swapaxes(params['fc.weight'], -1, -2) + params['fc.bias'])[:, 0]
+    if quantiles is None:
+        return forecast
+    # Sorted as in model.GRU, so the quantiles never cross
+    return np.sort(forecast.reshape(forecast.shape[0], -1, len(quantiles)), axis=-1)
+
+
+def gru_forward_numpy(params, x, num_layers, strategy='direct', horizon=None, quantiles=None):
+    """
+    Run the GRU model's forward pass with NumPy, matching torch.nn.GRU.
+
+    Parameters:
+    params (dict): state_dict arrays of a GRU model (see model.GRU).
+    x (ndarray): Input of shape (batch_size, seq_length, input_dim); with stacked params
+        (see stack_params), batch_size is the number of models, one sequence each.
+    num_layers (int): Number of stacked GRU layers.
+    strategy (str): The model's forecasting strategy, see model.STRATEGIES.
+    horizon (int): Number of steps to forecast; by default, the steps of one output layer
+        pass. This is the horizon of a direct model; pass it for recursive and hybrid models.
+    quantiles (list): The quantiles of a quantile model, as stored in its artifact config.
+
+    Returns:
+    ndarray: Output of shape (batch_size, horizon), or (batch_size, horizon, quantiles).
+    """
+    outputs, hidden = _gru_layers(params, x, num_layers)
+    # Decode the hidden state of the last time step
+    forecast = _decode(params, outputs, quantiles)
+    block = forecast.shape[1]
+    horizon = block if horizon is None else horizon
+    if strategy == 'direct':
+        if horizon > block:
+            raise ValueError(f"A direct model forecasts at most {block} steps")
+        return forecast[:, :horizon]
+
+    # Feed each forecast block back in, continuing from the hidden states
+    blocks = [forecast]
+    for _ in range((horizon - 1) // block):
+        fed_back = forecast if quantiles is None else forecast[:, :, median_index(quantiles)]
+        outputs, hidden = _gru_layers(params, fed_back[:, :, None], num_layers, hidden)
+        forecast = _decode(params, outputs, quantiles)
+        blocks.append(forecast)
+    return np.concatenate(blocks, axis=1)[:, :horizon]
+
+
+def next_trading_days(last_date, count):
+    """
+    Return the `count` weekdays following last_date as 'YYYY-MM-DD' strings.
+
+    Exchange holidays are not known here, so these are calendar weekdays.
+    """
+    day = datetime.date.fromisoformat(last_date)
+    days = []
+    while len(days) < count:
+        day += datetime.timedelta(days=1)
+        if day.weekday() < 5:
+            days.append(day.isoformat())
+    return days
+
+
+def recent_closes(symbol, config, data_dir='.'):
+    """
+    Read the latest closes of a symbol, prepared as the training prices of a saved model were.
+
+    Models trained on all rows of the unadjusted data read the CSV file directly, without
+    pandas. For the others, the rows flagged by the model's exclude checks are dropped and,
+    for an adjusted model, the closes are back-adjusted for the recorded corporate actions.
+    Actions that took effect after training changed the price units since; the returned
+    factor converts the closes to the units the model was scaled in.
+
+    Parameters:
+    symbol (str): The stock symbol.
+    config (dict): The artifact config of the model.
+    data_dir (str): The directory holding the CSV files.
+
+    Returns:
+    tuple: (dates as 'YYYY-MM-DD' strings, closes, units) for the last lookback rows, oldest
+    first; the model takes closes / units, and its forecasts times units are prices.
+    """
+    lookback = config['lookback']
+    if not config.get('adjusted') and not config.get('exclude'):
+        dates, closes = read_recent_closes(symbol, lookback, data_dir)
+        return dates, closes, 1.0
+
+    from .data import load_stock_data
+
+    frames = load_stock_data([symbol], data_dir, exclude=config.get('exclude'), adjust=bool(config.get('adjusted')))
+    if symbol not in frames:
+        raise FileNotFoundError(f"No data found for {symbol}")
+    closes = frames[symbol]['4. close'].sort_index().iloc[-lookback:]
+    return closes.index.strftime('%Y-%m-%d').tolist(), closes.tolist(), price_units(symbol, config, data_dir)
+
+
+def price_units(symbol, config, data_dir='.'):
+    """
+    Factor converting today's prices of a symbol to the units a saved model was scaled in.
+
+    The corporate actions that took effect after the training prices of an adjusted model
+    were adjusted changed the units of its prices since; unadjusted models keep today's units.
+
+    Parameters:
+    symbol (str): The stock symbol.
+    config (dict): The artifact config of the model.
+    data_dir (str): The directory holding the CSV files.
+
+    Returns:
+    float: The model takes prices / units.
+    """
+    if not config.get('adjusted'):
+        return 1.0
+    from .adjustments import CorporateActions
+    from .data import load_stock_data
+
+    # Older artifacts do not record how far the training data was adjusted; their last price is close
+    through = config.get('adjusted_through', config['last_date'])
+    return CorporateActions().factor_after(symbol, load_stock_data([symbol], data_dir)[symbol], through)
+
+
+def _forecast(symbol, data_dir, model_dir, horizon):
+    """
+    Run a saved model on the latest closes of a symbol.
+
+    Returns:
+    tuple: (dates of the forecast days, prices in USD of shape (horizon[, quantiles]), config)
+    """
+    params, config = load_model_artifact(artifact_path(model_dir, symbol))
+    dates, closes, units = recent_closes(symbol, config, data_dir)
+
+    # Scale exactly as during training, run the model, and undo the scaling
+    x = np.asarray(closes, dtype=np.float32) / units * config['scale'] + config['min']
+    prediction = gru_forward_numpy(params, x.reshape(1, -1, 1), config['num_layers'],
+                                   config.get('strategy', 'direct'), horizon or config['forecast_horizon'],
+                                   config.get('quantiles'))[0]
+    prediction = (prediction - config['min']) / config['scale'] * units
+    return next_trading_days(dates[-1], len(prediction)), prediction, config
+
+
+def predict_symbol(symbol, data_dir='.', model_dir='models', horizon=None):
+    """
+    Forecast the next forecast_horizon closing prices of a symbol from its saved model.
+
+    Parameters:
+    symbol (str): The stock symbol.
+    data_dir (str): The directory holding the CSV files.
+    model_dir (str): The directory holding the model artifacts.
+    horizon (int): Number of days to forecast, the trained forecast_horizon by default.
+        Recursive and hybrid models forecast any horizon, direct ones at most the trained one.
+
+    Returns:
+    list: (date, predicted close) tuples, one per forecast day; the median of a quantile model.
+    """
+    dates, prediction, config = _forecast(symbol, data_dir, model_dir, horizon)
+    if config.get('quantiles') is not None:
+        prediction = prediction[:, median_index(config['quantiles'])]
+    return list(zip(dates, prediction.tolist()))
+
+
+def predict_quantiles(symbol, data_dir='.', model_dir='models', horizon=None):
+    """
+    Forecast every quantile of the next closing prices of a symbol from its saved quantile model.
+
+    Parameters:
+    symbol (str): The stock symbol.
+    data_dir (str): The directory holding the CSV files.
+    model_dir (str): The directory holding the model artifacts.
+    horizon (int): Number of days to forecast, see predict_symbol.
+
+    Returns:
+    list: (date, {quantile: predicted close}) tuples, one per forecast day.
+    """
+    dates, prediction, config = _forecast(symbol, data_dir, model_dir, horizon)
+    if config.get('quantiles') is None:
+        raise ValueError(f"The model of {symbol} forecasts no quantiles; train it with quantiles")
+    return [(date, dict(zip(config['quantiles'], values))) for date, values in zip(dates, prediction.tolist())]
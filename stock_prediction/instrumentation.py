@@ -0,0 +1,307 @@
+"""
+Instrumentation for the GRU training and inference loops.
+
+Instead of printing the MSE on every epoch, the instrumented loops time each phase
+of an epoch (forward, backward, optimizer step), measure throughput and peak memory
+and hand a structured record to one or more metric sinks. Sinks can write JSON lines,
+go through the logging module, or be scraped Prometheus-style over HTTP.
+"""
+import contextlib
+import json
+import logging
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+def peak_rss_bytes():
+    """
+    Return the peak resident set size of this process in bytes, or None if unavailable.
+    """
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class LoggingSink:
+    """
+    Emit each metric record as a JSON message through the logging module.
+    """
+
+    def __init__(self, log=None, level=logging.INFO):
+        self.log = log or logger
+        self.level = level
+
+    def emit(self, record):
+        self.log.log(self.level, json.dumps(record, default=str))
+
+
+class JsonLinesSink:
+    """
+    Append each metric record as one JSON line to a file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def emit(self, record):
+        with open(self.path, 'a') as file:
+            file.write(json.dumps(record, default=str) + '\n')
+
+
+def _escape_label(value):
+    # The exposition format quotes label values, escaping backslashes, quotes and newlines
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class PrometheusSink:
+    """
+    Keep the latest value of every numeric metric as a Prometheus gauge.
+
+    render() returns the text exposition format; serve() exposes it on /metrics
+    from a background thread so a Prometheus server can scrape a running job.
+    """
+
+    def __init__(self, prefix='stock_prediction'):
+        self.prefix = prefix
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def emit(self, record):
+        event = record.get('event', 'metric')
+        labels = {key: value for key, value in record.items()
+                  if isinstance(value, str) and key != 'event'}
+        label_text = ','.join(f'{key}="{_escape_label(value)}"' for key, value in sorted(labels.items()))
+        with self._lock:
+            for key, value in record.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    self._gauges[(f'{self.prefix}_{event}_{key}', label_text)] = value
+
+    def render(self):
+        lines = []
+        previous = None
+        with self._lock:
+            for (name, label_text), value in sorted(self._gauges.items()):
+                if name != previous:
+                    lines.append(f'# TYPE {name} gauge')
+                    previous = name
+                labels = f'{{{label_text}}}' if label_text else ''
+                lines.append(f'{name}{labels} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port=8000, host='127.0.0.1'):
+        """
+        Start serving /metrics on a daemon thread and return the server.
+
+        Only local clients can scrape by default; pass host='0.0.0.0' to expose the metrics
+        on every interface.
+        """
+        sink = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = sink.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server
+
+
+def _emit(sinks, record):
+    for sink in sinks:
+        sink.emit(record)
+
+
+def _profiler(profile_dir):
+    """
+    Build a torch.profiler context that writes TensorBoard traces, or a no-op context.
+    """
+    if profile_dir is None:
+        return contextlib.nullcontext()
+    return torch.profiler.profile(
+        activities=[torch.profiler.ProfilerActivity.CPU],
+        schedule=torch.profiler.schedule(wait=1, warmup=1, active=3),
+        on_trace_ready=torch.profiler.tensorboard_trace_handler(profile_dir),
+    )
+
+
+def train_instrumented(model, criterion, optimiser, x_train, y_train, num_epochs, sinks=(),
+                       labels=None, profile_dir=None, validation=None, patience=None, min_delta=0.0,
+                       autocast_dtype=None):
+    """
+    Run the full-batch training loop while recording per-epoch metrics.
+
+    Each epoch record holds the loss, the time spent in the forward pass (including
+    the loss), the backward pass and the optimizer step, samples per second and the
+    peak RSS of the process. A final 'training' record summarises the run.
+
+    With a validation set, every epoch also records the validation loss. With a
+    patience as well, training stops once the validation loss has not improved by
+    min_delta for `patience` epochs, the weights of the best epoch are restored, and
+    the summary records how many of the num_epochs epochs were saved. Its
+    'epochs_trained' and 'final_loss' then describe the restored epoch, while 'epochs'
+    counts the epochs run.
+
+    With an autocast_dtype, the forward passes run under CPU autocast (see
+    performance.performance_mode); the loss is still computed in float32.
+
+    Parameters:
+    model (nn.Module): The model to train.
+    criterion (callable): The loss function, e.g. torch.nn.MSELoss.
+    optimiser (Optimizer): The optimizer updating the model parameters.
+    x_train (Tensor): Training inputs.
+    y_train (Tensor): Training targets.
+    num_epochs (int): Number of epochs to run.
+    sinks (iterable): Objects with an emit(record) method receiving the metrics.
+    labels (dict): Extra string fields added to every record, e.g. {'symbol': 'PLUG'}.
+    profile_dir (str): If given, torch.profiler traces for a few epochs are written here.
+    validation (tuple): (x_val, y_val) tensors scored after every epoch, or None.
+    patience (int): Epochs without validation improvement before stopping, or None to
+        run all epochs. Requires validation.
+    min_delta (float): Smallest decrease of the validation loss counted as an improvement.
+    autocast_dtype (dtype): Lower precision of the forward passes, e.g. torch.bfloat16, or
+        None to train in float32.
+
+    Returns:
+    tuple: (hist, summary) where hist holds the loss of every epoch run and summary is the
+    final 'training' record.
+    """
+    if patience is not None and validation is None:
+        raise ValueError("Early stopping needs a validation set")
+    labels = dict(labels or {})
+    hist = np.zeros(num_epochs)
+    n_samples = x_train.shape[0]
+    phase = torch.profiler.record_function if profile_dir is not None else (lambda name: contextlib.nullcontext())
+
+    def forward(x):
+        if autocast_dtype is None:
+            return model(x)
+        with torch.autocast('cpu', dtype=autocast_dtype):
+            return model(x).float()
+
+    best_loss, best_epoch, best_state = float('inf'), None, None
+    epochs_run = 0
+
+    start_time = time.perf_counter()
+    with _profiler(profile_dir) as profiler:
+        for t in range(num_epochs):
+            epoch_start = time.perf_counter()
+
+            with phase('forward'):
+                y_train_pred = forward(x_train)
+                loss = criterion(y_train_pred, y_train)
+            forward_done = time.perf_counter()
+
+            optimiser.zero_grad()
+            with phase('backward'):
+                loss.backward()
+            backward_done = time.perf_counter()
+
+            with phase('optimizer_step'):
+                optimiser.step()
+            step_done = time.perf_counter()
+
+            hist[t] = loss.item()
+            epoch_time = step_done - epoch_start
+            epochs_run = t + 1
+            record = {
+                'event': 'epoch',
+                **labels,
+                'epoch': t,
+                'loss': float(hist[t]),
+                'forward_seconds': forward_done - epoch_start,
+                'backward_seconds': backward_done - forward_done,
+                'optimizer_seconds': step_done - backward_done,
+                'epoch_seconds': epoch_time,
+                'samples_per_second': n_samples / epoch_time if epoch_time > 0 else float('inf'),
+                'peak_rss_bytes': peak_rss_bytes(),
+            }
+
+            if validation is not None:
+                with torch.no_grad():
+                    val_loss = criterion(forward(validation[0]), validation[1]).item()
+                record['val_loss'] = val_loss
+                if val_loss < best_loss - min_delta:
+                    best_loss, best_epoch = val_loss, t
+                    if patience is not None:
+                        best_state = {name: tensor.detach().clone() for name, tensor in model.state_dict().items()}
+
+            _emit(sinks, record)
+            if profiler is not None:
+                profiler.step()
+            if patience is not None and t - (best_epoch if best_epoch is not None else -1) >= patience:
+                break
+
+    # The returned weights come from the best epoch when they were restored, else from the last one
+    epochs_trained = epochs_run
+    if best_state is not None:
+        model.load_state_dict(best_state)
+        epochs_trained = best_epoch + 1
+    hist = hist[:epochs_run]
+
+    training_time = time.perf_counter() - start_time
+    summary = {
+        'event': 'training',
+        **labels,
+        'epochs': epochs_run,
+        'epochs_trained': epochs_trained,
+        'epochs_saved': num_epochs - epochs_run,
+        'final_loss': float(hist[epochs_trained - 1]) if epochs_trained else None,
+        'precision': str(autocast_dtype or torch.float32).replace('torch.', ''),
+        'training_seconds': training_time,
+        'samples_per_second': n_samples * epochs_run / training_time if training_time > 0 else float('inf'),
+        'peak_rss_bytes': peak_rss_bytes(),
+    }
+    if validation is not None:
+        summary['best_epoch'] = best_epoch
+        summary['best_val_loss'] = best_loss
+    _emit(sinks, summary)
+    return hist, summary
+
+
+def predict_instrumented(model, x, sinks=(), labels=None):
+    """
+    Run inference without gradient tracking and record its latency and throughput.
+
+    Parameters:
+    model (nn.Module): The trained model.
+    x (Tensor): Input windows.
+    sinks (iterable): Objects with an emit(record) method receiving the metrics.
+    labels (dict): Extra string fields added to the record.
+
+    Returns:
+    Tensor: The model predictions.
+    """
+    start_time = time.perf_counter()
+    with torch.no_grad():
+        predictions = model(x)
+    elapsed = time.perf_counter() - start_time
+
+    _emit(sinks, {
+        'event': 'inference',
+        **dict(labels or {}),
+        'samples': x.shape[0],
+        'inference_seconds': elapsed,
+        'samples_per_second': x.shape[0] / elapsed if elapsed > 0 else float('inf'),
+        'peak_rss_bytes': peak_rss_bytes(),
+    })
+    return predictions
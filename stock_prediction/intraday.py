@@ -0,0 +1,248 @@
+"""
+Storage and resampling of intraday minute bars.
+
+Minute bars are about 400 times denser than the daily CSV files, so they are kept
+in a columnar, memory-mapped format instead: every symbol has a directory with one
+raw binary file per column (timestamps as int64 minutes since the epoch, prices as
+float32, volume as float64) and a small JSON file with the row count. Appending new
+bars writes to the end of the column files; reading maps them without parsing.
+
+Coarser tiers (5-minute, hourly, daily) are resampled from the minute bars with
+vectorized reductions over bucket boundaries and cached in the same format. When
+minute bars are appended, only the last (possibly incomplete) bucket of a cached
+tier and the buckets after it are recomputed.
+
+bars() returns a DataFrame with the columns and date index of load_stock_data, so
+scale_prices and the split_data_week_ahead_with_dates_* windowing take any tier.
+
+Usage:
+    store = IntradayStore('intraday')
+    store.append('PLUG', minute_frame)
+    prices = store.bars('PLUG', '5min')['4. close']
+    scaled, scaler = scale_prices(prices)
+    x_train, y_train, x_test, y_test, dates_train, dates_test = split_data_week_ahead_with_dates_multi(scaled, 78, 12)
+"""
+import json
+import os
+
+import numpy as np
+
+# Tier name -> bucket width in minutes
+TIERS = {'1min': 1, '5min': 5, '1h': 60, '1d': 1440}
+
+# Column -> (file name, dtype); timestamps are minutes since 1970-01-01 in exchange time
+COLUMNS = {
+    'timestamp': ('timestamp.bin', np.int64),
+    '1. open': ('open.bin', np.float32),
+    '2. high': ('high.bin', np.float32),
+    '3. low': ('low.bin', np.float32),
+    '4. close': ('close.bin', np.float32),
+    '5. volume': ('volume.bin', np.float64),
+}
+PRICE_COLUMNS = ['1. open', '2. high', '3. low', '4. close', '5. volume']
+
+
+def _read_meta(directory):
+    path = os.path.join(directory, 'meta.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+def _write_meta(directory, meta):
+    path = os.path.join(directory, 'meta.json')
+    with open(path + '.tmp', 'w') as file:
+        json.dump(meta, file)
+    os.replace(path + '.tmp', path)
+
+
+def _map_columns(directory, rows):
+    """
+    Map the column files of a directory read-only, as a dict of arrays.
+    """
+    if rows == 0:
+        return {name: np.empty(0, dtype) for name, (_, dtype) in COLUMNS.items()}
+    return {name: np.memmap(os.path.join(directory, file_name), dtype=dtype, mode='r', shape=(rows,))
+            for name, (file_name, dtype) in COLUMNS.items()}
+
+
+def _append_columns(directory, columns, keep_rows=None):
+    """
+    Append arrays to the column files, first truncating them to keep_rows rows if given.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name, (file_name, dtype) in COLUMNS.items():
+        path = os.path.join(directory, file_name)
+        with open(path, 'ab') as file:
+            if keep_rows is not None:
+                file.truncate(keep_rows * np.dtype(dtype).itemsize)
+            file.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+
+
+def resample_bars(columns, minutes):
+    """
+    Aggregate bars into buckets of the given width.
+
+    Parameters:
+    columns (dict): Arrays of one symbol's bars with the COLUMNS keys, sorted by timestamp.
+    minutes (int): Bucket width in minutes; 1440 gives calendar days.
+
+    Returns:
+    dict: Arrays of the resampled bars, each timestamped with the start of its bucket.
+    """
+    timestamps = np.asarray(columns['timestamp'])
+    if len(timestamps) == 0:
+        return {name: np.empty(0, dtype) for name, (_, dtype) in COLUMNS.items()}
+    buckets = timestamps // minutes
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(timestamps)] - 1
+    return {
+        'timestamp': buckets[starts] * minutes,
+        '1. open': np.asarray(columns['1. open'])[starts],
+        '2. high': np.maximum.reduceat(np.asarray(columns['2. high']), starts),
+        '3. low': np.minimum.reduceat(np.asarray(columns['3. low']), starts),
+        '4. close': np.asarray(columns['4. close'])[ends],
+        '5. volume': np.add.reduceat(np.asarray(columns['5. volume'], dtype=np.float64), starts),
+    }
+
+
+class IntradayStore:
+    """
+    A directory of memory-mapped minute bars per symbol, with cached resampled tiers.
+    """
+
+    def __init__(self, root='intraday'):
+        self.root = root
+
+    def _directory(self, symbol, tier='1min'):
+        if tier == '1min':
+            return os.path.join(self.root, symbol)
+        return os.path.join(self.root, symbol, 'tiers', tier)
+
+    def rows(self, symbol):
+        """
+        Return the number of minute bars stored for a symbol.
+        """
+        meta = _read_meta(self._directory(symbol))
+        return meta['rows'] if meta else 0
+
+    def append(self, symbol, frame):
+        """
+        Append minute bars; bars not after the last stored one are skipped.
+
+        Parameters:
+        symbol (str): The stock symbol.
+        frame (DataFrame): Minute bars indexed by timestamp, with the load_stock_data
+            columns ('1. open' ... '5. volume'), as returned by Alpha Vantage's intraday endpoint.
+
+        Returns:
+        int: Number of bars appended.
+        """
+        directory = self._directory(symbol)
+        rows = self.rows(symbol)
+        frame = frame.sort_index()
+        timestamps = frame.index.values.astype('datetime64[m]').astype(np.int64)
+        if rows:
+            last = _map_columns(directory, rows)['timestamp'][-1]
+            keep = timestamps > last
+            frame, timestamps = frame[keep], timestamps[keep]
+        if not len(timestamps):
+            return 0
+        # Alpha Vantage can repeat a bar at page boundaries
+        unique = np.r_[True, timestamps[1:] != timestamps[:-1]]
+        frame, timestamps = frame[unique], timestamps[unique]
+
+        columns = {name: frame[name].to_numpy() for name in PRICE_COLUMNS}
+        columns['timestamp'] = timestamps
+        _append_columns(directory, columns, keep_rows=rows)
+        _write_meta(directory, {'rows': rows + len(timestamps)})
+        return len(timestamps)
+
+    def columns(self, symbol, tier='1min'):
+        """
+        Map the bars of a tier, resampling the minute bars first if the cached tier is stale.
+
+        Returns:
+        dict: Read-only arrays with the COLUMNS keys.
+        """
+        if tier not in TIERS:
+            raise ValueError(f"Unknown tier {tier!r}, choose from {list(TIERS)}")
+        rows = self.rows(symbol)
+        minutes = _map_columns(self._directory(symbol), rows)
+        if tier == '1min':
+            return minutes
+
+        directory = self._directory(symbol, tier)
+        meta = _read_meta(directory) or {'rows': 0, 'source_rows': 0, 'last_start': 0}
+        if meta['source_rows'] != rows:
+            if meta['source_rows'] > rows:  # The minute bars were rewritten
+                meta = {'rows': 0, 'source_rows': 0, 'last_start': 0}
+            # Recompute from the first minute of the last cached bucket, which may have been incomplete
+            start = meta['last_start']
+            tail = resample_bars({name: values[start:] for name, values in minutes.items()}, TIERS[tier])
+            keep_rows = max(meta['rows'] - 1, 0)
+            _append_columns(directory, tail, keep_rows=keep_rows)
+            last_bucket = tail['timestamp'][-1] // TIERS[tier]
+            last_start = start + int(np.searchsorted(minutes['timestamp'][start:] // TIERS[tier], last_bucket))
+            meta = {'rows': keep_rows + len(tail['timestamp']), 'source_rows': rows, 'last_start': last_start}
+            _write_meta(directory, meta)
+        return _map_columns(directory, meta['rows'])
+
+    def bars(self, symbol, tier='1min', start=None, end=None):
+        """
+        Read the bars of a tier as a DataFrame shaped like the load_stock_data frames.
+
+        Parameters:
+        symbol (str): The stock symbol.
+        tier (str): One of TIERS.
+        start, end (str): Inclusive date range, partial dates allowed, as for DataFrame slicing.
+
+        Returns:
+        DataFrame: OHLCV columns indexed by bar start time ('date').
+        """
+        import pandas as pd
+
+        columns = self.columns(symbol, tier)
+        index = pd.DatetimeIndex(columns['timestamp'].astype('datetime64[m]'), name='date')
+        frame = pd.DataFrame({name: np.asarray(columns[name], dtype=np.float64) for name in PRICE_COLUMNS},
+                             index=index)
+        return frame[start:end]
+
+    def symbols(self):
+        """
+        List the symbols with stored minute bars.
+        """
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if _read_meta(os.path.join(self.root, name)))
+
+
+def retrieve_intraday_data(symbols, store, api_key_file='AlphaVantage.txt'):
+    """
+    Download the recent minute bars of every symbol from Alpha Vantage into an IntradayStore.
+
+    Parameters:
+    symbols (list): The stock symbols.
+    store (IntradayStore): The store the bars are appended to.
+    api_key_file (str): The file holding the Alpha Vantage API key.
+
+    Returns:
+    dict: Number of new bars per symbol.
+    """
+    from alpha_vantage.timeseries import TimeSeries
+
+    with open(api_key_file, 'r') as file:
+        api_key = file.read().strip()
+    ts = TimeSeries(key=api_key, output_format='pandas')
+
+    appended = {}
+    for symbol in symbols:
+        try:
+            data, _ = ts.get_intraday(symbol=symbol, interval='1min', outputsize='full')
+        except ValueError as e:
+            print(f"Error retrieving intraday data for {symbol}: {e}")
+            continue
+        appended[symbol] = store.append(symbol, data)
+        print(f"{appended[symbol]} new minute bars saved for {symbol}")
+    return appended
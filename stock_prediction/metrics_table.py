@@ -0,0 +1,109 @@
+"""
+A shared table of test errors per symbol, model and forecast day.
+
+Every model family (the GRU, the baselines, ...) appends its scores to the same CSV
+file, one row per (symbol, model, horizon), so they can be compared and used to
+decide where training a GRU is worth it. Later rows supersede earlier ones.
+"""
+import csv
+import datetime
+import os
+
+FIELDS = ['symbol', 'model', 'horizon', 'rmse', 'mae', 'samples', 'evaluated_at']
+
+# Model name of the GRU scores written by the evaluate command
+GRU_MODEL = 'gru'
+
+
+def metric_rows(symbol, model, y_true, y_pred):
+    """
+    Score a model's test forecasts per forecast day.
+
+    Parameters:
+    symbol (str): The stock symbol.
+    model (str): The model name, e.g. 'gru' or 'naive'.
+    y_true (ndarray): Actual prices of shape (samples, forecast_horizon).
+    y_pred (ndarray): Predicted prices of the same shape.
+
+    Returns:
+    list: One row dict per forecast day, with the FIELDS keys.
+    """
+    import numpy as np
+
+    errors = np.asarray(y_pred, dtype=float) - np.asarray(y_true, dtype=float)
+    rmse = np.sqrt(np.mean(errors ** 2, axis=0))
+    mae = np.mean(np.abs(errors), axis=0)
+    evaluated_at = datetime.datetime.now().isoformat(timespec='seconds')
+    return [{'symbol': symbol, 'model': model, 'horizon': day + 1, 'rmse': float(rmse[day]),
+             'mae': float(mae[day]), 'samples': len(errors), 'evaluated_at': evaluated_at}
+            for day in range(errors.shape[1])]
+
+
+class MetricsTable:
+    """
+    An append-only CSV file of metric rows.
+    """
+
+    def __init__(self, path='metrics.csv'):
+        self.path = path
+
+    def append(self, rows):
+        """
+        Append metric rows, writing the header if the file is new.
+        """
+        new_file = not os.path.exists(self.path)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=FIELDS)
+            if new_file:
+                writer.writeheader()
+            writer.writerows(rows)
+
+    def latest(self, symbols=None):
+        """
+        Read the most recent row of every (symbol, model, horizon).
+
+        Parameters:
+        symbols (list): Symbols to read, all of them by default.
+
+        Returns:
+        DataFrame: The rows with the FIELDS columns.
+        """
+        import pandas as pd
+
+        if not os.path.exists(self.path):
+            return pd.DataFrame(columns=FIELDS)
+        table = pd.read_csv(self.path)
+        if symbols is not None:
+            table = table[table['symbol'].isin(symbols)]
+        # Rows are appended in time order, so the last one of each key is the latest
+        return table.drop_duplicates(['symbol', 'model', 'horizon'], keep='last').reset_index(drop=True)
+
+    def summary(self, symbols=None):
+        """
+        Mean RMSE over the forecast days, per symbol and model.
+
+        Returns:
+        DataFrame: Symbols as rows and models as columns.
+        """
+        latest = self.latest(symbols)
+        return latest.pivot_table(index='symbol', columns='model', values='rmse', aggfunc='mean')
+
+    def baseline_wins(self, symbol, gru_model=GRU_MODEL):
+        """
+        Tell whether a baseline scored at least as well as the GRU for a symbol.
+
+        Only symbols with scores of both the GRU and a baseline can be decided; for
+        the others training the GRU is considered worthwhile.
+
+        Returns:
+        str or None: The name of the best baseline if it matches or beats the GRU, else None.
+        """
+        summary = self.summary([symbol])
+        if symbol not in summary.index or gru_model not in summary.columns:
+            return None
+        scores = summary.loc[symbol]
+        baselines = scores.drop(gru_model).dropna()
+        if scores.isna()[gru_model] or baselines.empty or baselines.min() > scores[gru_model]:
+            return None
+        return baselines.idxmin()
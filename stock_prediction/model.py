@@ -0,0 +1,220 @@
+"""
+The networks used for close price forecasting.
+
+Every network maps input windows of shape (batch, lookback, input_dim) to forecasts
+of shape (batch, output_dim) and takes the same constructor arguments as GRU, so
+they can replace each other (see zoo.py). A GRU with quantiles forecasts every
+quantile of every day in the same pass, with shape (batch, output_dim, quantiles),
+and is trained with PinballLoss.
+"""
+import torch
+import torch.nn as nn
+
+from .inference import median_index
+
+STRATEGIES = ('direct', 'recursive', 'hybrid')
+
+# Steps per prediction of the hybrid strategy: one trading week
+HYBRID_BLOCK = 5
+
+
+# Quantiles of the probabilistic output mode when none are given: an 80% interval and the median
+DEFAULT_QUANTILES = (0.1, 0.5, 0.9)
+
+
+def forecast_block(strategy, output_dim, block=None):
+    """
+    Return the number of steps a GRU of the given strategy predicts at once.
+    """
+    if strategy == 'direct':
+        return output_dim
+    if strategy == 'recursive':
+        return 1
+    return block or HYBRID_BLOCK
+
+
+class GRU(nn.Module):
+    """
+    GRU Neural Network for time series forecasting.
+    
+    Attributes:
+    - input_dim: The number of input features per timestep.
+    - hidden_dim: The number of features in the hidden state h.
+    - num_layers: The number of stacked GRU layers.
+    - output_dim: The number of output features (forecast horizon).
+    - strategy: How multi-step forecasts are made, one of STRATEGIES.
+    - block: The number of steps the output layer predicts at once.
+    - quantiles: The forecast quantiles, or None for point forecasts.
+    """
+    
+    def __init__(self, input_dim, hidden_dim, num_layers, output_dim, strategy='direct', block=None,
+                 quantiles=None):
+        """
+        Initializes the GRU model with the specified parameters and layers.
+        
+        Parameters:
+        - input_dim (int): Number of input features.
+        - hidden_dim (int): Size of GRU hidden layers.
+        - num_layers (int): Number of GRU layers.
+        - output_dim (int): Number of output features, the horizon trained on.
+        - strategy (str): 'direct' predicts all output_dim steps at once, 'recursive' predicts
+          one step and feeds it back in, 'hybrid' predicts `block` steps at once and feeds them back in.
+        - block (int): Steps per prediction of the hybrid strategy (default HYBRID_BLOCK).
+        - quantiles (sequence): If given, forecast these quantiles (between 0 and 1) of every
+          step instead of a point forecast; the recursive and hybrid strategies feed the
+          quantile closest to the median back in.
+        """
+        super(GRU, self).__init__()
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown forecasting strategy {strategy!r}, choose from {STRATEGIES}")
+        if strategy != 'direct' and input_dim != 1:
+            raise ValueError("The recursive and hybrid strategies feed forecasts back in and need input_dim=1")
+        self.hidden_dim = hidden_dim  # Size of the hidden layer
+        self.num_layers = num_layers  # Number of GRU layers
+        self.output_dim = output_dim
+        self.strategy = strategy
+        self.block = forecast_block(strategy, output_dim, block)
+        self.quantiles = None
+        if quantiles is not None:
+            self.quantiles = tuple(sorted(float(quantile) for quantile in quantiles))
+            if not all(0.0 < quantile < 1.0 for quantile in self.quantiles):
+                raise ValueError("Quantiles must lie strictly between 0 and 1")
+        
+        # The GRU layer; batch_first=True means the input tensors will be of shape (batch_size, seq_length, features)
+        self.gru = nn.GRU(input_dim, hidden_dim, num_layers, batch_first=True)
+        # Fully connected layer that maps the GRU layer output to the next `block` steps (times the quantiles)
+        self.fc = nn.Linear(hidden_dim, self.block * len(self.quantiles or (None,)))
+
+    def _decode(self, out):
+        """
+        Map the last hidden output to the next block, of shape (batch, block[, quantiles]).
+        """
+        out = self.fc(out)
+        if self.quantiles is None:
+            return out
+        # Sorting keeps the quantiles from crossing, at no extra forward pass
+        return out.view(out.size(0), self.block, len(self.quantiles)).sort(dim=-1).values
+
+    def forward(self, x, horizon=None):
+        """
+        Defines the forward pass of the model.
+        
+        Parameters:
+        - x (Tensor): The input sequence to the GRU model.
+        - horizon (int): Number of steps to forecast, output_dim by default. The recursive and
+          hybrid strategies forecast any horizon, e.g. 30 days from a model trained on 7.
+        
+        Returns:
+        - Tensor: The output of the model, of shape (batch_size, horizon), or
+          (batch_size, horizon, quantiles) with quantiles.
+        """
+        horizon = self.output_dim if horizon is None else horizon
+        if self.strategy == 'direct' and horizon > self.output_dim:
+            raise ValueError(f"A direct model forecasts at most {self.output_dim} steps")
+
+        # Initialize hidden state with zeros
+        # Shape: (num_layers, batch_size, hidden_dim)
+        h0 = torch.zeros(self.num_layers, x.size(0), self.hidden_dim).requires_grad_()
+        
+        # Forward propagate the GRU
+        # out: tensor containing the output features (h_t) from the last layer of the GRU, for each t.
+        out, (hn) = self.gru(x, (h0.detach()))  # detach h0 to prevent backprop through the initial hidden state
+        
+        # Decode the hidden state of the last time step
+        out = self._decode(out[:, -1, :])
+        if self.strategy == 'direct':
+            return out if horizon == self.output_dim else out[:, :horizon]
+
+        # Feed each forecast block back in, continuing from the hidden state rather than re-encoding the window
+        blocks = [out]
+        for _ in range((horizon - 1) // self.block):
+            fed_back = out if self.quantiles is None else out[:, :, median_index(self.quantiles)]
+            step_out, hn = self.gru(fed_back.unsqueeze(-1), hn)
+            out = self._decode(step_out[:, -1, :])
+            blocks.append(out)
+        return torch.cat(blocks, dim=1)[:, :horizon]
+
+
+class PinballLoss(nn.Module):
+    """
+    Mean pinball (quantile) loss of forecasts of shape (batch, horizon, quantiles).
+
+    For quantile q and error e = actual - forecast, the loss is max(q * e, (q - 1) * e),
+    which is minimised by the q-th quantile of the actual values.
+    """
+
+    def __init__(self, quantiles):
+        super(PinballLoss, self).__init__()
+        self.register_buffer('quantiles', torch.tensor(sorted(quantiles), dtype=torch.float32))
+
+    def forward(self, y_pred, y_true):
+        errors = y_true.unsqueeze(-1) - y_pred
+        return torch.maximum(self.quantiles * errors, (self.quantiles - 1.0) * errors).mean()
+
+
+class LSTM(nn.Module):
+    """
+    LSTM Neural Network for time series forecasting, with the same interface as GRU.
+    """
+
+    def __init__(self, input_dim, hidden_dim, num_layers, output_dim):
+        super(LSTM, self).__init__()
+        self.hidden_dim = hidden_dim
+        self.num_layers = num_layers
+        self.lstm = nn.LSTM(input_dim, hidden_dim, num_layers, batch_first=True)
+        self.fc = nn.Linear(hidden_dim, output_dim)
+
+    def forward(self, x):
+        # Zero initial hidden and cell states, as for the GRU
+        h0 = torch.zeros(self.num_layers, x.size(0), self.hidden_dim)
+        c0 = torch.zeros(self.num_layers, x.size(0), self.hidden_dim)
+        out, _ = self.lstm(x, (h0, c0))
+        return self.fc(out[:, -1, :])
+
+
+class TemporalConvNet(nn.Module):
+    """
+    Temporal convolutional network: stacked causal convolutions whose dilation doubles
+    per layer, so num_layers layers see 1 + (kernel_size - 1) * (2**num_layers - 1) days.
+    """
+
+    def __init__(self, input_dim, hidden_dim, num_layers, output_dim, kernel_size=3):
+        super(TemporalConvNet, self).__init__()
+        self.kernel_size = kernel_size
+        self.convs = nn.ModuleList([
+            nn.Conv1d(input_dim if layer == 0 else hidden_dim, hidden_dim, kernel_size, dilation=2 ** layer)
+            for layer in range(num_layers)
+        ])
+        # 1x1 convolution matching the channels of the first residual connection
+        self.input_projection = nn.Conv1d(input_dim, hidden_dim, 1)
+        self.fc = nn.Linear(hidden_dim, output_dim)
+
+    def forward(self, x):
+        out = x.transpose(1, 2)  # (batch, channels, time) for the convolutions
+        for layer, conv in enumerate(self.convs):
+            # Left padding keeps the convolution causal and the length unchanged
+            padded = nn.functional.pad(out, ((self.kernel_size - 1) * conv.dilation[0], 0))
+            residual = self.input_projection(out) if layer == 0 else out
+            out = torch.relu(conv(padded)) + residual
+        return self.fc(out[:, :, -1])
+
+
+class TransformerForecaster(nn.Module):
+    """
+    Small Transformer encoder over the input window, decoded from its last position.
+    """
+
+    def __init__(self, input_dim, hidden_dim, num_layers, output_dim, num_heads=4, max_length=512):
+        super(TransformerForecaster, self).__init__()
+        self.input_projection = nn.Linear(input_dim, hidden_dim)
+        # Learned positional embedding, one per position in the window
+        self.position = nn.Parameter(torch.zeros(1, max_length, hidden_dim))
+        layer = nn.TransformerEncoderLayer(hidden_dim, num_heads, dim_feedforward=2 * hidden_dim, dropout=0.0,
+                                           batch_first=True)
+        self.encoder = nn.TransformerEncoder(layer, num_layers, enable_nested_tensor=False)
+        self.fc = nn.Linear(hidden_dim, output_dim)
+
+    def forward(self, x):
+        out = self.input_projection(x) + self.position[:, :x.size(1)]
+        out = self.encoder(out)
+        return self.fc(out[:, -1, :])
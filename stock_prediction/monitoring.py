@@ -0,0 +1,200 @@
+"""
+Drift monitoring of the live forecasts.
+
+The forecasts appended to the prediction store by `predict --store` have no actual
+prices yet. DriftMonitor joins them with the realized closes as new bars arrive and
+keeps, per symbol and forecast day, exponentially weighted statistics of the error:
+the mean squared error (reported as an RMSE), the mean absolute error and the mean
+error (bias), updated one realized forecast at a time. Only forecasts whose target
+date is after the symbol's watermark are read from the store, so a nightly update
+costs the new rows only.
+
+The statistics are compared with the test RMSE of the same model and forecast day
+from the metrics table (written by `evaluate`). A symbol drifts once, for any
+forecast day, the rolling RMSE exceeds threshold times the test RMSE over at least
+min_samples realized forecasts; only those symbols need retraining. Forecasts of a
+new model version reset the symbol's statistics.
+
+The state is a small JSON file, written with a temporary file and a rename.
+
+Usage:
+    monitor = DriftMonitor('drift_state.json')
+    status = monitor.update(PredictionStore('predictions'), data_dir='.', metrics_table=MetricsTable())
+    monitor.drifted()
+"""
+import json
+import os
+
+import numpy as np
+
+STATE_VERSION = 1
+STATUS_FIELDS = ['symbol', 'horizon', 'model_version', 'samples', 'rmse', 'mae', 'bias', 'reference_rmse', 'ratio',
+                 'drifted']
+
+
+class DriftMonitor:
+    """
+    Rolling per-symbol, per-horizon error statistics of the stored live forecasts.
+    """
+
+    def __init__(self, state_path='drift_state.json', halflife=20, threshold=1.5, min_samples=5):
+        """
+        Parameters:
+        state_path (str): The JSON file holding the statistics between runs.
+        halflife (float): Number of realized forecasts after which an error's weight halves.
+        threshold (float): Ratio of rolling to test RMSE above which a forecast day drifts.
+        min_samples (int): Realized forecasts needed before a forecast day can drift.
+        """
+        self.state_path = state_path
+        self.halflife = halflife
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.state = self._load()
+
+    def _load(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as file:
+                state = json.load(file)
+            if state.get('version') == STATE_VERSION and state.get('halflife') == self.halflife:
+                return state
+        return {'version': STATE_VERSION, 'halflife': self.halflife, 'symbols': {}}
+
+    def save(self):
+        """
+        Write the statistics to state_path.
+        """
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        with open(self.state_path + '.tmp', 'w') as file:
+            json.dump(self.state, file, indent=2, sort_keys=True)
+        os.replace(self.state_path + '.tmp', self.state_path)
+
+    def ingest(self, symbol, forecasts, closes):
+        """
+        Update a symbol's statistics with the forecasts whose target dates have closed.
+
+        Parameters:
+        symbol (str): The stock symbol.
+        forecasts (DataFrame): Live forecast rows of the symbol in the prediction store schema.
+        closes (Series): Realized closing prices indexed by date, at least up to the last target
+            date to ingest; later forecasts are left for the next call.
+
+        Returns:
+        int: Number of realized forecasts added.
+        """
+        import pandas as pd
+
+        entry = self.state['symbols'].setdefault(symbol, {'model_version': None, 'watermark': None, 'horizons': {}})
+        if forecasts.empty or closes.empty:
+            return 0
+        last_close = closes.index.max()
+        forecasts = forecasts[forecasts['target_date'] <= last_close]
+        if entry['watermark'] is not None:
+            forecasts = forecasts[forecasts['target_date'] > pd.Timestamp(entry['watermark'])]
+        if forecasts.empty:
+            return 0
+
+        # A newer model starts from scratch: the old errors say nothing about it
+        latest_version = forecasts.sort_values('as_of')['model_version'].iloc[-1]
+        if latest_version != entry['model_version']:
+            entry.update(model_version=latest_version, horizons={})
+        forecasts = forecasts[forecasts['model_version'] == latest_version]
+        # `predict --store` may run more than once for the same as-of date; the last run counts.
+        # The store's row order says nothing about the runs, their append times do
+        if 'written_at' in forecasts.columns:
+            forecasts = forecasts.sort_values('written_at', kind='stable', na_position='first')
+        forecasts = forecasts.drop_duplicates(['as_of', 'horizon'], keep='last')
+
+        actual = closes.reindex(pd.DatetimeIndex(forecasts['target_date'])).to_numpy(dtype=float)
+        errors = forecasts['predicted'].to_numpy(dtype=float) - actual
+        # Target dates without a bar (exchange holidays) have nothing to compare with
+        known = ~np.isnan(errors)
+        alpha = 1.0 - 0.5 ** (1.0 / self.halflife)
+        added = 0
+        order = np.argsort(forecasts['target_date'].to_numpy()[known], kind='stable')
+        for horizon, error in zip(forecasts['horizon'].to_numpy()[known][order], errors[known][order]):
+            stats = entry['horizons'].setdefault(str(int(horizon)), {'samples': 0, 'se': 0.0, 'ae': 0.0, 'error': 0.0})
+            # Exponentially weighted means; the first error initialises them
+            weight = 1.0 if stats['samples'] == 0 else alpha
+            stats['se'] += weight * (error ** 2 - stats['se'])
+            stats['ae'] += weight * (abs(error) - stats['ae'])
+            stats['error'] += weight * (error - stats['error'])
+            stats['samples'] += 1
+            added += 1
+        entry['watermark'] = last_close.strftime('%Y-%m-%d')
+        return added
+
+    def update(self, store, data_dir='.', symbols=None, metrics_table=None, closes=None):
+        """
+        Ingest the realized closes of every symbol with live forecasts, and save the state.
+
+        Parameters:
+        store (PredictionStore): The store the live forecasts were appended to.
+        data_dir (str): The directory holding the CSV files with the realized closes.
+        symbols (list): Symbols to update, all symbols in the store by default.
+        metrics_table (MetricsTable): Source of the test RMSE the rolling RMSE is compared with.
+        closes (dict): Realized closing prices per symbol, read from data_dir by default.
+
+        Returns:
+        DataFrame: The status of every symbol and forecast day, see status().
+        """
+        from .data import load_stock_data
+
+        symbols = store.symbols() if symbols is None else symbols
+        for symbol in symbols:
+            watermark = self.state['symbols'].get(symbol, {}).get('watermark')
+            # Live forecasts have no split; only rows after the watermark are read
+            forecasts = store.query([symbol], start=watermark, split=None,
+                                    columns=['as_of', 'horizon', 'target_date', 'predicted', 'model_version', 'split',
+                                             'written_at'])
+            forecasts = forecasts[forecasts['split'].isna()]
+            if closes is not None and symbol in closes:
+                realized = closes[symbol]
+            else:
+                frame = load_stock_data([symbol], data_dir).get(symbol)
+                if frame is None:
+                    continue
+                realized = frame['4. close']
+            self.ingest(symbol, forecasts, realized.sort_index())
+        self.save()
+        return self.status(metrics_table)
+
+    def status(self, metrics_table=None):
+        """
+        Report the rolling statistics of every symbol and forecast day.
+
+        Parameters:
+        metrics_table (MetricsTable): Source of the test RMSE per symbol and forecast day.
+
+        Returns:
+        DataFrame: The STATUS_FIELDS columns; 'ratio' is the rolling RMSE over the test RMSE
+        and 'drifted' whether it exceeds the threshold over at least min_samples forecasts.
+        """
+        import pandas as pd
+
+        reference = {}
+        if metrics_table is not None:
+            from .metrics_table import GRU_MODEL
+
+            scores = metrics_table.latest(list(self.state['symbols']))
+            scores = scores[scores['model'] == GRU_MODEL]
+            reference = {(symbol, int(horizon)): rmse
+                         for symbol, horizon, rmse in zip(scores['symbol'], scores['horizon'], scores['rmse'])}
+
+        rows = []
+        for symbol, entry in sorted(self.state['symbols'].items()):
+            for horizon, stats in sorted(entry['horizons'].items(), key=lambda item: int(item[0])):
+                rmse = float(np.sqrt(stats['se']))
+                reference_rmse = reference.get((symbol, int(horizon)), np.nan)
+                ratio = rmse / reference_rmse if reference_rmse > 0 else np.nan
+                rows.append({'symbol': symbol, 'horizon': int(horizon), 'model_version': entry['model_version'],
+                             'samples': stats['samples'], 'rmse': rmse, 'mae': stats['ae'], 'bias': stats['error'],
+                             'reference_rmse': reference_rmse, 'ratio': ratio,
+                             'drifted': bool(stats['samples'] >= self.min_samples and ratio > self.threshold)})
+        return pd.DataFrame(rows, columns=STATUS_FIELDS)
+
+    def drifted(self, metrics_table=None):
+        """
+        List the symbols with at least one drifting forecast day, which need retraining.
+        """
+        status = self.status(metrics_table)
+        return sorted(status.loc[status['drifted'], 'symbol'].unique())
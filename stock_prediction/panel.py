@@ -0,0 +1,246 @@
+"""
+Calendar-aligned price panel for cross-ticker analysis.
+
+Each symbol from load_stock_data is placed on a shared trading calendar so that a
+single contiguous (dates x symbols) array holds every price. Normalization,
+returns, correlations and multi-symbol training windows then become array
+operations on that panel instead of per-ticker slicing.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .data import latest_data_file, load_stock_data
+
+# How calendar days on which a symbol did not trade are handled:
+# - 'ffill': carry the last traded price forward (never before listing or after the last bar)
+# - 'nan':   leave the gap as NaN
+# - 'drop':  keep only the dates on which every symbol traded
+GAP_POLICIES = ('ffill', 'nan', 'drop')
+
+
+class PricePanel:
+    """
+    A (dates x symbols) array of one price column aligned on a shared calendar.
+
+    Attributes:
+    - values: C-contiguous float64 array of shape (len(dates), len(symbols)).
+    - dates: DatetimeIndex of the shared trading calendar.
+    - symbols: List of stock symbols, one per column of values.
+    - column: Name of the price column the panel was built from.
+    """
+
+    def __init__(self, values, dates, symbols, column):
+        self.values = np.ascontiguousarray(values, dtype=np.float64)
+        self.dates = pd.DatetimeIndex(dates)
+        self.symbols = list(symbols)
+        self.column = column
+
+        if self.values.shape != (len(self.dates), len(self.symbols)):
+            raise ValueError(f"Panel values have shape {self.values.shape}, expected "
+                             f"{(len(self.dates), len(self.symbols))}")
+
+    def __repr__(self):
+        return (f"PricePanel(column={self.column!r}, symbols={self.symbols}, "
+                f"dates={len(self.dates)})")
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def series(self, symbol):
+        """
+        Return the aligned prices of one symbol as a Series indexed by date.
+        """
+        return pd.Series(self.values[:, self.symbols.index(symbol)], index=self.dates, name=symbol)
+
+    def to_frame(self):
+        """
+        Return the panel as a DataFrame with dates as the index and symbols as columns.
+        """
+        return pd.DataFrame(self.values, index=self.dates, columns=self.symbols)
+
+    def normalized(self, base=100.0):
+        """
+        Index every symbol to a base value at its first available price.
+
+        Parameters:
+        base (float): The value each series starts from.
+
+        Returns:
+        ndarray: Array with the same shape as values.
+        """
+        valid = ~np.isnan(self.values)
+        first_rows = valid.argmax(axis=0)
+        first_prices = self.values[first_rows, np.arange(self.values.shape[1])]
+        return self.values / first_prices * base
+
+    def returns(self):
+        """
+        Compute simple daily returns for every symbol at once.
+
+        Returns:
+        ndarray: Array of shape (len(dates) - 1, len(symbols)); a return is NaN when
+        either of its two prices is missing.
+        """
+        return self.values[1:] / self.values[:-1] - 1.0
+
+    def sliding_windows(self, lookback, forecast_horizon):
+        """
+        Build lookback/forecast windows for every symbol without copying the panel.
+
+        Window i covers calendar rows i to i + lookback + forecast_horizon - 1, the same
+        layout split_data_week_ahead_with_dates_multi produces for a single symbol.
+
+        Parameters:
+        lookback (int): Number of input days per window.
+        forecast_horizon (int): Number of target days per window.
+
+        Returns:
+        tuple: (x, y, valid) where x has shape (windows, symbols, lookback), y has shape
+        (windows, symbols, forecast_horizon) and valid is a boolean (windows, symbols)
+        mask of windows without missing prices. x and y are read-only views.
+        """
+        windows = np.lib.stride_tricks.sliding_window_view(self.values, lookback + forecast_horizon, axis=0)
+        x = windows[:, :, :lookback]
+        y = windows[:, :, lookback:]
+        valid = ~np.isnan(windows).any(axis=2)
+        return x, y, valid
+
+    def save(self, path):
+        """
+        Save the panel to a .npz file.
+        """
+        np.savez(path, values=self.values, dates=self.dates.values.astype('datetime64[ns]'),
+                 symbols=np.array(self.symbols), column=np.array(self.column))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a panel previously written with save.
+        """
+        with np.load(path) as stored:
+            return cls(stored['values'], pd.DatetimeIndex(stored['dates']),
+                       stored['symbols'].tolist(), str(stored['column']))
+
+
+def _forward_fill(values, limit=None):
+    """
+    Forward fill NaNs down each column, staying inside each symbol's traded range.
+    """
+    if not len(values):
+        return values
+    rows = np.arange(values.shape[0])[:, None]
+    valid = ~np.isnan(values)
+
+    # Row of the most recent valid price at or before each row
+    last_valid = np.maximum.accumulate(np.where(valid, rows, 0), axis=0)
+    filled = values[last_valid, np.arange(values.shape[1])]
+
+    # Never fill past the last traded day of a symbol, or across gaps longer than limit
+    last_traded = values.shape[0] - 1 - valid[::-1].argmax(axis=0)
+    filled[rows > last_traded] = np.nan
+    if limit is not None:
+        filled[(rows - last_valid > limit) & ~valid] = np.nan
+    return filled
+
+
+def build_price_panel(stock_data, column='4. close', start=None, end=None, gap_policy='ffill',
+                      ffill_limit=None):
+    """
+    Align the data frames returned by load_stock_data onto a shared trading calendar.
+
+    Parameters:
+    stock_data (dict): Data frames indexed by date, with stock symbols as keys.
+    column (str): The price column to place in the panel, e.g. '4. close' or '2. high'.
+    start (str): Optional first date (partial dates such as '2019' are allowed).
+    end (str): Optional last date (partial dates such as '2024' are allowed).
+    gap_policy (str): One of GAP_POLICIES.
+    ffill_limit (int): With gap_policy='ffill', the longest gap (in calendar rows) to fill.
+
+    Returns:
+    PricePanel: The aligned panel; without symbols, an empty one.
+    """
+    if gap_policy not in GAP_POLICIES:
+        raise ValueError(f"gap_policy must be one of {GAP_POLICIES}, got {gap_policy!r}")
+
+    symbols = list(stock_data)
+    columns = []
+    for symbol in symbols:
+        frame = stock_data[symbol]
+        if not frame.index.is_monotonic_increasing:
+            frame = frame.sort_index()
+        columns.append(frame.loc[start:end, column])
+
+    # The shared calendar is every date on which at least one symbol traded
+    if columns:
+        calendar = pd.DatetimeIndex(np.unique(np.concatenate([c.index.values for c in columns])))
+    else:
+        calendar = pd.DatetimeIndex([], dtype='datetime64[ns]')
+
+    values = np.full((len(calendar), len(symbols)), np.nan)
+    for j, prices in enumerate(columns):
+        values[calendar.get_indexer(prices.index), j] = prices.to_numpy(dtype=np.float64)
+
+    if gap_policy == 'ffill':
+        values = _forward_fill(values, ffill_limit)
+    elif gap_policy == 'drop':
+        complete = ~np.isnan(values).any(axis=1)
+        values = values[complete]
+        calendar = calendar[complete]
+
+    return PricePanel(values, calendar, symbols, column)
+
+
+def _panel_cache_key(symbols, data_dir, **options):
+    """
+    Hash the source files (name, size, modification time) and the build options.
+    """
+    sources = []
+    for symbol in symbols:
+        path = latest_data_file(symbol, data_dir)
+        if path is None:
+            sources.append([symbol, None])
+            continue
+        stat = os.stat(path)
+        sources.append([symbol, os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+    payload = json.dumps({'sources': sources, 'options': options}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def load_price_panel(symbols, column='4. close', start=None, end=None, gap_policy='ffill',
+                     ffill_limit=None, data_dir='.', cache_dir='.panel_cache'):
+    """
+    Build a price panel straight from the CSV files, reusing a persistent cache.
+
+    The cache entry is keyed on the source files and the build options, so a new
+    download (which changes the file name) or different options rebuild the panel
+    while repeated calls skip CSV parsing entirely.
+
+    Parameters:
+    symbols (list): A list of stock symbols to include.
+    column, start, end, gap_policy, ffill_limit: See build_price_panel.
+    data_dir (str): The directory holding the CSV files.
+    cache_dir (str): Directory for cached panels, or None to disable caching.
+
+    Returns:
+    PricePanel: The aligned panel.
+    """
+    cache_path = None
+    if cache_dir is not None:
+        key = _panel_cache_key(symbols, data_dir, column=column, start=start, end=end,
+                               gap_policy=gap_policy, ffill_limit=ffill_limit)
+        cache_path = os.path.join(cache_dir, f'panel_{key}.npz')
+        if os.path.exists(cache_path):
+            return PricePanel.load(cache_path)
+
+    stock_data = load_stock_data(symbols, data_dir)
+    panel = build_price_panel(stock_data, column, start, end, gap_policy, ffill_limit)
+
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        panel.save(cache_path)
+    return panel
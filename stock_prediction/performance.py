@@ -0,0 +1,131 @@
+"""
+A CPU performance mode for the training loop.
+
+The mode combines three settings, each of which can be used on its own:
+
+- bfloat16 autocast: the forward pass runs in bfloat16 where the CPU supports it
+  natively (AVX512-BF16 or AMX), while the weights, the loss and the optimizer
+  state stay in float32. On CPUs without bfloat16 support the loop stays in float32.
+- Thread pinning: the process is bound to a set of CPUs and torch's intra-op and
+  inter-op thread pools are sized to match, instead of relying on the defaults. Worker
+  `worker` of `workers` co-located trainings takes its own slice of the allowed CPUs
+  (cpu_partition), so they do not oversubscribe the machine by each running one
+  thread per CPU.
+- torch.compile (opt-in): the model is compiled before training. Compilation takes
+  tens of seconds, so it only pays off for long runs.
+
+Usage:
+    train_model, settings = performance_mode(model, compile=True, worker=0, workers=4)
+    hist, summary = train_instrumented(train_model, criterion, optimiser, x_train, y_train, 105,
+                                       autocast_dtype=settings['autocast_dtype'])
+"""
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def bf16_supported():
+    """
+    Tell whether the CPU runs bfloat16 matrix multiplications natively.
+    """
+    import torch
+
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):  # Builds without oneDNN
+        return False
+
+
+def allowed_cpus():
+    """
+    List the ids of the CPUs this process may run on.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def cpu_partition(worker, workers, cpus=None):
+    """
+    Split CPUs into `workers` contiguous slices of near-equal size and return one of them.
+
+    Parameters:
+    worker (int): Index of the worker, from 0; a ValueError is raised unless it is below workers.
+    workers (int): Number of co-located workers.
+    cpus (list): The CPU ids to split, the allowed CPUs by default.
+
+    Returns:
+    list: The CPU ids of the worker; with more workers than CPUs, workers share single CPUs.
+    """
+    # Wrapping an out-of-range index would silently pin two workers to the same CPUs
+    if not 0 <= worker < workers:
+        raise ValueError(f'Worker {worker} is not one of {workers} workers')
+    cpus = allowed_cpus() if cpus is None else sorted(cpus)
+    if workers >= len(cpus):
+        return [cpus[worker % len(cpus)]]
+    return cpus[worker * len(cpus) // workers:(worker + 1) * len(cpus) // workers]
+
+
+def pin_threads(num_threads=None, interop_threads=None, cpus=None, worker=None, workers=None):
+    """
+    Bind the process to a set of CPUs and size torch's thread pools.
+
+    Parameters:
+    num_threads (int): Intra-op threads, one per CPU the process is bound to by default.
+    interop_threads (int): Inter-op threads; torch only accepts this before its first
+        parallel operation, later attempts are logged and ignored.
+    cpus (iterable): CPU ids to bind the process to (Linux only).
+    worker, workers (int): Without cpus, bind the process to the worker's slice of the
+        allowed CPUs (see cpu_partition). Without either, the process keeps every allowed
+        CPU, which only suits a process that has the machine to itself.
+
+    Returns:
+    dict: The 'num_threads', 'interop_threads' and 'cpus' in effect.
+    """
+    import torch
+
+    if cpus is None and workers is not None:
+        cpus = cpu_partition(worker or 0, workers)
+    if cpus is not None and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, set(cpus))
+    allowed = allowed_cpus()
+
+    torch.set_num_threads(num_threads or len(allowed))
+    if interop_threads is not None and interop_threads != torch.get_num_interop_threads():
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as error:
+            logger.warning("Inter-op threads left at %d: %s", torch.get_num_interop_threads(), error)
+
+    return {'num_threads': torch.get_num_threads(), 'interop_threads': torch.get_num_interop_threads(),
+            'cpus': allowed}
+
+
+def performance_mode(model, bf16='auto', compile=False, num_threads=None, interop_threads=None, cpus=None,
+                     worker=None, workers=None):
+    """
+    Prepare a model and the process for fast CPU training.
+
+    Parameters:
+    model (nn.Module): The model to train.
+    bf16 (bool or str): 'auto' to autocast to bfloat16 where the CPU supports it, True to
+        autocast regardless (emulated, and slow, without hardware support), False for float32.
+    compile (bool): Compile the model with torch.compile.
+    num_threads, interop_threads, cpus, worker, workers: Thread pinning, see pin_threads.
+
+    Returns:
+    tuple: (train_model, settings) where train_model is the model to pass to the training
+    loop (it shares its parameters with model, so save model itself) and settings holds
+    'autocast_dtype' (for train_instrumented), 'compiled' and the pin_threads result.
+    """
+    import torch
+
+    if bf16 == 'auto':
+        bf16 = bf16_supported()
+    settings = pin_threads(num_threads, interop_threads, cpus, worker, workers)
+    settings['autocast_dtype'] = torch.bfloat16 if bf16 else None
+    settings['compiled'] = bool(compile)
+    if compile:
+        model = torch.compile(model)
+    return model, settings
@@ -0,0 +1,430 @@
+"""
+The nightly pipeline as a graph of cached stages.
+
+Every symbol runs fetch -> validate -> scale -> window -> train, then predict and
+evaluate from the trained artifact; plot draws the figures of all symbols at the
+end. Each stage of a symbol is a node of the graph, and its output is cached under
+a key hashed from the keys of the nodes it depends on and the options it uses. The
+key of fetch is the checksum of the symbol's CSV file, so a night where only a few
+symbols received new bars reruns only their downstream nodes; the other symbols
+are skipped without loading anything.
+
+Nodes run as soon as their dependencies are done, in a pool of worker processes, so
+independent symbols run concurrently. Each worker is bound to its own slice of the
+allowed CPUs and trains with one torch thread per CPU of its slice. fetch runs in the
+main process, one symbol after the other, to respect the Alpha Vantage rate limits,
+and plot runs there too as render_figures brings its own worker pool.
+
+Usage:
+    summary = run_pipeline(['PLUG', 'NIO'], fetch=True, num_epochs=105)
+    forecast = stage_output('.pipeline_cache', 'predict', 'PLUG')
+"""
+import collections
+import concurrent.futures
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
+import time
+
+# Bump when a stage changes, so every node is recomputed
+PIPELINE_VERSION = 2
+MANIFEST_NAME = 'pipeline_manifest.json'
+
+Stage = collections.namedtuple('Stage', ['name', 'deps', 'options', 'per_symbol'])
+Stage.__doc__ = """
+A step of the pipeline.
+
+name (str): The stage name.
+deps (tuple): Names of the stages whose outputs it reads.
+options (tuple): Names of the options its output depends on; they are part of its cache key.
+per_symbol (bool): Whether it runs once per symbol, or once over all symbols.
+"""
+
+STAGES = [
+    Stage('fetch', (), (), True),
+    Stage('validate', ('fetch',), ('exclude', 'adjust'), True),
+    Stage('scale', ('validate',), ('start', 'end'), True),
+    Stage('window', ('scale',), ('lookback', 'forecast_horizon'), True),
+    Stage('train', ('scale', 'window'), ('hidden_dim', 'num_layers', 'num_epochs', 'lr', 'patience',
+                                          'validation_fraction', 'strategy', 'block', 'quantiles'), True),
+    Stage('predict', ('train',), (), True),
+    Stage('evaluate', ('train',), (), True),
+    Stage('plot', ('validate', 'train'), ('start', 'end'), False),
+]
+STAGE_NAMES = [stage.name for stage in STAGES]
+
+# Options of the stages, matching the defaults of train_symbol and history_jobs
+DEFAULT_OPTIONS = {
+    'start': '2019',
+    'end': '2024',
+    'lookback': 20,
+    'forecast_horizon': 7,
+    'hidden_dim': 32,
+    'num_layers': 2,
+    'num_epochs': 105,
+    'lr': 0.01,
+    'patience': None,
+    'validation_fraction': 0.1,
+    'strategy': 'direct',
+    'block': None,
+    'quantiles': None,
+    'exclude': None,
+    'adjust': False,
+}
+
+
+def _node(stage, symbol):
+    return f'{stage}/{symbol}' if symbol is not None else stage
+
+
+def _output_path(cache_dir, node):
+    return os.path.join(cache_dir, f'{node}.pkl')
+
+
+def _key(stage, symbol, options, dep_keys):
+    config = {name: options[name] for name in stage.options}
+    if stage.name == 'validate' and options['adjust']:
+        # The adjusted prices also depend on the recorded corporate actions
+        from .adjustments import CorporateActions
+
+        config['actions'] = CorporateActions(options['actions_dir']).actions(symbol)
+    payload = json.dumps([PIPELINE_VERSION, stage.name, symbol, config, dep_keys], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _fetch(symbol, inputs, options):
+    from .data import latest_data_file, retrieve_stock_data
+    from .validation import file_checksum
+
+    if options['fetch']:
+        retrieve_stock_data([symbol], options['data_dir'], options['api_key_file'])
+    path = latest_data_file(symbol, options['data_dir'])
+    if path is None:
+        raise FileNotFoundError(f"No data found for {symbol}")
+    return {'path': path, 'checksum': file_checksum(path)}
+
+
+def _validate(symbol, inputs, options):
+    from .data import load_stock_data
+    from .validation import screen_stock_data
+
+    stock_data = load_stock_data([symbol], options['data_dir'])
+    spans = screen_stock_data(stock_data, options['data_dir'], options['validation_cache'])
+    if options['exclude'] is not None or options['adjust']:
+        stock_data = load_stock_data([symbol], options['data_dir'], exclude=options['exclude'],
+                                     validation_cache=options['validation_cache'], adjust=options['adjust'],
+                                     actions_dir=options['actions_dir'])
+    return {'frame': stock_data[symbol], 'spans': spans}
+
+
+def _scale(symbol, inputs, options):
+    from .training import scale_prices
+
+    frame = inputs['validate']['frame']
+    prices = frame[options['start']:options['end']]['4. close']
+    scaled, scaler = scale_prices(prices)
+    return {'prices': prices, 'scaled': scaled, 'scaler': scaler, 'loaded_through': frame.index[-1]}
+
+
+def _window(symbol, inputs, options):
+    from .windows import split_data_week_ahead_with_dates_multi
+
+    names = ['x_train', 'y_train', 'x_test', 'y_test', 'dates_train', 'dates_test']
+    windows = split_data_week_ahead_with_dates_multi(inputs['scale']['scaled'], options['lookback'],
+                                                     options['forecast_horizon'])
+    return dict(zip(names, windows))
+
+
+def _bind_worker(counter, workers):
+    """
+    Bind a new worker process to its own slice of the allowed CPUs.
+
+    The pool starts at most `workers` processes and does not replace them, so each takes
+    a distinct index below workers.
+    """
+    from .performance import cpu_partition
+
+    with counter.get_lock():
+        worker = counter.value
+        counter.value += 1
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpu_partition(worker, workers))
+
+
+def _train(symbol, inputs, options):
+    import torch
+
+    from .performance import pin_threads
+    from .training import artifact_settings, fit_gru, save_trained_model
+
+    # One torch thread per CPU of the worker's slice, instead of oversubscribing them
+    pin_threads()
+    torch.manual_seed(0)
+    windows, scale = inputs['window'], inputs['scale']
+    model, summary = fit_gru(windows['x_train'], windows['y_train'], options['hidden_dim'], options['num_layers'],
+                             options['num_epochs'], options['lr'], labels={'symbol': symbol},
+                             patience=options['patience'], validation_fraction=options['validation_fraction'],
+                             strategy=options['strategy'], block=options['block'], quantiles=options['quantiles'])
+    settings = artifact_settings(scale['loaded_through'], **{name: options[name] for name in (
+        'start', 'end', 'lookback', 'num_epochs', 'lr', 'patience', 'validation_fraction', 'exclude', 'adjust')})
+    summary['artifact'] = save_trained_model(options['model_dir'], symbol, model, scale['scaler'], scale['prices'],
+                                             summary, **settings)
+    return {'summary': summary, 'files': [summary['artifact']]}
+
+
+def _predict(symbol, inputs, options):
+    from .inference import predict_symbol
+
+    return {'forecast': predict_symbol(symbol, options['data_dir'], options['model_dir'])}
+
+
+def _evaluate(symbol, inputs, options):
+    from .evaluation import evaluate_symbol
+
+    return evaluate_symbol(symbol, options['data_dir'], options['model_dir'])
+
+
+def _plot(symbols, inputs, options):
+    from .evaluation import prediction_frames
+    from .rendering import history_jobs, prediction_jobs, render_figures
+
+    jobs = history_jobs({symbol: inputs['validate'][symbol]['frame'] for symbol in symbols},
+                        start=options['start'], end=options['end'])
+    for symbol in symbols:
+        jobs += prediction_jobs(symbol, *prediction_frames(symbol, options['data_dir'], options['model_dir']))
+    # render_figures skips the figures whose inputs are unchanged
+    summary = render_figures(jobs, options['output_dir'], max_workers=options['max_workers'])
+    if summary['failed']:
+        raise RuntimeError(f"{len(summary['failed'])} figures failed, e.g. {next(iter(summary['failed'].items()))}")
+    return {'rendered': len(summary['rendered']), 'skipped': len(summary['skipped'])}
+
+
+_STAGE_FUNCTIONS = {
+    'fetch': _fetch,
+    'validate': _validate,
+    'scale': _scale,
+    'window': _window,
+    'train': _train,
+    'predict': _predict,
+    'evaluate': _evaluate,
+    'plot': _plot,
+}
+
+
+def _file_checksums(paths):
+    from .validation import file_checksum
+
+    return {path: file_checksum(path) for path in paths}
+
+
+def _run_node(stage_name, symbol, input_paths, output_path, options):
+    """
+    Run one node from the cached outputs of its dependencies and cache its output.
+
+    Returns:
+    tuple: (checksums of the files the node wrote outside the cache, like model artifacts, seconds taken)
+    """
+    started = time.perf_counter()
+    inputs = {}
+    for dep, paths in input_paths.items():
+        if isinstance(paths, dict):
+            inputs[dep] = {}
+            for dep_symbol, path in paths.items():
+                with open(path, 'rb') as file:
+                    inputs[dep][dep_symbol] = pickle.load(file)
+        else:
+            with open(paths, 'rb') as file:
+                inputs[dep] = pickle.load(file)
+
+    output = _STAGE_FUNCTIONS[stage_name](symbol, inputs, options)
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path + '.tmp', 'wb') as file:
+        pickle.dump(output, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(output_path + '.tmp', output_path)
+    return _file_checksums(output.get('files', [])), time.perf_counter() - started
+
+
+def _read_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def _write_manifest(path, manifest):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def _is_cached(entry, key, output_path):
+    if entry is None or entry['key'] != key or not os.path.exists(output_path):
+        return False
+    # Files written outside the cache must still be the ones the node wrote
+    return all(os.path.exists(path) for path in entry['files']) and _file_checksums(entry['files']) == entry['files']
+
+
+def _select_stages(stages):
+    if stages is None:
+        return list(STAGES)
+    unknown = sorted(set(stages) - set(STAGE_NAMES))
+    if unknown:
+        raise ValueError(f"Unknown pipeline stages {unknown}, choose from {STAGE_NAMES}")
+    # Add the dependencies of the requested stages
+    selected = set(stages)
+    for stage in reversed(STAGES):
+        if stage.name in selected:
+            selected.update(stage.deps)
+    return [stage for stage in STAGES if stage.name in selected]
+
+
+def run_pipeline(symbols, data_dir='.', model_dir='models', output_dir='reports', cache_dir='.pipeline_cache',
+                 stages=None, fetch=False, api_key_file='AlphaVantage.txt', max_workers=None, force=False,
+                 validation_cache='.validation_cache', actions_dir='corporate_actions', **options):
+    """
+    Run the pipeline stages of every symbol, skipping the nodes whose inputs are unchanged.
+
+    Parameters:
+    symbols (list): The stock symbols.
+    data_dir (str): The directory holding the CSV files.
+    model_dir (str): The directory the model artifacts are written to.
+    output_dir (str): The directory the figures are written to.
+    cache_dir (str): The directory holding the cached stage outputs and their manifest.
+    stages (iterable): Names of the stages to run (with their dependencies), all by default.
+    fetch (bool): Download the latest daily data first; otherwise fetch only picks up the CSV files.
+    api_key_file (str): The file holding the Alpha Vantage API key.
+    max_workers (int): Number of worker processes, os.cpu_count() by default.
+    force (bool): Rerun every node even if its inputs are unchanged.
+    validation_cache (str): Directory of the cached screening results.
+    actions_dir (str): The directory holding the corporate-action files.
+    options: Overrides of DEFAULT_OPTIONS, e.g. num_epochs=20 or exclude=['zero_volume'].
+
+    Returns:
+    dict: 'ran' and 'cached' lists of nodes ('<stage>/<symbol>', or 'plot'), 'failed' mapping
+    nodes to error messages, 'blocked' nodes whose dependencies failed, and 'seconds' per node run.
+    """
+    unknown = sorted(set(options) - set(DEFAULT_OPTIONS))
+    if unknown:
+        raise TypeError(f"Unknown pipeline options {unknown}")
+    max_workers = max_workers or os.cpu_count() or 1
+    options = dict(DEFAULT_OPTIONS, **options, fetch=fetch, api_key_file=api_key_file, data_dir=data_dir,
+                   model_dir=model_dir, output_dir=output_dir, validation_cache=validation_cache,
+                   actions_dir=actions_dir, max_workers=max_workers)
+
+    stages = _select_stages(stages)
+    manifest_path = os.path.join(cache_dir, MANIFEST_NAME)
+    manifest = _read_manifest(manifest_path)
+    summary = {'ran': [], 'cached': [], 'failed': {}, 'blocked': [], 'seconds': {}}
+    keys, status = {}, {}
+
+    # Nodes in stage order, so every node comes after its dependencies
+    pending = [(stage, symbol) for stage in stages for symbol in (symbols if stage.per_symbol else [None])]
+
+    def dependencies(stage, symbol):
+        if stage.per_symbol:
+            return {dep: _node(dep, symbol) for dep in stage.deps}
+        # A stage over all symbols waits for every symbol, then runs on those whose own nodes succeeded
+        if any(status.get(_node(dep, name)) is None for dep in stage.deps for name in symbols):
+            return None
+        ready = [name for name in symbols if all(status.get(_node(dep, name)) in ('ran', 'cached')
+                                                 for dep in stage.deps)]
+        return {dep: {name: _node(dep, name) for name in ready} for dep in stage.deps}
+
+    def finish(node, state, key=None, files=None, error=None, seconds=None):
+        status[node] = state
+        if state == 'failed':
+            summary['failed'][node] = error
+            manifest.pop(node, None)
+        else:
+            summary[state].append(node)
+        if state == 'ran':
+            keys[node] = key
+            summary['seconds'][node] = seconds
+            manifest[node] = {'key': key, 'files': files}
+            _write_manifest(manifest_path, manifest)
+        elif state == 'cached':
+            keys[node] = key
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, initializer=_bind_worker,
+                                                initargs=(multiprocessing.Value('i', 0), max_workers)) as executor:
+        running = {}
+        while pending or running:
+            progressed = False
+            for stage, symbol in list(pending):
+                node = _node(stage.name, symbol)
+                deps = dependencies(stage, symbol)
+                if deps is None:
+                    continue
+                dep_nodes = [name for dep in deps.values()
+                             for name in (dep.values() if isinstance(dep, dict) else [dep])]
+                if any(status.get(name) is None for name in dep_nodes):
+                    continue
+                pending.remove((stage, symbol))
+                progressed = True
+                if any(status[name] in ('failed', 'blocked') for name in dep_nodes):
+                    finish(node, 'blocked')
+                    continue
+
+                output_path = _output_path(cache_dir, node)
+                input_paths = {dep: ({name: _output_path(cache_dir, path) for name, path in paths.items()}
+                                     if isinstance(paths, dict) else _output_path(cache_dir, paths))
+                               for dep, paths in deps.items()}
+                if stage.deps:
+                    key = _key(stage, symbol, options, sorted(keys[name] for name in dep_nodes))
+                    if not force and _is_cached(manifest.get(node), key, output_path):
+                        finish(node, 'cached', key)
+                        continue
+
+                if stage.deps and stage.per_symbol:
+                    running[executor.submit(_run_node, stage.name, symbol, input_paths, output_path, options)] = (
+                        node, key)
+                    continue
+
+                # fetch and plot run here: fetch to keep the downloads sequential, plot with its own pool
+                try:
+                    target = symbol if stage.per_symbol else list(deps[stage.deps[0]])
+                    files, seconds = _run_node(stage.name, target, input_paths, output_path, options)
+                except Exception as e:
+                    finish(node, 'failed', error=f'{type(e).__name__}: {e}')
+                    continue
+                if not stage.deps:
+                    # A source node is keyed by the content it produced
+                    with open(output_path, 'rb') as file:
+                        key = _key(stage, symbol, options, [pickle.load(file)['checksum']])
+                    if not force and manifest.get(node, {}).get('key') == key:
+                        finish(node, 'cached', key)
+                        continue
+                finish(node, 'ran', key, files, seconds=seconds)
+
+            if running and not progressed:
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    node, key = running.pop(future)
+                    try:
+                        files, seconds = future.result()
+                    except Exception as e:
+                        finish(node, 'failed', error=f'{type(e).__name__}: {e}')
+                    else:
+                        finish(node, 'ran', key, files, seconds=seconds)
+
+    return summary
+
+
+def stage_output(cache_dir, stage, symbol=None):
+    """
+    Read the cached output of a pipeline node.
+
+    Parameters:
+    cache_dir (str): The pipeline cache directory passed to run_pipeline.
+    stage (str): The stage name, e.g. 'predict'.
+    symbol (str): The stock symbol; None for the plot stage.
+
+    Returns:
+    The output of the stage, e.g. {'forecast': [(date, price), ...]} for predict.
+    """
+    with open(_output_path(cache_dir, _node(stage, symbol)), 'rb') as file:
+        return pickle.load(file)
@@ -0,0 +1,182 @@
+"""
+Figures for the price history and the forecasts.
+
+matplotlib is imported inside the functions that use it, so a caller (such as the
+batch renderer) can select a non-interactive backend first.
+"""
+import pandas as pd
+import plotly.graph_objects as go
+
+from .downsampling import downsample_series
+
+# Points kept per plotly trace; LTTB keeps the shape of longer series
+DEFAULT_MAX_POINTS = 2000
+
+
+def plot_prediction_for_day(train_predict, train_original, test_predict, test_original, day_number, symbol='PLUG', show=True,
+                            max_points=DEFAULT_MAX_POINTS, x_range=None):
+    """
+    Plot the train and test predictions against the actual values for one forecast day.
+
+    Every trace is downsampled to at most max_points points with LTTB, so the figure
+    size does not grow with the history length. To zoom in at full resolution, plot
+    again with an x_range: the point budget is then spent on that range only.
+
+    Parameters:
+    train_predict, train_original, test_predict, test_original (dict): DataFrames keyed by
+        "Day N", as built by the post-processing of the multi-day model.
+    day_number (int): The forecast day to plot, from 1 to 7.
+    symbol (str): The stock symbol shown in the title.
+    show (bool): Whether to display the figure interactively.
+    max_points (int): Points kept per trace, or None to plot every point.
+    x_range (tuple): (start, end) dates to plot (partial dates allowed), or None for all of them.
+
+    Returns:
+    Figure: The plotly figure, or None if day_number is out of range.
+    """
+    # Validating day_number
+    if day_number < 1 or day_number > 7:
+        print("Day number must be between 1 and 7.")
+        return
+
+    day_key = f"Day {day_number}"
+
+    # Extracting data for the specified day
+    day_train_pred = train_predict[day_key]
+    day_train_orig = train_original[day_key]
+    day_test_pred = test_predict[day_key]
+    day_test_orig = test_original[day_key]
+
+    # Combining train and test data for a continuous plot
+    full_orig = pd.concat([day_train_orig, day_test_orig])
+
+    # Restricting to the zoomed range, then downsampling what remains
+    traces = {
+        'Train Prediction': day_train_pred[f'Predicted {day_key}'],
+        'Test Prediction': day_test_pred[f'Predicted {day_key}'],
+        'Actual Value': full_orig[f'Actual {day_key}'],
+    }
+    if x_range is not None:
+        traces = {name: values.sort_index().loc[x_range[0]:x_range[1]] for name, values in traces.items()}
+
+    # Creating the figure object
+    fig = go.Figure()
+
+    # Adding traces for train prediction, test prediction, and actual values
+    for name, values in traces.items():
+        values = downsample_series(values, max_points)
+        fig.add_trace(go.Scatter(x=values.index, y=values.values, mode='lines', name=name))
+
+    # Updating layout for aesthetics
+    fig.update_layout(
+        xaxis=dict(
+            showline=True,
+            showgrid=True,
+            showticklabels=True,  # Show tick labels for dates
+            linecolor='rgb(204, 204, 204)',
+            linewidth=2,
+            ticks='outside',
+            tickfont=dict(
+                family='Arial',
+                size=12,
+                color='rgb(82, 82, 82)',
+            ),
+        ),
+        yaxis=dict(
+            title=dict(
+                text='Close (USD)',
+                font=dict(
+                    family='Arial',
+                    size=12,
+                    color='rgb(82, 82, 82)',
+                ),
+            ),
+            showline=True,
+            showgrid=True,
+            showticklabels=True,
+            linecolor='rgb(204, 204, 204)',
+            linewidth=2,
+        ),
+        showlegend=True,
+        template='plotly_dark',
+    )
+
+    # Adding a title to the plot
+    fig.update_layout(title_text=f'{symbol} Stock Prediction for {day_key}', title_x=0.5)
+
+    # Showing the figure
+    if show:
+        fig.show()
+    return fig
+
+
+def plot_close_price(prices, symbol='PLUG'):
+    """
+    Plot the closing prices of a stock with quarterly date ticks.
+
+    Parameters:
+    prices (Series): Closing prices indexed by date.
+    symbol (str): The stock symbol shown in the title.
+
+    Returns:
+    Figure: The matplotlib figure.
+    """
+    import matplotlib.dates as mdates
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(15, 9))
+    ax.plot(prices)
+
+    # Set major ticks to the first month of each quarter, printed as 'year-month'
+    ax.xaxis.set_major_locator(mdates.MonthLocator(bymonth=(1, 4, 7, 10)))
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m'))
+
+    ax.set_title(f"{symbol} Stock Price", fontsize=18, fontweight='bold')
+    ax.set_xlabel('Date', fontsize=18)
+    ax.set_ylabel('Close Price (USD)', fontsize=18)
+    plt.setp(ax.get_xticklabels(), rotation=45, ha="right")
+    return fig
+
+
+def plot_window_functions(prices, symbol='PLUG', window=None):
+    """
+    Plot a price series with its rolling (or expanding) mean and standard deviation.
+
+    Parameters:
+    prices (Series): Prices indexed by date.
+    symbol (str): The stock symbol shown in the title and legend.
+    window (int): Size of the rolling window, or None for expanding window functions.
+
+    Returns:
+    Figure: The matplotlib figure.
+    """
+    import matplotlib.pyplot as plt
+
+    windowed = prices.expanding() if window is None else prices.rolling(window)
+    fig, ax = plt.subplots()
+    prices.plot(ax=ax)
+    windowed.mean().plot(ax=ax)
+    windowed.std().plot(ax=ax)
+    ax.set_title(f"{symbol} {'Expanding' if window is None else 'Rolling'} Window Functions")
+    ax.legend([symbol, f'{symbol} Rolling Mean', f'{symbol} Standard Deviation'])
+    return fig
+
+
+def plot_decomposition(prices, symbol='PLUG', period=252):
+    """
+    Plot the trend, seasonal and residual components of a price series.
+
+    Parameters:
+    prices (Series): Prices indexed by date.
+    symbol (str): The stock symbol shown in the title.
+    period (int): Length of the seasonal cycle in trading days (252 is about a year).
+
+    Returns:
+    Figure: The matplotlib figure.
+    """
+    from statsmodels.tsa.seasonal import seasonal_decompose
+
+    fig = seasonal_decompose(prices, period=period).plot()
+    fig.set_size_inches(11, 9)
+    fig.axes[0].set_title(f'Time Series Decomposition of {symbol} Stock High Prices', fontsize=12)
+    return fig
@@ -0,0 +1,306 @@
+"""
+A columnar store of predictions, one row per (window, forecast day).
+
+Rows hold the symbol, the as-of date (the last input day of the window), the
+horizon (1 for the next trading day), the target date, the predicted and actual
+prices, the model version, whether the window was used for training or testing, and
+when the row was appended. The latter orders repeated forecasts of the same window,
+since neither queries nor compact() keep the order of the files.
+
+The store is a directory of Parquet files partitioned by symbol
+(root/symbol=PLUG/<run>.parquet). Every append writes new files, so earlier runs are
+never rewritten, and each file is sorted by target date so the Parquet row group
+statistics let date range queries skip the rest. Queries by symbol only open the
+matching partitions. compact() merges the files of a partition when appends pile up.
+
+Usage:
+    store = PredictionStore('predictions')
+    store.append(predictions_table('PLUG', predicted, actual, target_dates, as_of, 'v1', split='test'))
+    frame = store.query(['PLUG'], start='2023-01', end='2023-06', horizons=[7])
+"""
+import datetime
+import os
+import uuid
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+SCHEMA = pa.schema([
+    ('symbol', pa.string()),
+    ('as_of', pa.date32()),
+    ('horizon', pa.int16()),
+    ('target_date', pa.date32()),
+    ('predicted', pa.float64()),
+    ('actual', pa.float64()),
+    ('model_version', pa.string()),
+    ('split', pa.string()),
+    ('written_at', pa.timestamp('us')),
+])
+
+# Attributions of the forecasts, keyed like the prediction rows: 'attribution' holds the
+# importance of every input timestep and feature, flattened row-major (lookback, features)
+ATTRIBUTION_SCHEMA = pa.schema([
+    ('symbol', pa.string()),
+    ('as_of', pa.date32()),
+    ('horizon', pa.int16()),
+    ('target_date', pa.date32()),
+    ('model_version', pa.string()),
+    ('split', pa.string()),
+    ('features', pa.int16()),
+    ('attribution', pa.list_(pa.float32())),
+])
+
+# Directory of the attributions inside a prediction store; the leading underscore keeps
+# pyarrow's dataset discovery of the predictions out of it
+ATTRIBUTIONS_DIR = '_attributions'
+
+# Rows per Parquet row group; smaller groups make date range pruning finer
+ROW_GROUP_SIZE = 16384
+
+
+def predictions_table(symbol, predicted, actual, target_dates, as_of, model_version, split=None):
+    """
+    Build the Arrow table of a batch of windows.
+
+    Parameters:
+    symbol (str): The stock symbol.
+    predicted (ndarray): Predicted prices of shape (windows, horizon).
+    actual (ndarray): Actual prices of the same shape, or None when they are not known yet.
+    target_dates (array-like): Target dates of shape (windows, horizon); the per-window date
+        lists returned by split_data_week_ahead_with_dates_multi are accepted as is.
+    as_of (array-like): The as-of date of every window (see windows.window_dates).
+    model_version (str): Identifies the model that made the predictions.
+    split (str): 'train', 'test', or None for live forecasts.
+
+    Returns:
+    Table: One row per window and forecast day, in the store schema.
+    """
+    predicted = np.asarray(predicted, dtype=np.float64)
+    windows, horizon = predicted.shape
+    target_dates = np.asarray(target_dates, dtype='datetime64[D]').reshape(windows, horizon)
+    as_of = np.asarray(as_of, dtype='datetime64[D]').reshape(windows)
+    if actual is None:
+        actual = np.full(predicted.shape, np.nan)
+
+    size = windows * horizon
+    return pa.table({
+        'symbol': pa.array([symbol] * size, pa.string()),
+        'as_of': pa.array(np.repeat(as_of, horizon)),
+        'horizon': pa.array(np.tile(np.arange(1, horizon + 1, dtype=np.int16), windows)),
+        'target_date': pa.array(target_dates.ravel()),
+        'predicted': pa.array(predicted.ravel()),
+        'actual': pa.array(np.asarray(actual, dtype=np.float64).ravel(), from_pandas=True),
+        'model_version': pa.array([model_version] * size, pa.string()),
+        'split': pa.array([split] * size, pa.string()),
+        'written_at': pa.nulls(size, pa.timestamp('us')),
+    }, schema=SCHEMA)
+
+
+class PredictionStore:
+    """
+    An appendable, symbol-partitioned Parquet store of predictions.
+    """
+
+    schema = SCHEMA
+
+    def __init__(self, root):
+        self.root = root
+
+    def attributions(self):
+        """
+        Return the store of the forecast attributions kept alongside these predictions.
+        """
+        return AttributionStore(os.path.join(self.root, ATTRIBUTIONS_DIR))
+
+    def _partition(self, symbol):
+        return os.path.join(self.root, f'symbol={symbol}')
+
+    def _write(self, table, directory, name):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, name)
+        # The symbol is encoded in the directory name
+        pq.write_table(table.drop_columns(['symbol']), path + '.tmp', row_group_size=ROW_GROUP_SIZE)
+        os.replace(path + '.tmp', path)
+        return path
+
+    def append(self, table):
+        """
+        Append predictions, writing one new file per symbol.
+
+        Parameters:
+        table (Table or DataFrame): Rows in the store schema, e.g. from predictions_table; a
+            written_at column is set to the time of this append.
+
+        Returns:
+        list: The paths of the files written.
+        """
+        now = datetime.datetime.now()
+        stamped = 'written_at' in self.schema.names
+        schema = pa.schema([field for field in self.schema if field.name != 'written_at'])
+        if not isinstance(table, pa.Table):
+            table = pa.Table.from_pandas(table.drop(columns='written_at', errors='ignore'), schema=schema,
+                                         preserve_index=False)
+        table = table.select(schema.names).cast(schema)
+        if stamped:
+            table = table.append_column('written_at', pa.array(np.full(len(table), np.datetime64(now, 'us'))))
+
+        run = f"{now:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.parquet"
+        paths = []
+        for symbol in table.column('symbol').unique().to_pylist():
+            rows = table.filter(pc.equal(table.column('symbol'), symbol))
+            rows = rows.sort_by([('target_date', 'ascending'), ('horizon', 'ascending')])
+            paths.append(self._write(rows, self._partition(symbol), run))
+        return paths
+
+    def dataset(self, symbols=None):
+        """
+        Open the store as a pyarrow dataset, restricted to the given symbols' partitions.
+        """
+        if symbols is None:
+            source = self.root
+        else:
+            source = [os.path.join(self._partition(symbol), name) for symbol in symbols
+                      if os.path.isdir(self._partition(symbol)) for name in sorted(os.listdir(self._partition(symbol)))
+                      if name.endswith('.parquet')]
+        return ds.dataset(source, schema=self.schema, format='parquet', partitioning='hive',
+                          partition_base_dir=self.root)
+
+    def query(self, symbols=None, start=None, end=None, horizons=None, model_version=None, split=None,
+              date_field='target_date', columns=None):
+        """
+        Read the predictions matching the given filters.
+
+        Parameters:
+        symbols (list): Symbols to read, all of them by default.
+        start, end (str or date): Inclusive date range (partial dates like '2023-01' allowed).
+        horizons (list): Forecast days to read, e.g. [7].
+        model_version (str): Only read the predictions of this model version.
+        split (str): Only read 'train' or 'test' predictions.
+        date_field (str): 'target_date' or 'as_of', the field the date range applies to.
+        columns (list): Columns to read, all of them by default.
+
+        Returns:
+        DataFrame: The matching rows, sorted by symbol, target date and horizon.
+        """
+        import pandas as pd
+
+        if not os.path.isdir(self.root):
+            return pd.DataFrame({field.name: pd.Series(dtype=field.type.to_pandas_dtype()) for field in self.schema})
+
+        field = ds.field(date_field)
+        conditions = []
+        if start is not None:
+            conditions.append(field >= pa.scalar(_date_bound(start), pa.date32()))
+        if end is not None:
+            conditions.append(field <= pa.scalar(_date_bound(end, end=True), pa.date32()))
+        if horizons is not None:
+            conditions.append(ds.field('horizon').isin(list(horizons)))
+        if model_version is not None:
+            conditions.append(ds.field('model_version') == model_version)
+        if split is not None:
+            conditions.append(ds.field('split') == split)
+
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+
+        table = self.dataset(symbols).to_table(columns=columns, filter=expression)
+        sort_keys = [(name, 'ascending') for name in ('symbol', 'target_date', 'horizon') if name in table.column_names]
+        return table.sort_by(sort_keys).to_pandas(date_as_object=False)
+
+    def compact(self, symbols=None):
+        """
+        Merge the files of each symbol's partition into one file sorted by target date.
+
+        Parameters:
+        symbols (list): Symbols to compact, all of them by default.
+
+        Returns:
+        list: The paths of the merged files.
+        """
+        if symbols is None:
+            symbols = self.symbols()
+        paths = []
+        for symbol in symbols:
+            directory = self._partition(symbol)
+            files = sorted(name for name in os.listdir(directory) if name.endswith('.parquet'))
+            if len(files) < 2:
+                continue
+            table = self.dataset([symbol]).to_table().sort_by([('target_date', 'ascending'), ('horizon', 'ascending')])
+            # Keep the name of the newest run so the file order stays chronological
+            merged = self._write(table, directory, f'{files[-1][:-len(".parquet")]}-compacted.parquet')
+            for name in files:
+                os.remove(os.path.join(directory, name))
+            paths.append(merged)
+        return paths
+
+    def symbols(self):
+        """
+        List the symbols with predictions in the store.
+        """
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name[len('symbol='):] for name in os.listdir(self.root) if name.startswith('symbol='))
+
+
+class AttributionStore(PredictionStore):
+    """
+    The attributions of a prediction store, with the same partitioning and queries.
+
+    Usage:
+        attributions = PredictionStore('predictions').attributions()
+        rows = attributions.query(['PLUG'], horizons=[7], split='test')
+        importances = attribution_arrays(rows, lookback=20)
+    """
+
+    schema = ATTRIBUTION_SCHEMA
+
+
+def attribution_arrays(rows, lookback):
+    """
+    Stack the attributions of queried rows into one array.
+
+    Parameters:
+    rows (DataFrame): Rows from AttributionStore.query, all with the same window shape.
+    lookback (int): Number of input days per window.
+
+    Returns:
+    ndarray: float32 importances of shape (rows, lookback, features).
+    """
+    if len(rows) == 0:
+        return np.empty((0, lookback, 1), dtype=np.float32)
+    values = np.stack([np.asarray(row, dtype=np.float32) for row in rows['attribution']])
+    return values.reshape(len(rows), lookback, int(rows['features'].iloc[0]))
+
+
+def _date_bound(value, end=False):
+    """
+    Convert a (partial) date to the first or last day it covers, as pandas string slicing does.
+    """
+    import pandas as pd
+
+    text = str(value)
+    # '2023' is a year, '2023-01' a month, anything longer a day
+    period = pd.Period(text, {4: 'Y', 7: 'M'}.get(len(text), 'D'))
+    return (period.end_time if end else period.start_time).date()
+
+
+def store_daily_frames(predictions):
+    """
+    Pivot store rows into the "Day N" DataFrame dictionaries plot_prediction_for_day expects.
+
+    Parameters:
+    predictions (DataFrame): Rows of a single symbol and model version, from PredictionStore.query.
+
+    Returns:
+    tuple: (predict, original) dictionaries of DataFrames indexed by target date.
+    """
+    predict, original = {}, {}
+    for horizon, rows in predictions.groupby('horizon', sort=True):
+        rows = rows.set_index('target_date').rename_axis(None)
+        predict[f"Day {horizon}"] = rows[['predicted']].rename(columns={'predicted': f"Predicted Day {horizon}"})
+        original[f"Day {horizon}"] = rows[['actual']].rename(columns={'actual': f"Actual Day {horizon}"})
+    return predict, original
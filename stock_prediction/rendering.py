@@ -0,0 +1,219 @@
+"""
+Headless batch rendering of the figures to PNG and HTML files.
+
+Figures are described as RenderJob tuples and drawn by a pool of worker processes
+that use the non-interactive Agg backend, so no window is ever opened. Every job
+carries a content hash of its inputs; a manifest in the output directory records
+the hash each file was drawn from, and jobs whose hash is unchanged are skipped.
+
+Usage:
+    jobs = history_jobs(stock_data) + prediction_jobs('PLUG', *prediction_frames('PLUG'))
+    summary = render_figures(jobs, 'reports')
+"""
+import collections
+import concurrent.futures
+import hashlib
+import json
+import os
+
+# Bump when the figure functions change, so every figure is redrawn
+RENDER_VERSION = 2
+MANIFEST_NAME = 'render_manifest.json'
+
+# Figure kinds drawn from the price history, and the column each one plots
+HISTORY_KINDS = {
+    'close': '4. close',
+    'rolling': '2. high',
+    'expanding': '2. high',
+    'decomposition': '2. high',
+}
+
+RenderJob = collections.namedtuple('RenderJob', ['path', 'kind', 'symbol', 'inputs', 'options'])
+RenderJob.__doc__ = """
+A figure to draw.
+
+path (str): File name relative to the output directory; the extension picks the format.
+kind (str): 'prediction' or one of HISTORY_KINDS.
+symbol (str): The stock symbol shown in the figure.
+inputs (dict): The pandas objects the figure is drawn from.
+options (dict): JSON-serialisable keyword options of the figure function.
+"""
+
+
+def _hash_inputs(digest, value):
+    import pandas as pd
+
+    if isinstance(value, dict):
+        for key in sorted(value):
+            digest.update(str(key).encode())
+            _hash_inputs(digest, value[key])
+    elif isinstance(value, (pd.Series, pd.DataFrame)):
+        digest.update(repr(list(value.columns) if isinstance(value, pd.DataFrame) else value.name).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    else:
+        digest.update(repr(value).encode())
+
+
+def job_hash(job):
+    """
+    Compute the content hash of a render job.
+
+    Parameters:
+    job (RenderJob): The job to hash.
+
+    Returns:
+    str: A sha256 hex digest of the kind, symbol, options and inputs.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([RENDER_VERSION, job.kind, job.symbol, job.options], sort_keys=True).encode())
+    _hash_inputs(digest, job.inputs)
+    return digest.hexdigest()
+
+
+def history_jobs(stock_data, kinds=tuple(HISTORY_KINDS), start='2019', end='2024', window=50, period=252):
+    """
+    Describe the price history figures of every symbol.
+
+    Parameters:
+    stock_data (dict): DataFrames keyed by symbol, as returned by load_stock_data.
+    kinds (iterable): The figure kinds to draw, from HISTORY_KINDS.
+    start, end (str): Date range plotted (partial dates allowed).
+    window (int): Size of the rolling window.
+    period (int): Seasonal period of the decomposition, in trading days.
+
+    Returns:
+    list: RenderJob tuples writing '<symbol>/<kind>.png'.
+    """
+    jobs = []
+    for symbol, frame in stock_data.items():
+        for kind in kinds:
+            prices = frame[start:end][HISTORY_KINDS[kind]]
+            options = {'window': window} if kind == 'rolling' else {'period': period} if kind == 'decomposition' else {}
+            jobs.append(RenderJob(f'{symbol}/{kind}.png', kind, symbol, {'prices': prices}, options))
+    return jobs
+
+
+def prediction_jobs(symbol, train_predict, train_original, test_predict, test_original, days=None):
+    """
+    Describe the per-day prediction figures of one symbol.
+
+    Each job only carries the DataFrames of its own day, so changing one horizon
+    does not redraw the others.
+
+    Parameters:
+    symbol (str): The stock symbol.
+    train_predict, train_original, test_predict, test_original (dict): DataFrames keyed by
+        "Day N", as returned by prediction_frames.
+    days (iterable): The forecast days to draw, all of them by default.
+
+    Returns:
+    list: RenderJob tuples writing '<symbol>/prediction_day<N>.html'.
+    """
+    if days is None:
+        days = range(1, len(train_predict) + 1)
+
+    jobs = []
+    for day in days:
+        day_key = f"Day {day}"
+        inputs = {name: {day_key: frames[day_key]} for name, frames in (
+            ('train_predict', train_predict), ('train_original', train_original),
+            ('test_predict', test_predict), ('test_original', test_original))}
+        jobs.append(RenderJob(f'{symbol}/prediction_day{day}.html', 'prediction', symbol, inputs, {'day_number': day}))
+    return jobs
+
+
+def _init_worker():
+    # Select the non-interactive backend before anything imports pyplot
+    import matplotlib
+
+    matplotlib.use('Agg', force=True)
+
+
+def _draw(job):
+    from . import plotting
+
+    if job.kind == 'prediction':
+        return plotting.plot_prediction_for_day(**job.inputs, **job.options, symbol=job.symbol, show=False)
+    if job.kind == 'close':
+        return plotting.plot_close_price(job.inputs['prices'], job.symbol)
+    if job.kind == 'rolling':
+        return plotting.plot_window_functions(job.inputs['prices'], job.symbol, **job.options)
+    if job.kind == 'expanding':
+        return plotting.plot_window_functions(job.inputs['prices'], job.symbol)
+    if job.kind == 'decomposition':
+        return plotting.plot_decomposition(job.inputs['prices'], job.symbol, **job.options)
+    raise ValueError(f"Unknown figure kind: {job.kind}")
+
+
+def _render_job(job, path):
+    figure = _draw(job)
+    # Write next to the target and rename, so a crash never leaves a truncated figure
+    temporary = f'{path}.tmp{os.path.splitext(path)[1]}'
+    if hasattr(figure, 'write_html'):
+        figure.write_html(temporary, include_plotlyjs='cdn')
+    else:
+        import matplotlib.pyplot as plt
+
+        figure.savefig(temporary, dpi=100, bbox_inches='tight')
+        plt.close(figure)
+    os.replace(temporary, path)
+    return path
+
+
+def _read_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def render_figures(jobs, output_dir, max_workers=None, force=False):
+    """
+    Draw the figures of the given jobs into output_dir using a process pool.
+
+    Jobs whose content hash matches the manifest, and whose file still exists,
+    are skipped without starting a worker.
+
+    Parameters:
+    jobs (iterable): RenderJob tuples.
+    output_dir (str): The directory the figures and the manifest are written to.
+    max_workers (int): Number of worker processes, os.cpu_count() by default.
+    force (bool): Redraw every figure even if its inputs are unchanged.
+
+    Returns:
+    dict: 'rendered' and 'skipped' lists of paths, and 'failed' mapping paths to error messages.
+    """
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = _read_manifest(manifest_path)
+    summary = {'rendered': [], 'skipped': [], 'failed': {}}
+
+    pending = []
+    for job in jobs:
+        path = os.path.join(output_dir, job.path)
+        digest = job_hash(job)
+        if not force and manifest.get(job.path) == digest and os.path.exists(path):
+            summary['skipped'].append(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            pending.append((job, path, digest))
+
+    if pending:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as executor:
+            futures = {executor.submit(_render_job, job, path): (job, path, digest) for job, path, digest in pending}
+            for future in concurrent.futures.as_completed(futures):
+                job, path, digest = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    summary['failed'][path] = f'{type(e).__name__}: {e}'
+                    manifest.pop(job.path, None)
+                else:
+                    summary['rendered'].append(path)
+                    manifest[job.path] = digest
+
+        os.makedirs(output_dir, exist_ok=True)
+        with open(manifest_path + '.tmp', 'w') as file:
+            json.dump(manifest, file, indent=2, sort_keys=True)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+    return summary
@@ -0,0 +1,161 @@
+"""
+Vectorized assembly of the forecasts of many symbols.
+
+A model forecasts scaled prices. The prices were scaled with an affine map,
+scaled = price * scale + min, whose parameters the artifact stores, so undoing it is
+one broadcast over a whole (windows, horizon, symbols) array. There is no need to go
+through MinMaxScaler.inverse_transform, which was fitted on a single column.
+
+The target dates need no per-window lists either. Window i reads the lookback days
+before its first target day, so with the integer offset of that day into the dates
+of the series, the target dates of every window and forecast day are
+dates[offsets[:, None] + arange(horizon)] and the as-of dates are dates[offsets - 1].
+Assembling the prediction store rows of thousands of symbols that share a calendar
+(a PricePanel) is then a handful of array operations.
+
+Usage:
+    offsets = window_offsets(panel.shape[0], lookback=20, forecast_horizon=7)
+    table = assemble_predictions(panel.symbols, predicted, actual, panel.dates, offsets,
+                                 scale, minimum, model_versions, split='test', valid=valid)
+"""
+import numpy as np
+
+
+def scaling_params(configs):
+    """
+    Collect the affine scaling parameters of several artifacts or fitted scalers.
+
+    Parameters:
+    configs (list): Artifact configs (with 'scale' and 'min') or MinMaxScaler instances
+        fitted on one column, one per symbol.
+
+    Returns:
+    tuple: (scale, minimum) float64 arrays of shape (symbols,).
+    """
+    scale, minimum = [], []
+    for config in configs:
+        if isinstance(config, dict):
+            scale.append(config['scale'])
+            minimum.append(config['min'])
+        else:
+            scale.append(config.scale_[0])
+            minimum.append(config.min_[0])
+    return np.asarray(scale, dtype=np.float64), np.asarray(minimum, dtype=np.float64)
+
+
+def inverse_scale(values, scale, minimum):
+    """
+    Undo the scaling of prices: (values - minimum) / scale.
+
+    Parameters:
+    values (ndarray): Scaled prices of any shape whose last axis is the symbols, e.g.
+        (windows, horizon, symbols); with scalar parameters, of any shape.
+    scale (float or ndarray): Scale per symbol, broadcast over the last axis.
+    minimum (float or ndarray): Offset per symbol, broadcast over the last axis.
+
+    Returns:
+    ndarray: The prices in USD, as float64.
+    """
+    return (np.asarray(values, dtype=np.float64) - minimum) / scale
+
+
+def window_offsets(length, lookback, forecast_horizon, start=0, count=None):
+    """
+    Compute the position of every window's first target day in a series of `length` days.
+
+    Parameters:
+    length (int): Number of days in the series.
+    lookback (int): Number of input days per window.
+    forecast_horizon (int): Number of days predicted per window.
+    start (int): Position of the first window, e.g. the number of train windows for the test ones.
+    count (int): Number of windows, all remaining ones by default.
+
+    Returns:
+    ndarray: int64 offsets of shape (count,).
+    """
+    if count is None:
+        count = length - lookback - forecast_horizon + 1 - start
+    return np.arange(start, start + count, dtype=np.int64) + lookback
+
+
+def target_dates(dates, offsets, forecast_horizon):
+    """
+    Look up the as-of and target dates of windows from their offsets.
+
+    Parameters:
+    dates (array-like): The dates of the series, of shape (days,).
+    offsets (ndarray): Positions of the windows' first target days, see window_offsets.
+    forecast_horizon (int): Number of days predicted per window.
+
+    Returns:
+    tuple: (as_of, targets) datetime64[D] arrays of shapes (windows,) and (windows, forecast_horizon).
+    """
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    offsets = np.asarray(offsets, dtype=np.int64)
+    return dates[offsets - 1], dates[offsets[:, None] + np.arange(forecast_horizon)]
+
+
+def assemble_predictions(symbols, predicted, actual, dates, offsets, scale, minimum, model_version, split=None,
+                         valid=None):
+    """
+    Build the prediction store rows of many symbols from scaled forecasts.
+
+    Parameters:
+    symbols (list): The stock symbols, in the order of the last axis.
+    predicted (ndarray): Scaled forecasts of shape (windows, horizon, symbols).
+    actual (ndarray): Scaled targets of the same shape, or None for live forecasts.
+    dates (array-like): The dates shared by the symbols' series, of shape (days,).
+    offsets (ndarray): Position in dates of every window's first target day, of shape (windows,).
+    scale (float or ndarray): Scale per symbol, see scaling_params.
+    minimum (float or ndarray): Offset per symbol.
+    model_version (str or list): The model version, or one per symbol.
+    split (str): 'train', 'test', or None for live forecasts.
+    valid (ndarray): Boolean (windows, symbols) mask of the windows to keep, e.g. from
+        PricePanel.sliding_windows; all windows by default.
+
+    Returns:
+    Table: One row per symbol, window and forecast day in the prediction store schema,
+    ordered by symbol, then as-of date and horizon.
+    """
+    import pyarrow as pa
+
+    from .prediction_store import SCHEMA
+
+    predicted = np.asarray(predicted)
+    windows, horizon, count = predicted.shape
+    as_of, targets = target_dates(dates, offsets, horizon)
+    # Symbol-major, so the rows of a symbol are contiguous as in the store partitions; the
+    # scaling is undone while transposing, in one pass over the array
+    scale, minimum = np.reshape(scale, (-1, 1, 1)), np.reshape(minimum, (-1, 1, 1))
+    prices = inverse_scale(np.moveaxis(predicted, -1, 0), scale, minimum).ravel()
+    if actual is None:
+        actual = np.full(prices.shape, np.nan)
+    else:
+        actual = inverse_scale(np.moveaxis(np.asarray(actual), -1, 0), scale, minimum).ravel()
+    symbol_index = np.repeat(np.arange(count, dtype=np.int32), windows * horizon)
+    as_of = np.tile(np.repeat(as_of, horizon), count)
+    targets = np.tile(targets.ravel(), count)
+    horizons = np.tile(np.arange(1, horizon + 1, dtype=np.int16), windows * count)
+    if valid is not None:
+        # Expand the (symbol, window) mask to one entry per forecast day
+        rows = np.repeat(np.asarray(valid, dtype=bool).T.ravel(), horizon)
+        symbol_index, as_of, targets, horizons = symbol_index[rows], as_of[rows], targets[rows], horizons[rows]
+        prices, actual = prices[rows], actual[rows]
+    versions = [model_version] * count if isinstance(model_version, str) else list(model_version)
+
+    def labels(indices, values):
+        # Dictionary-encode, then decode in one cast instead of building a Python string per row
+        return pa.DictionaryArray.from_arrays(pa.array(indices), pa.array(values, pa.string())).cast(pa.string())
+
+    size = len(symbol_index)
+    return pa.table({
+        'symbol': labels(symbol_index, list(symbols)),
+        'as_of': pa.array(as_of),
+        'horizon': pa.array(horizons),
+        'target_date': pa.array(targets),
+        'predicted': pa.array(prices),
+        'actual': pa.array(actual, from_pandas=True),
+        'model_version': labels(symbol_index, versions),
+        'split': labels(np.zeros(size, dtype=np.int32), [split]) if split is not None else pa.nulls(size, pa.string()),
+        'written_at': pa.nulls(size, pa.timestamp('us')),
+    }, schema=SCHEMA)
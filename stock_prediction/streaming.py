@@ -0,0 +1,437 @@
+"""
+Streaming ingestion of quotes and bars with incremental GRU forecasts.
+
+StreamingForecaster consumes quote or bar messages from an asyncio queue. Every
+message carries a symbol, a timestamp and a price. The forecaster keeps the last
+`lookback` scaled closes of every symbol in a ring buffer. A message of a new period
+(a new day for the daily models) appends a bar. A later quote of the same period
+replaces that bar's close, as the bar is still in progress. Nothing is re-read from
+the CSV files or re-scaled.
+
+Only the symbols whose window changed are forecast again. Messages that arrive
+together are coalesced: the consumer drains the queue before forecasting, and the
+models of symbols with the same architecture are stacked (see inference.stack_params)
+so that one NumPy pass forecasts all of them. A burst of bars across the universe
+costs one forward pass per model architecture, not one per symbol and message.
+
+The replay simulator streams the daily history of the CSV files into the queue in
+date order. speedup=86400 replays a day of history per second; without a speedup the
+bars are sent as fast as the consumer takes them, which measures the throughput. The
+producer stamps every message with the time it was sent, and each forecast records
+the end-to-end latency of the oldest message it includes.
+
+Usage:
+    forecaster = StreamingForecaster(['PLUG', 'NIO'], model_dir='models')
+    stats = simulate_stream(forecaster, data_dir='.', speedup=86400 * 30, start='2023')
+    forecaster.latest['PLUG']  # (as-of date, forecast closes in USD)
+"""
+import asyncio
+import collections
+import time
+
+import numpy as np
+
+# A quote or closed bar; `sent` is the time.perf_counter() at which the source emitted it
+Quote = collections.namedtuple('Quote', ['symbol', 'timestamp', 'price', 'sent'], defaults=[None])
+
+# The configuration that decides whether the models of two symbols can be stacked
+ARCHITECTURE_KEYS = ['lookback', 'num_layers', 'hidden_dim', 'forecast_horizon', 'strategy', 'block', 'quantiles']
+
+
+class RingBuffers:
+    """
+    The last `lookback` values of several series in one (series, lookback) array.
+    """
+
+    def __init__(self, count, lookback, period='D'):
+        """
+        Parameters:
+        count (int): Number of series.
+        lookback (int): Number of values kept per series.
+        period (str): NumPy datetime unit of a bar, e.g. 'D' for daily bars or 'm' for minute bars.
+        """
+        self.lookback = lookback
+        self.values = np.zeros((count, lookback), dtype=np.float32)
+        # Slot the next bar goes to, which holds the oldest bar once a buffer is full
+        self.next = np.zeros(count, dtype=np.int64)
+        self.filled = np.zeros(count, dtype=np.int64)
+        self.periods = np.full(count, np.datetime64('NaT'), dtype=f'datetime64[{period}]')
+
+    def push(self, row, period, value):
+        """
+        Append a bar to a series, or update its last bar if it is of the same period.
+
+        Parameters:
+        row (int): The series.
+        period (datetime64): The period of the value, in the buffers' unit.
+        value (float): The value.
+
+        Returns:
+        bool: Whether the buffer changed; values older than the last bar are ignored.
+        """
+        last = self.periods[row]
+        if self.filled[row] and period < last:
+            return False
+        if self.filled[row] and period == last:
+            # A quote of the bar in progress: the latest price is the bar's close so far
+            self.values[row, (self.next[row] - 1) % self.lookback] = value
+            return True
+        self.values[row, self.next[row]] = value
+        self.next[row] = (self.next[row] + 1) % self.lookback
+        self.filled[row] = min(self.filled[row] + 1, self.lookback)
+        self.periods[row] = period
+        return True
+
+    def complete(self, rows):
+        """
+        Return a mask of the rows whose buffers hold `lookback` bars.
+        """
+        return self.filled[rows] == self.lookback
+
+    def windows(self, rows):
+        """
+        Gather the buffers of several series in chronological order.
+
+        Parameters:
+        rows (ndarray): The series, each with a complete buffer.
+
+        Returns:
+        ndarray: float32 windows of shape (len(rows), lookback).
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        order = (self.next[rows, None] + np.arange(self.lookback)) % self.lookback
+        return self.values[rows[:, None], order]
+
+
+class StreamingForecaster:
+    """
+    Forecast symbols from a stream of quotes with their saved GRU models.
+    """
+
+    def __init__(self, symbols, model_dir='models', period='D', on_forecast=None):
+        """
+        Parameters:
+        symbols (list): The stock symbols, each with a saved model.
+        model_dir (str): The directory holding the model artifacts.
+        period (str): NumPy datetime unit of the bars the models were trained on.
+        on_forecast (callable): Called as on_forecast(symbol, as_of, prices) for every new forecast.
+        """
+        from .artifacts import artifact_path, load_model_artifact
+        from .inference import stack_params
+
+        self.symbols = list(symbols)
+        self.period = period
+        self.on_forecast = on_forecast
+        models = collections.defaultdict(list)
+        self.configs = {}
+        for symbol in symbols:
+            params, config = load_model_artifact(artifact_path(model_dir, symbol))
+            if config.get('input_dim', 1) != 1:
+                raise ValueError(f"The model of {symbol} takes {config['input_dim']} features; "
+                                 "only closes are streamed")
+            config.setdefault('strategy', 'direct')
+            key = tuple(tuple(value) if isinstance(value, list) else value
+                        for value in (config.get(name) for name in ARCHITECTURE_KEYS))
+            models[key].append((symbol, params, config))
+            self.configs[symbol] = config
+
+        self.groups = []
+        self._rows = {}
+        for members in models.values():
+            config = members[0][2]
+            group = {
+                'symbols': [symbol for symbol, _, _ in members],
+                'params': stack_params([params for _, params, _ in members]),
+                'config': config,
+                'scale': np.array([member[2]['scale'] for member in members], dtype=np.float64),
+                'minimum': np.array([member[2]['min'] for member in members], dtype=np.float64),
+                'buffers': RingBuffers(len(members), config['lookback'], period),
+                # Rows with new data since their last forecast, and the send time of their oldest message
+                'pending': {},
+            }
+            for row, symbol in enumerate(group['symbols']):
+                self._rows[symbol] = (group, row)
+            self.groups.append(group)
+
+        self.latest = {}
+        self.latencies = []
+        self.counts = {'messages': 0, 'ignored': 0, 'forecasts': 0, 'passes': 0}
+
+    def warm_up(self, messages):
+        """
+        Fill the buffers with past bars without forecasting them or counting them in the stats.
+
+        Parameters:
+        messages (iterable): Quote messages in timestamp order.
+        """
+        for quote in messages:
+            located = self._rows.get(quote.symbol)
+            if located is not None:
+                group, row = located
+                group['buffers'].push(row, np.datetime64(quote.timestamp, self.period),
+                                      quote.price * group['scale'][row] + group['minimum'][row])
+
+    def prime(self, data_dir='.'):
+        """
+        Fill the buffers with the latest closes of the CSV files, so live quotes are forecast at once.
+
+        The closes are back-adjusted and screened as the models' training prices were. Live
+        quotes are expected in the current price units.
+
+        Parameters:
+        data_dir (str): The directory holding the CSV files.
+        """
+        from .inference import recent_closes
+
+        for symbol, (group, row) in self._rows.items():
+            # Prepared as the model's training prices; see inference.recent_closes
+            dates, closes, units = recent_closes(symbol, self.configs[symbol], data_dir)
+            # Live quotes are in today's units: fold the conversion into the symbol's scale
+            group['scale'][row] = self.configs[symbol]['scale'] / units
+            self.warm_up(Quote(symbol, date, close) for date, close in zip(dates, closes))
+
+    def set_price_units(self, data_dir='.'):
+        """
+        Take quotes in today's price units, converting them to the units each model was scaled in.
+
+        prime does this as well; see inference.price_units.
+
+        Parameters:
+        data_dir (str): The directory holding the CSV files.
+        """
+        from .inference import price_units
+
+        for symbol, (group, row) in self._rows.items():
+            group['scale'][row] = self.configs[symbol]['scale'] / price_units(symbol, self.configs[symbol],
+                                                                               data_dir)
+
+    def ingest(self, quote):
+        """
+        Update the ring buffer of a quote's symbol.
+
+        Parameters:
+        quote (Quote): The message; quotes of unknown symbols and stale quotes are ignored.
+
+        Returns:
+        bool: Whether the symbol's window changed.
+        """
+        self.counts['messages'] += 1
+        located = self._rows.get(quote.symbol)
+        if located is None:
+            self.counts['ignored'] += 1
+            return False
+        group, row = located
+        period = np.datetime64(quote.timestamp, self.period)
+        if row in group['pending'] and period > group['buffers'].periods[row]:
+            # A new bar while the last one awaits its forecast: quotes of a bar are coalesced,
+            # but every closed bar is forecast
+            self.forecast_pending()
+        scaled = quote.price * group['scale'][row] + group['minimum'][row]
+        if not group['buffers'].push(row, period, scaled):
+            self.counts['ignored'] += 1
+            return False
+        sent = time.perf_counter() if quote.sent is None else quote.sent
+        group['pending'].setdefault(row, sent)
+        return True
+
+    def forecast_pending(self):
+        """
+        Forecast every symbol whose window changed since its last forecast, one pass per architecture.
+
+        Returns:
+        int: Number of symbols forecast.
+        """
+        from .inference import gru_forward_numpy, median_index
+        from .results import inverse_scale
+
+        forecast = 0
+        for group in self.groups:
+            if not group['pending']:
+                continue
+            # Sorted, so that all rows select the stacked parameters as they are
+            rows = np.sort(np.fromiter(group['pending'], dtype=np.int64, count=len(group['pending'])))
+            buffers = group['buffers']
+            complete = buffers.complete(rows)
+            for row in rows[~complete].tolist():
+                # A window still filling up has nothing to forecast yet
+                del group['pending'][row]
+            rows = rows[complete]
+            if not len(rows):
+                continue
+            config = group['config']
+            params = group['params']
+            if len(rows) < len(group['symbols']):
+                params = {name: value[rows] for name, value in params.items()}
+            windows = buffers.windows(rows)[:, :, None]
+            scaled = gru_forward_numpy(params, windows, config['num_layers'], config['strategy'],
+                                       config['forecast_horizon'], config.get('quantiles'))
+            if config.get('quantiles') is not None:
+                scaled = scaled[:, :, median_index(config['quantiles'])]
+            prices = inverse_scale(scaled, group['scale'][rows, None], group['minimum'][rows, None])
+            done = time.perf_counter()
+            self.counts['passes'] += 1
+
+            for row, values in zip(rows.tolist(), prices):
+                symbol = group['symbols'][row]
+                as_of = buffers.periods[row]
+                self.latest[symbol] = (as_of, values)
+                self.latencies.append(done - group['pending'].pop(row))
+                if self.on_forecast is not None:
+                    self.on_forecast(symbol, as_of, values)
+            forecast += len(rows)
+        self.counts['forecasts'] += forecast
+        return forecast
+
+    async def run(self, queue, max_batch=None):
+        """
+        Consume quotes from a queue until it yields None, forecasting after every drained batch.
+
+        Parameters:
+        queue (asyncio.Queue): The source of Quote messages; None ends the stream.
+        max_batch (int): Most messages coalesced into one forecast; everything queued by default.
+
+        Returns:
+        dict: The statistics, see stats().
+        """
+        finished = False
+        while not finished:
+            quote = await queue.get()
+            batch = 0
+            # Take whatever else has arrived meanwhile, so that a burst is forecast once
+            while quote is not None:
+                self.ingest(quote)
+                batch += 1
+                if queue.empty() or (max_batch is not None and batch >= max_batch):
+                    break
+                quote = queue.get_nowait()
+            finished = quote is None
+            self.forecast_pending()
+        return self.stats()
+
+    def stats(self):
+        """
+        Summarise the stream so far.
+
+        Returns:
+        dict: The message, ignored-message, forecast and forward pass counts, and the
+        median, 99th percentile and largest end-to-end latency in milliseconds.
+        """
+        stats = dict(self.counts)
+        latencies = np.asarray(self.latencies) * 1000.0
+        for name, value in (('p50', 50), ('p99', 99), ('max', 100)):
+            stats[f'latency_{name}_ms'] = float(np.percentile(latencies, value)) if len(latencies) else float('nan')
+        return stats
+
+
+def replay_messages(symbols, data_dir='.', start=None, end=None, configs=None):
+    """
+    Read the daily closes of symbols as one stream of bars in date order.
+
+    Parameters:
+    symbols (list): The stock symbols.
+    data_dir (str): The directory holding the CSV files.
+    start, end (str): Date range replayed (partial dates allowed), the whole history by default.
+    configs (dict): Artifact config per symbol; a symbol's closes are then screened and
+        back-adjusted as its model's training prices were (see inference.recent_closes),
+        in today's price units. By default the raw closes are replayed.
+
+    Returns:
+    list: Quote messages without send times, ordered by date and then by symbol.
+    """
+    from .data import load_stock_data
+
+    # Symbols whose models prepared their prices alike are loaded together
+    loads = collections.defaultdict(list)
+    for symbol in symbols:
+        config = (configs or {}).get(symbol, {})
+        loads[(tuple(config.get('exclude') or ()), bool(config.get('adjusted')))].append(symbol)
+    frames = {}
+    for (exclude, adjust), members in loads.items():
+        frames.update(load_stock_data(members, data_dir, exclude=list(exclude) or None, adjust=adjust))
+
+    names, dates, prices = [], [], []
+    for symbol in symbols:
+        if symbol not in frames:
+            continue
+        closes = frames[symbol]['4. close'].sort_index()[start:end]
+        names.append(np.full(len(closes), symbol, dtype=object))
+        dates.append(closes.index.to_numpy().astype('datetime64[D]'))
+        prices.append(closes.to_numpy(dtype=np.float64))
+    if not names:
+        return []
+    names, dates, prices = np.concatenate(names), np.concatenate(dates), np.concatenate(prices)
+    order = np.argsort(dates, kind='stable')
+    return [Quote(symbol, date, price)
+            for symbol, date, price in zip(names[order].tolist(), dates[order], prices[order].tolist())]
+
+
+async def replay(queue, messages, speedup=None):
+    """
+    Send messages into a queue, spaced by the time between their timestamps divided by speedup.
+
+    Parameters:
+    queue (asyncio.Queue): The destination; None is sent after the last message.
+    messages (list): Quote messages in timestamp order, see replay_messages.
+    speedup (float): Replay speed relative to real time, e.g. 86400 for a day per second;
+        by default the messages are sent as fast as the queue takes them.
+
+    Returns:
+    float: The largest delay in seconds behind the schedule, a sign the consumer cannot keep up.
+    """
+    start = time.perf_counter()
+    first = messages[0].timestamp if messages else None
+    lag = 0.0
+    for index, message in enumerate(messages):
+        if speedup and (index == 0 or message.timestamp != messages[index - 1].timestamp):
+            due = start + (message.timestamp - first) / np.timedelta64(1, 's') / speedup
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                lag = max(lag, -delay)
+        await queue.put(message._replace(sent=time.perf_counter()))
+    await queue.put(None)
+    return lag
+
+
+def simulate_stream(forecaster, data_dir='.', speedup=None, start=None, end=None, queue_size=1024,
+                    max_batch=None, messages=None):
+    """
+    Replay the CSV history of the forecaster's symbols through it and measure the stream.
+
+    Parameters:
+    forecaster (StreamingForecaster): The consumer.
+    data_dir (str): The directory holding the CSV files.
+    speedup (float): Replay speed, see replay; as fast as possible by default.
+    start, end (str): Date range replayed, see replay_messages; the bars before start only
+        fill the ring buffers.
+    queue_size (int): Capacity of the queue; a full queue holds the producer back.
+    max_batch (int): Most messages coalesced into one forecast, see StreamingForecaster.run.
+    messages (list): Quote messages to replay instead of the CSV history, in the units the
+        forecaster's scales take (today's units after prime or set_price_units).
+
+    Returns:
+    dict: The forecaster's stats(), plus the 'seconds' taken, the 'throughput' in messages
+    per second and the replay's largest 'lag_seconds' behind schedule.
+    """
+    if messages is None:
+        # The bars are prepared as each model's training prices, in today's units
+        forecaster.set_price_units(data_dir)
+        messages = replay_messages(forecaster.symbols, data_dir, end=end, configs=forecaster.configs)
+        if start is not None:
+            # The bars before start fill the buffers, so the replay forecasts from its first bar
+            first = np.searchsorted(np.array([message.timestamp for message in messages]), np.datetime64(start, 'D'))
+            forecaster.warm_up(messages[:first])
+            messages = messages[first:]
+
+    async def main():
+        queue = asyncio.Queue(maxsize=queue_size)
+        lag, stats = await asyncio.gather(replay(queue, messages, speedup), forecaster.run(queue, max_batch))
+        return lag, stats
+
+    began = time.perf_counter()
+    lag, stats = asyncio.run(main())
+    seconds = time.perf_counter() - began
+    stats.update(seconds=seconds, throughput=len(messages) / seconds if seconds else float('nan'),
+                 lag_seconds=float(lag))
+    return stats
@@ -0,0 +1,196 @@
+"""
+Training a GRU forecaster for one symbol, from the CSV file to a saved artifact.
+
+This is the notebook's scale -> window -> train sequence for the seven-day
+(output_dim=7) model, packaged so it can run per symbol from the command line.
+"""
+import datetime
+
+from .artifacts import artifact_path, save_model_artifact
+from .data import load_stock_data
+from .windows import chronological_validation_split, split_data_week_ahead_with_dates_multi
+
+
+def scale_prices(prices, feature_range=(-1, 1)):
+    """
+    Scale a price series with a MinMaxScaler, as done before windowing.
+
+    Parameters:
+    prices (Series): Prices indexed by date.
+    feature_range (tuple): Range of the scaled values.
+
+    Returns:
+    tuple: (DataFrame with a 'Scaled Price' column indexed by date, fitted scaler)
+    """
+    import pandas as pd
+    from sklearn.preprocessing import MinMaxScaler
+
+    scaler = MinMaxScaler(feature_range=feature_range)
+    scaled = scaler.fit_transform(prices.values.reshape(-1, 1))
+    return pd.DataFrame(scaled, index=prices.index, columns=['Scaled Price']), scaler
+
+
+def fit_gru(x_train, y_train, hidden_dim=32, num_layers=2, num_epochs=105, lr=0.01, sinks=(), labels=None,
+            patience=None, validation_fraction=0.1, performance=None, strategy='direct', block=None,
+            quantiles=None):
+    """
+    Train a GRU on scaled windows.
+
+    Parameters:
+    x_train (ndarray): Training inputs of shape (samples, lookback, 1).
+    y_train (ndarray): Training targets of shape (samples, forecast_horizon).
+    labels (dict): Labels attached to the emitted metrics, e.g. {'symbol': 'PLUG'}.
+    Other parameters: See train_symbol.
+
+    Returns:
+    tuple: (trained model, training summary)
+    """
+    import torch
+
+    from .instrumentation import train_instrumented
+    from .model import GRU, PinballLoss
+
+    validation = None
+    if patience is not None:
+        x_train, y_train, x_val, y_val = chronological_validation_split(x_train, y_train, validation_fraction)
+        validation = (torch.from_numpy(x_val).type(torch.Tensor), torch.from_numpy(y_val).type(torch.Tensor))
+    x_train_gru = torch.from_numpy(x_train).type(torch.Tensor)
+    y_train_gru = torch.from_numpy(y_train).type(torch.Tensor)
+
+    model = GRU(input_dim=1, hidden_dim=hidden_dim, num_layers=num_layers, output_dim=y_train.shape[1],
+                strategy=strategy, block=block, quantiles=quantiles)
+    criterion = PinballLoss(model.quantiles) if quantiles is not None else torch.nn.MSELoss(reduction='mean')
+    optimiser = torch.optim.Adam(model.parameters(), lr=lr)
+
+    train_model, settings = model, {'autocast_dtype': None}
+    if performance is not None:
+        from .performance import performance_mode
+
+        train_model, settings = performance_mode(model, **performance)
+
+    hist, summary = train_instrumented(train_model, criterion, optimiser, x_train_gru, y_train_gru, num_epochs,
+                                       sinks=sinks, labels=labels, validation=validation,
+                                       patience=patience, autocast_dtype=settings['autocast_dtype'])
+    return model, summary
+
+
+def save_trained_model(model_dir, symbol, model, scaler, prices, summary, **config):
+    """
+    Save a model trained by fit_gru as the symbol's artifact.
+
+    Parameters:
+    model_dir (str): The directory the artifact is written to.
+    symbol (str): The stock symbol.
+    model (GRU): The trained model.
+    scaler (MinMaxScaler): The scaler fitted on the training prices.
+    prices (Series): The unscaled closing prices the windows were cut from.
+    summary (dict): The training summary of fit_gru.
+    config: The training settings recorded in the artifact (lookback, start, end, ...).
+
+    Returns:
+    str: The artifact path.
+    """
+    return save_model_artifact(
+        artifact_path(model_dir, symbol), model, scaler,
+        symbol=symbol, input_dim=1, hidden_dim=model.hidden_dim, num_layers=model.num_layers,
+        forecast_horizon=model.output_dim, strategy=model.strategy, block=model.block,
+        quantiles=list(model.quantiles) if model.quantiles is not None else None,
+        epochs=summary['epochs_trained'], **config,
+        last_date=prices.index[-1].strftime('%Y-%m-%d'),
+        trained_at=datetime.datetime.now().isoformat(timespec='seconds'),
+    )
+
+
+def artifact_settings(loaded_through, start, end, lookback, num_epochs, lr, patience, validation_fraction, exclude,
+                      adjust):
+    """
+    Build the training settings a model artifact records, so it can be forecast from and retrained alike.
+
+    Parameters:
+    loaded_through (Timestamp): The last bar loaded for the symbol, before the start:end slice.
+    Other parameters: See train_symbol.
+
+    Returns:
+    dict: Config keyword arguments of save_trained_model.
+    """
+    return {
+        'lookback': lookback, 'start': start, 'end': end, 'num_epochs': num_epochs, 'lr': lr, 'patience': patience,
+        'validation_fraction': validation_fraction, 'exclude': list(exclude) if exclude is not None else None,
+        'adjusted': bool(adjust),
+        # The actions up to the last bar loaded were applied, also when `end` cuts the prices earlier
+        'adjusted_through': loaded_through.strftime('%Y-%m-%d') if adjust else None,
+    }
+
+
+def train_symbol(symbol, data_dir='.', model_dir='models', start='2019', end='2024', lookback=20,
+                 forecast_horizon=7, hidden_dim=32, num_layers=2, num_epochs=105, lr=0.01, sinks=(),
+                 patience=None, validation_fraction=0.1, performance=None, exclude=None, adjust=False,
+                 strategy='direct', block=None, quantiles=None):
+    """
+    Train the seven-day GRU for one symbol and save it as a model artifact.
+
+    Parameters:
+    symbol (str): The stock symbol to train on.
+    data_dir (str): The directory holding the CSV files.
+    model_dir (str): The directory the artifact is written to.
+    start, end (str): Date range of the closing prices used (partial dates allowed).
+    lookback (int): Number of input days per window.
+    forecast_horizon (int): Number of days predicted per window.
+    hidden_dim (int): Size of GRU hidden layers.
+    num_layers (int): Number of GRU layers.
+    num_epochs (int): Number of training epochs.
+    lr (float): Learning rate of the Adam optimizer.
+    sinks (iterable): Metric sinks passed to train_instrumented.
+    patience (int): If given, stop once the loss on the most recent validation_fraction of
+        the training windows has not improved for this many epochs, keeping the best weights.
+    validation_fraction (float): Share of the training windows held out for early stopping.
+    performance (dict): If given, train in the CPU performance mode with these keyword
+        arguments of performance.performance_mode, e.g. {} for the defaults or {'compile': True}.
+    exclude (iterable): Validation checks whose flagged rows are dropped before windowing,
+        e.g. ['zero_volume']; see load_stock_data.
+    adjust (bool): Train on prices back-adjusted for the recorded splits and dividends.
+    strategy (str): The GRU's forecasting strategy, 'direct', 'recursive' or 'hybrid' (see model.GRU).
+    block (int): Steps per prediction of the hybrid strategy.
+    quantiles (sequence): If given, train a quantile GRU on the pinball loss of these
+        quantiles instead of a point forecaster on the MSE (see model.GRU).
+
+    Returns:
+    dict: The training summary, including the artifact path.
+    """
+    stock_data = load_stock_data([symbol], data_dir, exclude=exclude, adjust=adjust)
+    if symbol not in stock_data:
+        raise FileNotFoundError(f"No data found for {symbol}")
+    prices = stock_data[symbol][start:end]['4. close']
+    scaled_prices, scaler = scale_prices(prices)
+
+    x_train, y_train, _, _, _, _ = split_data_week_ahead_with_dates_multi(scaled_prices, lookback, forecast_horizon)
+    model, summary = fit_gru(x_train, y_train, hidden_dim, num_layers, num_epochs, lr, sinks=sinks,
+                             labels={'symbol': symbol}, patience=patience, validation_fraction=validation_fraction,
+                             performance=performance, strategy=strategy, block=block, quantiles=quantiles)
+
+    summary['artifact'] = save_trained_model(
+        model_dir, symbol, model, scaler, prices, summary,
+        **artifact_settings(stock_data[symbol].index[-1], start, end, lookback, num_epochs, lr, patience,
+                            validation_fraction, exclude, adjust),
+    )
+    return summary
+
+
+# Artifact config keys that are train_symbol arguments of the same name
+TRAINING_SETTINGS = ['start', 'end', 'lookback', 'forecast_horizon', 'hidden_dim', 'num_layers', 'num_epochs', 'lr',
+                     'patience', 'validation_fraction', 'exclude', 'strategy', 'block', 'quantiles']
+
+
+def training_settings(config):
+    """
+    Recover the train_symbol arguments a saved model was trained with, e.g. to retrain it on new data.
+
+    Parameters:
+    config (dict): The artifact config, as returned by load_model_artifact.
+
+    Returns:
+    dict: Keyword arguments for train_symbol; settings older artifacts do not record keep their defaults.
+    """
+    settings = {name: config[name] for name in TRAINING_SETTINGS if name in config}
+    settings['adjust'] = bool(config.get('adjusted', False))
+    return settings
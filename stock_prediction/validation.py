@@ -0,0 +1,237 @@
+"""
+Validation and anomaly screening of the historical data.
+
+The checks run over all symbols at once, on one long array of rows, and report
+anomalies as spans of dates:
+
+- 'missing_values': rows with a missing price or volume.
+- 'missing_dates': more than max_gap business days without a row (holidays leave
+  gaps of one or two days). These spans hold no rows.
+- 'zero_volume': runs of consecutive rows without trading, like CHPT's pre-SPAC
+  rows with a flat price.
+- 'price_spike': single-day close-to-close moves larger than spike_threshold (in
+  log return) and spike_mad times the symbol's median absolute log return.
+- 'split': overnight gaps within split_tolerance of a split ratio, e.g. PLUG's 1-for-10
+  reverse split. The span is the first day at the new price level; its value is the
+  split factor (0.1 for a 1-for-10 reverse split).
+
+Results are cached per file checksum, so unchanged files are never screened twice.
+The flagged rows can be dropped before windowing with exclude_spans, or directly
+with load_stock_data(symbols, exclude=['zero_volume']).
+
+Usage:
+    spans = screen_stock_data(load_stock_data(['PLUG', 'CHPT']))
+    spans[spans['check'] == 'zero_volume']
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .data import latest_data_file
+
+CHECKS = ('missing_values', 'missing_dates', 'zero_volume', 'price_spike', 'split')
+SPAN_FIELDS = ['symbol', 'check', 'start', 'end', 'rows', 'value']
+
+DEFAULT_THRESHOLDS = {
+    # Missing business days tolerated between two rows
+    'max_gap': 2,
+    # Smallest absolute log return of a spike (0.5 is a 65% rise or a 39% fall)
+    'spike_threshold': 0.5,
+    # Smallest multiple of the symbol's median absolute log return of a spike
+    'spike_mad': 10.0,
+    # Largest distance, in log price, between an overnight gap and a split ratio
+    # (about 5%; PLUG's 83% rise on 2017-04-05 is news, not a 1-for-2 reverse split)
+    'split_tolerance': 0.05,
+}
+
+# Split ratios checked, forward (price divided) and reverse (price multiplied)
+SPLIT_FACTORS = (2, 3, 4, 5, 8, 10, 15, 20, 25, 30, 50, 100)
+
+# Bump when the checks change, so cached results are recomputed
+VALIDATION_VERSION = 2
+
+PRICE_COLUMNS = ['1. open', '2. high', '3. low', '4. close']
+VOLUME_COLUMN = '5. volume'
+
+
+def _spans(symbols, codes, dates, mask, check, values=None):
+    """
+    Collapse flagged rows into spans of consecutive rows of the same symbol.
+    """
+    if not mask.any():
+        return pd.DataFrame(columns=SPAN_FIELDS)
+    flagged = np.flatnonzero(mask)
+    # A span starts wherever the previous flagged row is not the row before in the same symbol
+    starts = np.r_[True, (np.diff(flagged) != 1) | (codes[flagged[1:]] != codes[flagged[:-1]])]
+    span_ids = np.cumsum(starts) - 1
+    rows = pd.DataFrame({'span': span_ids, 'code': codes[flagged], 'date': dates[flagged],
+                         'value': np.nan if values is None else values[flagged]})
+    grouped = rows.groupby('span', sort=True)
+    # The value of a span is its most extreme one
+    extreme = rows.loc[rows['value'].abs().fillna(0).groupby(rows['span']).idxmax(), 'value'].to_numpy()
+    return pd.DataFrame({
+        'symbol': np.asarray(symbols, dtype=object)[grouped['code'].first().to_numpy()],
+        'check': check,
+        'start': grouped['date'].first().to_numpy(),
+        'end': grouped['date'].last().to_numpy(),
+        'rows': grouped.size().to_numpy(),
+        'value': extreme,
+    })
+
+
+def screen_frames(stock_data, max_gap=2, spike_threshold=0.5, spike_mad=10.0, split_tolerance=0.05):
+    """
+    Run every check on the data frames of all symbols in one pass.
+
+    Parameters:
+    stock_data (dict): DataFrames keyed by symbol, as returned by load_stock_data.
+    max_gap, spike_threshold, spike_mad, split_tolerance: See DEFAULT_THRESHOLDS.
+
+    Returns:
+    DataFrame: One row per anomaly span, with the SPAN_FIELDS columns; 'rows' is the
+    number of data rows in the span and 'value' its most extreme measurement (missing
+    business days, volume, log return or split factor).
+    """
+    symbols = list(stock_data)
+    if not symbols:
+        return _sorted(pd.DataFrame(columns=SPAN_FIELDS))
+    frames = [frame.sort_index() for frame in stock_data.values()]
+    codes = np.repeat(np.arange(len(frames)), [len(frame) for frame in frames])
+    dates = np.concatenate([frame.index.values.astype('datetime64[D]') for frame in frames])
+    prices = np.concatenate([frame[PRICE_COLUMNS].to_numpy(dtype=float) for frame in frames])
+    volume = np.concatenate([frame[VOLUME_COLUMN].to_numpy(dtype=float) for frame in frames])
+    opens, close = prices[:, 0], prices[:, 3]
+
+    # Row-to-row differences are only meaningful within a symbol
+    follows = np.r_[False, codes[1:] == codes[:-1]]
+    previous = np.r_[0, np.arange(len(codes) - 1)]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_close = np.log(close)
+        returns = np.where(follows, log_close - log_close[previous], np.nan)
+        gaps = np.where(follows, np.log(opens) - log_close[previous], np.nan)
+
+    spans = [_spans(symbols, codes, dates, np.isnan(prices).any(axis=1) | np.isnan(volume), 'missing_values')]
+
+    # Missing dates: the business days strictly between two consecutive rows
+    missing = np.zeros(len(codes), dtype=np.int64)
+    missing[follows] = np.busday_count(dates[previous][follows], dates[follows]) - 1
+    gap_rows = np.flatnonzero(missing > max_gap)
+    spans.append(pd.DataFrame({
+        'symbol': np.asarray(symbols, dtype=object)[codes[gap_rows]],
+        'check': 'missing_dates',
+        'start': np.busday_offset(dates[previous][gap_rows], 1, roll='forward'),
+        'end': np.busday_offset(dates[gap_rows], -1, roll='backward'),
+        'rows': 0,
+        'value': missing[gap_rows].astype(float),
+    }, columns=SPAN_FIELDS))
+
+    spans.append(_spans(symbols, codes, dates, volume == 0, 'zero_volume', volume))
+
+    # Splits: overnight gaps close to the log of a split ratio, in either direction
+    # (a 1-for-k reverse split raises the price k times and has factor 1 / k)
+    factors = np.concatenate([1.0 / np.array(SPLIT_FACTORS, dtype=float), np.array(SPLIT_FACTORS, dtype=float)])
+    distance = np.abs(np.nan_to_num(gaps)[:, None] + np.log(factors)[None, :])
+    nearest = distance.argmin(axis=1)
+    split = follows & (distance[np.arange(len(codes)), nearest] < split_tolerance)
+    factors = factors[nearest]
+    spans.append(_spans(symbols, codes, dates, split, 'split', factors))
+
+    # Spikes: large moves relative to both a fixed threshold and the symbol's typical move
+    typical = pd.Series(np.abs(returns)).groupby(codes).transform('median').to_numpy()
+    with np.errstate(invalid='ignore'):
+        spike = (np.abs(returns) > np.maximum(spike_threshold, spike_mad * typical)) & ~split
+    spans.append(_spans(symbols, codes, dates, spike, 'price_spike', returns))
+
+    return _sorted(pd.concat([span for span in spans if len(span)] or spans[:1], ignore_index=True))
+
+
+def _sorted(spans):
+    spans = spans[SPAN_FIELDS].astype({'symbol': object, 'check': object, 'start': 'datetime64[ns]',
+                                       'end': 'datetime64[ns]', 'rows': np.int64, 'value': np.float64})
+    return spans.sort_values(['symbol', 'start', 'check'], ignore_index=True)
+
+
+def file_checksum(path):
+    """
+    Return the SHA-256 hex digest of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_path(cache_dir, checksum, thresholds):
+    options = json.dumps({'version': VALIDATION_VERSION, **thresholds}, sort_keys=True)
+    key = hashlib.sha1((checksum + options).encode()).hexdigest()
+    return os.path.join(cache_dir, f'validation_{key}.json')
+
+
+def screen_stock_data(stock_data, data_dir='.', cache_dir='.validation_cache', **thresholds):
+    """
+    Screen the data of every symbol, reusing cached results of unchanged files.
+
+    Symbols without a cached result are screened together in one screen_frames pass,
+    and their results are cached under the checksum of their CSV file.
+
+    Parameters:
+    stock_data (dict): DataFrames keyed by symbol, as loaded from data_dir by load_stock_data.
+    data_dir (str): The directory holding the CSV files the frames were loaded from.
+    cache_dir (str): Directory of the cached results, or None to disable caching.
+    thresholds: Overrides of DEFAULT_THRESHOLDS.
+
+    Returns:
+    DataFrame: The anomaly spans of all symbols, as returned by screen_frames.
+    """
+    thresholds = dict(DEFAULT_THRESHOLDS, **thresholds)
+    cached, pending, cache_paths = [], {}, {}
+    for symbol, frame in stock_data.items():
+        path = latest_data_file(symbol, data_dir) if cache_dir is not None else None
+        if path is not None:
+            cache_paths[symbol] = _cache_path(cache_dir, file_checksum(path), thresholds)
+            if os.path.exists(cache_paths[symbol]):
+                with open(cache_paths[symbol]) as file:
+                    spans = pd.DataFrame(json.load(file), columns=SPAN_FIELDS[1:])
+                cached.append(spans.assign(symbol=symbol))
+                continue
+        pending[symbol] = frame
+
+    screened = screen_frames(pending, **thresholds)
+    for symbol in pending:
+        if symbol not in cache_paths:
+            continue
+        spans = screened[screened['symbol'] == symbol].drop(columns='symbol')
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_paths[symbol] + '.tmp', 'w') as file:
+            json.dump(spans.to_dict(orient='records'), file, default=str)
+        os.replace(cache_paths[symbol] + '.tmp', cache_paths[symbol])
+
+    return _sorted(pd.concat([screened] + [spans.astype({'start': 'datetime64[ns]', 'end': 'datetime64[ns]'})
+                                           for spans in cached], ignore_index=True))
+
+
+def exclude_spans(frame, spans, checks=('zero_volume',)):
+    """
+    Drop the rows of a symbol's data frame that fall in flagged spans.
+
+    Parameters:
+    frame (DataFrame): The data of one symbol, indexed by date.
+    spans (DataFrame): Spans of that symbol, from screen_stock_data.
+    checks (iterable): The checks whose spans are dropped.
+
+    Returns:
+    DataFrame: The frame without the flagged rows.
+    """
+    checks = list(checks)
+    unknown = sorted(set(checks) - set(CHECKS))
+    if unknown:
+        raise ValueError(f"Unknown validation checks {unknown}, choose from {list(CHECKS)}")
+    spans = spans[spans['check'].isin(checks)]
+    keep = np.ones(len(frame), dtype=bool)
+    for start, end in zip(spans['start'], spans['end']):
+        keep &= ~((frame.index >= start) & (frame.index <= end))
+    return frame[keep]
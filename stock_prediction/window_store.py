@@ -0,0 +1,254 @@
+"""
+A store of window arrays shared by the training processes of one machine.
+
+Hyperparameter trials, ensemble members and folds train on the same windows. Instead
+of every process reading the CSV file, scaling the prices and cutting its own copy of
+x_train and y_train, the windows of a symbol are published once: as float32 .npy
+files in one directory per entry, with the dates of the scaled series and the offset
+of every window's first target day. Workers attach to an entry by its key and map the
+files without copying; the pages stay in the page cache, shared by every process, so
+memory use does not grow with the number of workers. Attaching only needs NumPy.
+
+The root defaults to /dev/shm (POSIX shared memory) where it exists. An index file,
+updated under a file lock, records the size, last use and leases of every entry: a
+lease is taken per attaching process, so an entry is never evicted while it is in
+use, and leases of processes that died are dropped. Publishing new windows of a
+symbol evicts the entries they supersede (same symbol, lookback and horizon) once no
+process holds them. Once the published entries exceed budget_bytes, by default a
+quarter of the filesystem holding the root, the least recently used ones without
+leases are evicted.
+
+Usage:
+    store = WindowStore()
+    key = store.publish('PLUG', scaled_prices, lookback=20, forecast_horizon=7)
+    # In every worker process
+    with store.attach(key) as windows:
+        x_train = torch.from_numpy(windows['x_train'])
+"""
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+ARRAY_NAMES = ('x_train', 'y_train', 'x_test', 'y_test', 'dates', 'offsets')
+INDEX_NAME = 'index.json'
+# Share of the root's filesystem the entries may use when no budget is given
+DEFAULT_BUDGET_FRACTION = 0.25
+
+
+def default_root():
+    """
+    Return /dev/shm/stock_prediction_windows where shared memory is mounted, else .window_store.
+    """
+    if os.path.isdir('/dev/shm'):
+        return os.path.join('/dev/shm', 'stock_prediction_windows')
+    return '.window_store'
+
+
+def window_key(symbol, scaled, lookback, forecast_horizon):
+    """
+    Hash a symbol's scaled prices, their dates and the window sizes into a store key.
+    """
+    digest = hashlib.sha256(json.dumps([symbol, lookback, forecast_horizon]).encode())
+    digest.update(np.ascontiguousarray(scaled['Scaled Price'].to_numpy(dtype=np.float64)).tobytes())
+    digest.update(scaled.index.values.astype('datetime64[D]').tobytes())
+    return f'{symbol}-{digest.hexdigest()[:16]}'
+
+
+def window_arrays(scaled, lookback, forecast_horizon):
+    """
+    Cut the windows of split_data_week_ahead_with_dates_multi as float32 arrays.
+
+    Instead of one DatetimeIndex per window, the dates are returned once, with the
+    offset into them of every window's first target day (train windows first).
+
+    Returns:
+    dict: Arrays keyed by ARRAY_NAMES.
+    """
+    from .results import window_offsets
+    from .windows import split_data_week_ahead_with_dates_multi
+
+    x_train, y_train, x_test, y_test, _, _ = split_data_week_ahead_with_dates_multi(scaled, lookback,
+                                                                                    forecast_horizon)
+    arrays = {name: np.ascontiguousarray(array, dtype=np.float32)
+              for name, array in zip(ARRAY_NAMES, (x_train, y_train, x_test, y_test))}
+    arrays['dates'] = scaled.index.values.astype('datetime64[D]')
+    arrays['offsets'] = window_offsets(len(scaled), lookback, forecast_horizon)
+    return arrays
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class WindowStore:
+    """
+    Window arrays published once per symbol and mapped by every process that trains on them.
+    """
+
+    def __init__(self, root=None, budget_bytes=None):
+        self.root = root or default_root()
+        if budget_bytes is None:
+            os.makedirs(self.root, exist_ok=True)
+            budget_bytes = int(shutil.disk_usage(self.root).total * DEFAULT_BUDGET_FRACTION)
+        self.budget_bytes = budget_bytes
+
+    @contextlib.contextmanager
+    def _index(self):
+        """
+        Lock the index and yield it as a dict; changes are written back on exit.
+        """
+        import fcntl
+
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, 'index.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            path = os.path.join(self.root, INDEX_NAME)
+            index = {}
+            if os.path.exists(path):
+                with open(path) as file:
+                    index = json.load(file)
+            # Drop the leases of processes that exited without releasing them
+            for entry in index.values():
+                entry['leases'] = {pid: count for pid, count in entry['leases'].items() if _process_alive(int(pid))}
+            before = json.dumps(index, sort_keys=True)
+            yield index
+            if json.dumps(index, sort_keys=True) != before:
+                with open(path + '.tmp', 'w') as file:
+                    json.dump(index, file, indent=2, sort_keys=True)
+                os.replace(path + '.tmp', path)
+
+    def _directory(self, key):
+        return os.path.join(self.root, key)
+
+    def publish(self, symbol, scaled, lookback=20, forecast_horizon=7):
+        """
+        Publish the windows of a symbol, unless an identical entry is already published.
+
+        Parameters:
+        symbol (str): The stock symbol.
+        scaled (DataFrame): Scaled prices with a 'Scaled Price' column, as returned by scale_prices.
+        lookback (int): Number of input days per window.
+        forecast_horizon (int): Number of days predicted per window.
+
+        Returns:
+        str: The key workers attach with.
+        """
+        key = window_key(symbol, scaled, lookback, forecast_horizon)
+        with self._index() as index:
+            if key in index and os.path.isdir(self._directory(key)):
+                index[key]['last_used'] = time.time()
+                index[key].pop('superseded', None)
+                return key
+
+            # Write next to the entry and rename, so workers never map half-written files
+            temporary = self._directory(f'{key}.tmp{os.getpid()}')
+            os.makedirs(temporary, exist_ok=True)
+            size = 0
+            for name, array in window_arrays(scaled, lookback, forecast_horizon).items():
+                np.save(os.path.join(temporary, f'{name}.npy'), array)
+                size += array.nbytes
+            shutil.rmtree(self._directory(key), ignore_errors=True)
+            os.replace(temporary, self._directory(key))
+            index[key] = {'symbol': symbol, 'lookback': lookback, 'forecast_horizon': forecast_horizon,
+                          'bytes': size, 'last_used': time.time(), 'leases': {}}
+            # Earlier windows of the same series are stale: drop them, or once released if leased
+            for other, entry in list(index.items()):
+                if other != key and (entry['symbol'], entry['lookback'], entry['forecast_horizon']) == (
+                        symbol, lookback, forecast_horizon):
+                    entry['superseded'] = True
+                    if not entry['leases']:
+                        self._remove(index, other)
+            self._evict(index, keep=key)
+        return key
+
+    @contextlib.contextmanager
+    def attach(self, key):
+        """
+        Map the arrays of a published entry, holding a lease on it while attached.
+
+        Parameters:
+        key (str): The key returned by publish.
+
+        Yields:
+        dict: Copy-on-write mapped arrays keyed by ARRAY_NAMES; 'dates' are the dates of the
+        scaled prices and 'offsets' the index into them of each window's first target day.
+        """
+        pid = str(os.getpid())
+        with self._index() as index:
+            if key not in index or not os.path.isdir(self._directory(key)):
+                raise KeyError(f"No windows published under {key!r}")
+            entry = index[key]
+            entry['leases'][pid] = entry['leases'].get(pid, 0) + 1
+            entry['last_used'] = time.time()
+        try:
+            # Copy-on-write maps: the pages stay shared with the other processes
+            yield {name: np.load(os.path.join(self._directory(key), f'{name}.npy'), mmap_mode='c')
+                   for name in ARRAY_NAMES}
+        finally:
+            with self._index() as index:
+                leases = index.get(key, {}).get('leases', {})
+                if leases.get(pid, 0) > 1:
+                    leases[pid] -= 1
+                else:
+                    leases.pop(pid, None)
+                if key in index and not leases and index[key].get('superseded'):
+                    self._remove(index, key)
+
+    def entries(self):
+        """
+        Describe the published entries.
+
+        Returns:
+        dict: Per key, 'symbol', 'lookback', 'forecast_horizon', 'bytes', 'last_used'
+        (a timestamp), 'leases' (the number of attachments per process id) and, for entries
+        still leased after newer windows of their series were published, 'superseded'.
+        """
+        with self._index() as index:
+            return json.loads(json.dumps(index))
+
+    def _remove(self, index, key):
+        shutil.rmtree(self._directory(key), ignore_errors=True)
+        return index.pop(key)
+
+    def _evict(self, index, keep=None):
+        evicted = []
+        total = sum(entry['bytes'] for entry in index.values())
+        for key in sorted(index, key=lambda key: index[key]['last_used']):
+            if total <= self.budget_bytes:
+                break
+            if key == keep or index[key]['leases']:
+                continue
+            total -= self._remove(index, key)['bytes']
+            evicted.append(key)
+        return evicted
+
+    def evict(self, key=None):
+        """
+        Remove an entry, or the least recently used entries over the budget.
+
+        Entries with leases are never removed.
+
+        Parameters:
+        key (str): The entry to remove; by default, evict down to budget_bytes.
+
+        Returns:
+        list: The keys removed.
+        """
+        with self._index() as index:
+            if key is None:
+                return self._evict(index)
+            if key not in index or index[key]['leases']:
+                return []
+            self._remove(index, key)
+            return [key]
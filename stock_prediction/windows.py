@@ -0,0 +1,129 @@
+"""
+Splitting a scaled price series into lookback/forecast windows with their dates.
+"""
+import numpy as np
+
+
+# outputs all days outlined by the forecast horizon
+def split_data_week_ahead_with_dates_multi(stock, lookback, forecast_horizon):
+    data_raw = stock['Scaled Price'].values
+    dates = stock.index
+    
+    # Every lookback + forecast_horizon long slice, built at once (intraday tiers have many)
+    data = np.array(np.lib.stride_tricks.sliding_window_view(data_raw, lookback + forecast_horizon))
+    # Collect a range of dates for each forecast horizon instead of a single date
+    date_labels = [dates[index + lookback: index + lookback + forecast_horizon] for index in range(len(data))]
+    
+    test_set_size = int(np.round(0.2 * data.shape[0]))
+    train_set_size = data.shape[0] - test_set_size
+    
+    x_train = data[:train_set_size, :-forecast_horizon]
+    y_train = data[:train_set_size, -forecast_horizon:]
+    x_test = data[train_set_size:, :-forecast_horizon]
+    y_test = data[train_set_size:, -forecast_horizon:]
+    
+    x_train = x_train.reshape((x_train.shape[0], x_train.shape[1], 1))
+    x_test = x_test.reshape((x_test.shape[0], x_test.shape[1], 1))
+    
+    # Adjusting how dates are split to accommodate the change
+    dates_train = date_labels[:train_set_size]
+    dates_test = date_labels[train_set_size:]
+    
+    return x_train, y_train, x_test, y_test, dates_train, dates_test
+
+
+# Outputs just the last date of each forecast horizon
+def split_data_week_ahead_with_dates_single(stock, lookback, forecast_horizon):
+    data_raw = stock['Scaled Price'].values
+    dates = stock.index
+    
+    data = np.array(np.lib.stride_tricks.sliding_window_view(data_raw, lookback + forecast_horizon))
+    # Now collecting only the date corresponding to the last day of each forecast horizon
+    date_labels = list(dates[lookback + forecast_horizon - 1:])  # Just the last day
+    
+    test_set_size = int(np.round(0.2 * data.shape[0]))
+    train_set_size = data.shape[0] - test_set_size
+    
+    # Extracting input sequences for training and testing
+    x_train = data[:train_set_size, :-forecast_horizon]
+    x_test = data[train_set_size:, :-forecast_horizon]
+    
+    # Modifying to focus only on the last day of the forecast horizon for y_train and y_test
+    y_train = data[:train_set_size, -1].reshape(-1, 1)  # Reshaping to keep 2D structure
+    y_test = data[train_set_size:, -1].reshape(-1, 1)   # Reshaping to keep 2D structure
+    
+    x_train = x_train.reshape((x_train.shape[0], x_train.shape[1], 1))
+    x_test = x_test.reshape((x_test.shape[0], x_test.shape[1], 1))
+    
+    # Adjusting how dates are handled to match the new y_train and y_test structure
+    dates_train = [date_labels[i] for i in range(train_set_size)]
+    dates_test = [date_labels[i] for i in range(train_set_size, len(date_labels))]
+    
+    return x_train, y_train, x_test, y_test, dates_train, dates_test
+
+
+def window_dates(index, lookback, forecast_horizon, start=0, count=None):
+    """
+    Compute the as-of and target dates of consecutive windows from a price index.
+
+    Window i (counted from start) reads index[start + i : start + i + lookback] and
+    predicts the forecast_horizon days after it, as in the split functions.
+
+    Parameters:
+    index (DatetimeIndex): The dates of the windowed price series.
+    lookback (int): Number of input days per window.
+    forecast_horizon (int): Number of days predicted per window.
+    start (int): Position of the first window.
+    count (int): Number of windows, all remaining ones by default.
+
+    Returns:
+    tuple: (as_of, target_dates) datetime64 arrays of shapes (count,) and (count, forecast_horizon).
+    """
+    from .results import target_dates, window_offsets
+
+    return target_dates(index, window_offsets(len(index), lookback, forecast_horizon, start, count), forecast_horizon)
+
+
+def window_split_sizes(length, lookback, forecast_horizon):
+    """
+    Count the train and test windows the split functions make from a series.
+
+    Parameters:
+    length (int): Number of prices in the series.
+    lookback (int): Number of input days per window.
+    forecast_horizon (int): Number of days predicted per window.
+
+    Returns:
+    tuple: (train_size, test_size), with the last 20% of the windows used for testing.
+    """
+    windows = length - lookback - forecast_horizon + 1
+    test_set_size = int(np.round(0.2 * windows))
+    return windows - test_set_size, test_set_size
+
+
+def chronological_validation_split(x, y, fraction=0.1, gap=None):
+    """
+    Hold out the most recent training windows for validation.
+
+    Consecutive windows overlap, so the `gap` windows before the validation slice are
+    dropped; with the default gap (the forecast horizon) no training target falls on
+    a validation target date. A ValueError is raised when fewer windows remain than one
+    to fit, the gap and one to validate.
+
+    Parameters:
+    x (ndarray): Training inputs, oldest window first.
+    y (ndarray): Training targets of shape (windows, forecast_horizon).
+    fraction (float): Share of the windows used for validation.
+    gap (int): Windows dropped between the two parts, y.shape[1] by default.
+
+    Returns:
+    tuple: (x_fit, y_fit, x_val, y_val)
+    """
+    if gap is None:
+        gap = y.shape[1]
+    val_size = max(1, int(np.round(fraction * len(x))))
+    fit_end = len(x) - val_size - gap
+    if fit_end < 1:
+        raise ValueError(f"{len(x)} training windows leave no fit window besides {val_size} validation windows "
+                         f"and a gap of {gap}; train on more data or without early stopping (patience=None)")
+    return x[:fit_end], y[:fit_end], x[-val_size:], y[-val_size:]
@@ -0,0 +1,135 @@
+"""
+A registry of forecasting networks behind one fit/predict/save/load interface.
+
+Every registered network takes (input_dim, hidden_dim, num_layers, output_dim) and
+maps (batch, lookback, input_dim) windows to (batch, output_dim) forecasts, like GRU.
+
+Usage:
+    forecaster = Forecaster('lstm', output_dim=7).fit(x_train, y_train)
+    y_pred = forecaster.predict(x_test)
+    forecaster.save('models/PLUG_lstm.npz')
+    forecaster = Forecaster.load('models/PLUG_lstm.npz')
+"""
+import json
+import os
+
+import numpy as np
+import torch
+
+from .instrumentation import train_instrumented
+from .model import GRU, LSTM, TemporalConvNet, TransformerForecaster
+
+MODELS = {
+    'gru': GRU,
+    'lstm': LSTM,
+    'tcn': TemporalConvNet,
+    'transformer': TransformerForecaster,
+}
+
+
+def register_model(name, model_class):
+    """
+    Make a network available to Forecaster under the given name.
+
+    Parameters:
+    name (str): The registry name, e.g. 'lstm'.
+    model_class (type): An nn.Module taking (input_dim, hidden_dim, num_layers, output_dim)
+        and keyword options.
+    """
+    MODELS[name] = model_class
+
+
+class Forecaster:
+    """
+    A registered network with its training settings.
+    """
+
+    def __init__(self, kind='gru', input_dim=1, hidden_dim=32, num_layers=2, output_dim=7, lr=0.01,
+                 num_epochs=105, seed=0, **model_options):
+        """
+        Parameters:
+        kind (str): The registry name of the network.
+        input_dim, hidden_dim, num_layers, output_dim (int): Network dimensions, as for GRU.
+        lr (float): Learning rate of the Adam optimizer.
+        num_epochs (int): Number of full-batch training epochs.
+        seed (int): Seed of the weight initialisation; the global torch RNG is left as it was.
+        model_options: Extra keyword arguments of the network, e.g. kernel_size for 'tcn'.
+        """
+        if kind not in MODELS:
+            raise ValueError(f"Unknown model kind {kind!r}, choose from {sorted(MODELS)}")
+        self.config = dict(kind=kind, input_dim=input_dim, hidden_dim=hidden_dim, num_layers=num_layers,
+                           output_dim=output_dim, lr=lr, num_epochs=num_epochs, seed=seed,
+                           model_options=model_options)
+        # Modules draw their initial weights from the global RNG: seed a forked copy of it
+        with torch.random.fork_rng(devices=[]):
+            torch.manual_seed(seed)
+            self.model = MODELS[kind](input_dim, hidden_dim, num_layers, output_dim, **model_options)
+        self.hist = None
+        self.summary = None
+
+    def fit(self, x_train, y_train, sinks=(), labels=None, validation=None, patience=None):
+        """
+        Train the network with the full-batch MSE loop of the notebook.
+
+        Parameters:
+        x_train (ndarray or Tensor): Inputs of shape (samples, lookback, input_dim).
+        y_train (ndarray or Tensor): Targets of shape (samples, output_dim).
+        sinks (iterable): Metric sinks passed to train_instrumented.
+        labels (dict): Extra fields of every metric record; the model kind is added.
+        validation (tuple): (x_val, y_val) scored after every epoch, e.g. from
+            chronological_validation_split.
+        patience (int): Stop after this many epochs without validation improvement and keep
+            the best weights; None runs all epochs.
+
+        Returns:
+        Forecaster: self, for chaining.
+        """
+        x_train = torch.as_tensor(x_train, dtype=torch.float32)
+        y_train = torch.as_tensor(y_train, dtype=torch.float32)
+        criterion = torch.nn.MSELoss(reduction='mean')
+        optimiser = torch.optim.Adam(self.model.parameters(), lr=self.config['lr'])
+
+        if validation is not None:
+            validation = tuple(torch.as_tensor(part, dtype=torch.float32) for part in validation)
+
+        self.model.train()
+        self.hist, self.summary = train_instrumented(
+            self.model, criterion, optimiser, x_train, y_train, self.config['num_epochs'], sinks=sinks,
+            labels=dict(labels or {}, model=self.config['kind']), validation=validation, patience=patience)
+        return self
+
+    def predict(self, x):
+        """
+        Forecast from input windows of shape (samples, lookback, input_dim).
+
+        Returns:
+        ndarray: Forecasts of shape (samples, output_dim).
+        """
+        self.model.eval()
+        with torch.no_grad():
+            return self.model(torch.as_tensor(x, dtype=torch.float32)).numpy()
+
+    def save(self, path):
+        """
+        Save the configuration and weights as a .npz file, like the model artifacts.
+
+        Returns:
+        str: The path written.
+        """
+        arrays = {name: tensor.detach().cpu().numpy() for name, tensor in self.model.state_dict().items()}
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.savez(path, config=np.array(json.dumps(self.config)), **arrays)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a Forecaster written by save.
+        """
+        with np.load(path) as stored:
+            config = json.loads(str(stored['config']))
+            state = {name: torch.from_numpy(stored[name]) for name in stored.files if name != 'config'}
+        model_options = config.pop('model_options')
+        forecaster = cls(**config, **model_options)
+        forecaster.model.load_state_dict(state)
+        return forecaster